@@ -4,6 +4,20 @@ set -euo pipefail
 STATE_DIR="/var/lib/astro-siem"
 EXPORT_BASE_DIR="$STATE_DIR/exports"
 LAST_RUN_FILE="$STATE_DIR/last_export"
+OFFSETS_FILE="$STATE_DIR/export_offsets"
+JOURNAL_CURSOR_FILE="$STATE_DIR/journal_cursor"
+# auto: export the journal only when no syslog files exist; always; never
+JOURNAL_EXPORT=auto
+JOURNAL_INITIAL_SINCE="24 hours ago"
+# journalctl matches: same-field terms are ORed, "+" separates alternatives
+JOURNAL_MATCHES=(
+    _SYSTEMD_UNIT=sshd.service _SYSTEMD_UNIT=ssh.service
+    + SYSLOG_FACILITY=4 SYSLOG_FACILITY=10
+    + _COMM=sudo _COMM=su
+)
+LOG_COMPRESSION_ENABLED=true
+SKIP_EMPTY_EXPORTS=true
+MAX_EXPORT_SIZE_MB=500
 EXPORT_RETENTION_DAYS=7
 
 RED='\033[0;31m'
@@ -11,6 +25,10 @@ GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
 NC='\033[0m'
 
+MANIFEST_ENTRIES=()
+NEW_OFFSETS=""
+PREVIOUS_EXPORT=""
+
 log_info() { echo -e "${YELLOW}[*]${NC} $1"; }
 log_success() { echo -e "${GREEN}[+]${NC} $1"; }
 log_error() { echo -e "${RED}[!]${NC} $1"; }
@@ -52,6 +70,206 @@ get_apache_service() {
     fi
 }
 
+json_escape() {
+    local s="$1"
+    s="${s//\\/\\\\}"
+    s="${s//\"/\\\"}"
+    printf '%s' "$s"
+}
+
+manifest_add() {
+    # manifest_add <output_dir> <filename> [extra JSON fields]
+    local output_dir="$1"
+    local filename="$2"
+    local extra="${3:-}"
+    local size sha
+
+    size=$(stat -c %s "$output_dir/$filename")
+    sha=$(sha256sum "$output_dir/$filename" | awk '{print $1}')
+    MANIFEST_ENTRIES+=("{\"filename\":\"$filename\",\"present\":true,\"size\":$size,\"sha256\":\"$sha\"${extra:+,$extra}}")
+}
+
+saved_offset() {
+    # Prints "<inode> <offset>" recorded for a log file by the last export
+    local logfile="$1"
+    if [ -f "$OFFSETS_FILE" ]; then
+        awk -v p="$logfile" '$1 == p {print $2, $3; found=1} END {if (!found) print "0 0"}' "$OFFSETS_FILE"
+    else
+        echo "0 0"
+    fi
+}
+
+copy_range() {
+    # copy_range <source> <start> <length> <dest>; gzip-compressed when enabled
+    local source="$1"
+    local start="$2"
+    local length="$3"
+    local dest="$4"
+
+    if [ "$LOG_COMPRESSION_ENABLED" = true ]; then
+        dd if="$source" bs=64K iflag=skip_bytes,count_bytes skip="$start" count="$length" status=none \
+            | gzip -c > "$dest"
+    else
+        dd if="$source" bs=64K iflag=skip_bytes,count_bytes skip="$start" count="$length" status=none \
+            > "$dest"
+    fi
+}
+
+export_delta() {
+    # Export the bytes appended to a log file since the previous export.
+    # Returns 0 when data was exported, 2 when there was nothing new, 1 on failure.
+    local logfile="$1"
+    local output_dir="$2"
+    local name inode size prev_inode prev_offset start length rotated suffix encoding
+
+    name=$(basename "$logfile")
+    inode=$(stat -c %i "$logfile")
+    size=$(stat -c %s "$logfile")
+    read -r prev_inode prev_offset < <(saved_offset "$logfile")
+
+    suffix=""
+    encoding="identity"
+    if [ "$LOG_COMPRESSION_ENABLED" = true ]; then
+        suffix=".gz"
+        encoding="gzip"
+    fi
+
+    start="$prev_offset"
+    rotated=false
+    if [ "$prev_inode" != "$inode" ] || [ "$size" -lt "$prev_offset" ]; then
+        if [ "$prev_inode" != 0 ]; then
+            rotated=true
+            # Pick up whatever was appended to the old file before it was rotated
+            if [ -f "$logfile.1" ] && [ "$(stat -c %i "$logfile.1")" = "$prev_inode" ]; then
+                local old_size
+                old_size=$(stat -c %s "$logfile.1")
+                if [ "$old_size" -gt "$prev_offset" ]; then
+                    if ! copy_range "$logfile.1" "$prev_offset" "$((old_size - prev_offset))" \
+                        "$output_dir/$name.rotated$suffix"; then
+                        return 1
+                    fi
+                    manifest_add "$output_dir" "$name.rotated$suffix" \
+                        "\"source\":\"$(json_escape "$logfile.1")\",\"inode\":$prev_inode,\"offset\":$prev_offset,\"length\":$((old_size - prev_offset)),\"end_offset\":$old_size,\"encoding\":\"$encoding\""
+                fi
+            fi
+        fi
+        start=0
+    fi
+
+    length=$((size - start))
+    if [ "$length" -gt $((MAX_EXPORT_SIZE_MB * 1024 * 1024)) ]; then
+        # Ship the rest on the next run rather than one oversized export
+        length=$((MAX_EXPORT_SIZE_MB * 1024 * 1024))
+    fi
+
+    if [ "$length" -gt 0 ]; then
+        if ! copy_range "$logfile" "$start" "$length" "$output_dir/$name$suffix"; then
+            return 1
+        fi
+        manifest_add "$output_dir" "$name$suffix" \
+            "\"source\":\"$(json_escape "$logfile")\",\"inode\":$inode,\"offset\":$start,\"length\":$length,\"end_offset\":$((start + length)),\"rotated\":$rotated,\"encoding\":\"$encoding\""
+    fi
+
+    NEW_OFFSETS+="$logfile $inode $((start + length))"$'\n'
+    if [ "$length" -eq 0 ] && [ "$rotated" = false ]; then
+        return 2
+    fi
+    return 0
+}
+
+commit_offsets() {
+    # Merge this run's offsets over the saved ones; files not seen this run keep theirs
+    local tmp="$OFFSETS_FILE.tmp"
+    {
+        printf '%s' "$NEW_OFFSETS"
+        if [ -f "$OFFSETS_FILE" ]; then
+            awk -v list="$NEW_OFFSETS" '
+                BEGIN { n = split(list, lines, "\n"); for (i = 1; i <= n; i++) { split(lines[i], f, " "); if (f[1] != "") seen[f[1]] = 1 } }
+                !($1 in seen)
+            ' "$OFFSETS_FILE"
+        fi
+    } > "$tmp"
+    mv "$tmp" "$OFFSETS_FILE"
+    
+    if [ -f "$JOURNAL_CURSOR_FILE.pending" ]; then
+        mv "$JOURNAL_CURSOR_FILE.pending" "$JOURNAL_CURSOR_FILE"
+    fi
+}
+
+prune_exports() {
+    local current="$1"
+    local pruned
+
+    pruned=$(find "$EXPORT_BASE_DIR" -mindepth 1 -maxdepth 1 -type d -name '[0-9]*_[0-9]*' \
+        -mtime +"$EXPORT_RETENTION_DAYS" ! -path "$current" -print -exec rm -rf {} + | wc -l)
+    if [ "$pruned" -gt 0 ]; then
+        log_success "Pruned $pruned exports older than $EXPORT_RETENTION_DAYS days"
+    fi
+}
+
+export_journald() {
+    # Export auth/sudo/sshd journal entries added since the saved cursor
+    local output_dir="$1"
+    local pending="$JOURNAL_CURSOR_FILE.pending"
+    local raw="$output_dir/journald.json.tmp"
+    local name entries cursor encoding
+    local -a args
+    
+    if ! command -v journalctl &> /dev/null; then
+        log_info "journalctl not available, skipping"
+        return 0
+    fi
+    
+    log_info "Exporting journald auth/sudo/sshd entries..."
+    
+    # journalctl resumes after the cursor in the pending copy and rewrites it;
+    # commit_offsets only promotes it once the export is complete
+    rm -f "$pending"
+    args=(--no-pager --quiet --output=json --cursor-file="$pending")
+    if [ -f "$JOURNAL_CURSOR_FILE" ]; then
+        cp "$JOURNAL_CURSOR_FILE" "$pending"
+    else
+        args+=(--since "$JOURNAL_INITIAL_SINCE")
+    fi
+    
+    if ! journalctl "${args[@]}" "${JOURNAL_MATCHES[@]}" > "$raw" 2>/dev/null; then
+        log_error "Failed to export journald logs"
+        rm -f "$raw" "$pending"
+        return 0
+    fi
+    
+    if [ ! -s "$raw" ]; then
+        rm -f "$raw"
+        log_info "No new journald entries"
+        return 0
+    fi
+    
+    entries=$(wc -l < "$raw")
+    # Named after the host, as parse_logs expects of <host>.journal.json(.gz)
+    name="${HOSTNAME%%.*}.journal.json"
+    encoding="identity"
+    if [ "$LOG_COMPRESSION_ENABLED" = true ]; then
+        name="$name.gz"
+        encoding="gzip"
+        if ! gzip -c "$raw" > "$output_dir/$name"; then
+            log_error "Failed to compress journald export"
+            rm -f "$raw" "$output_dir/$name" "$pending"
+            return 0
+        fi
+        rm -f "$raw"
+    else
+        mv "$raw" "$output_dir/$name"
+    fi
+    
+    cursor=""
+    if [ -f "$pending" ]; then
+        cursor=$(cat "$pending")
+    fi
+    manifest_add "$output_dir" "$name" \
+        "\"source\":\"journald\",\"entries\":$entries,\"cursor\":\"$(json_escape "$cursor")\",\"encoding\":\"$encoding\""
+    log_success "Exported $entries journald entries"
+}
+
 export_syslog() {
     local output_dir="$1"
     local count=0
@@ -74,27 +292,34 @@ export_syslog() {
     fi
     
     if [ ${#log_files[@]} -eq 0 ]; then
-        if command -v journalctl &> /dev/null; then
-            log_info "Using systemd-journal instead of traditional syslog"
-        else
+        if [ "$JOURNAL_EXPORT" = auto ]; then
+            log_info "No syslog files found, exporting from systemd-journal"
+            export_journald "$output_dir"
+        elif [ "$JOURNAL_EXPORT" = never ]; then
             log_error "No syslog files found"
         fi
         return 0
     fi
     
     for logfile in "${log_files[@]}"; do
-        basename=$(basename "$logfile")
-        if cp "$logfile" "$output_dir/$basename" 2>/dev/null; then
-            chmod 644 "$output_dir/$basename"
-            log_success "Exported $logfile"
-            count=$((count + 1))
-        else
-            log_error "Failed to export $logfile"
-        fi
+        local rc=0
+        export_delta "$logfile" "$output_dir" || rc=$?
+        case $rc in
+            0)
+                log_success "Exported new data from $logfile"
+                count=$((count + 1))
+                ;;
+            2)
+                log_info "No new data in $logfile"
+                ;;
+            *)
+                log_error "Failed to export $logfile"
+                ;;
+        esac
     done
     
     if [ $count -eq 0 ]; then
-        log_error "No syslog files could be exported"
+        log_info "No new syslog data since the last export"
     fi
 }
 
@@ -115,6 +340,7 @@ export_fim() {
         if [ -f "$fim_log" ] && [ -s "$fim_log" ]; then
             cp "$fim_log" "$output_dir/fim.json"
             chmod 644 "$output_dir/fim.json"
+            manifest_add "$output_dir" fim.json
             log_success "Exported FIM changes"
             : > "$fim_log"
         else
@@ -131,25 +357,19 @@ export_manifest() {
     
     log_info "Generating manifest..."
     
-    sources="["
-    first=true
-    
-    for f in auth.log messages secure fim.json; do
-        if [ -f "$output_dir/$f" ]; then
-            if [ "$first" = true ]; then
-                first=false
-            else
-                sources="${sources},"
-            fi
-            sources="${sources}{\"filename\":\"$f\",\"present\":true}"
-        fi
-    done
-    sources="${sources}]"
+    local sources
+    sources=$(IFS=,; echo "[${MANIFEST_ENTRIES[*]:-}]")
+    local previous="null"
+    if [ -n "$PREVIOUS_EXPORT" ]; then
+        previous="\"$PREVIOUS_EXPORT\""
+    fi
     
     cat > "$output_dir/manifest.json" << EOFMANIFEST
 {
     "export_timestamp": "$timestamp",
     "distro": "arch",
+    "previous_export": $previous,
+    "offsets_file": "export_offsets",
     "sources": $sources
 }
 EOFMANIFEST
@@ -167,6 +387,10 @@ main() {
     
     mkdir -p "$STATE_DIR"
     
+    if [ -L "$EXPORT_BASE_DIR/latest" ]; then
+        PREVIOUS_EXPORT=$(basename "$(readlink "$EXPORT_BASE_DIR/latest")")
+    fi
+    
     timestamp=$(date -Iseconds)
     timestamp_dir=$(date +%Y%m%d_%H%M%S)
     export_dir="$EXPORT_BASE_DIR/$timestamp_dir"
@@ -174,10 +398,24 @@ main() {
     mkdir -p "$export_dir"
     log_info "Export directory: $export_dir"
     
+    if [ "$JOURNAL_EXPORT" = always ]; then
+        export_journald "$export_dir"
+    fi
     export_syslog "$export_dir"
     export_fim "$export_dir"
+    if [ ${#MANIFEST_ENTRIES[@]} -eq 0 ] && [ "$SKIP_EMPTY_EXPORTS" = true ]; then
+        rmdir "$export_dir"
+        commit_offsets
+        echo "$timestamp" > "$LAST_RUN_FILE"
+        log_info "Nothing new to export; keeping previous export"
+        prune_exports "$(readlink -f "$EXPORT_BASE_DIR/latest" 2>/dev/null || true)"
+        return 0
+    fi
+    
     export_manifest "$export_dir" "$timestamp"
     
+    # Offsets only advance once the export and its manifest are complete
+    commit_offsets
     echo "$timestamp" > "$LAST_RUN_FILE"
     
     local web_export_dir
@@ -187,6 +425,8 @@ main() {
     ln -sfn "$EXPORT_BASE_DIR/latest" "$web_export_dir/latest"
     log_success "Updated export symlinks"
     
+    prune_exports "$export_dir"
+    
     chmod -R 644 "$export_dir"/* 2>/dev/null || true
     chmod 755 "$export_dir"
     
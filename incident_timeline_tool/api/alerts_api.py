@@ -1,94 +1,490 @@
 #!/usr/bin/env python3
-from flask import Flask, jsonify, request
-from db.alert_store import AlertStore
+import sys
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, stream_with_context
+from db.alert_store import AlertStore, DB_PATH, QUERY_LIMIT, parse_techniques
+from db.connection_pool import ConnectionPool
+from db.event_store import BUCKET_LADDER, PAGE_LIMIT, EventStore, choose_bucket_width
+from utils.alert_bus import AlertBus, encode_alert, format_sse
 from utils.detection_engine import DetectionEngine
+from utils.export_stream import csv_chunks, gzip_chunks, ndjson_chunks
+from utils.job_runner import JobQueueFull, JobRunner
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from utils.parse_logs import load_mitre_rules, match_mitre_rules
+from utils.rule_packs import default_registry
 from utils.threat_intel import ThreatIntel
 
-app = Flask(__name__)
-alert_store = AlertStore()
-threat_intel = ThreatIntel()
 ENABLE_API_METRICS = True
+STREAM_HEARTBEAT_SECONDS = 15
+TECHNIQUE_ID_PATTERN = re.compile(r'^T\d{4}(\.\d{3})?$')
+# Most buckets a timeline request may ask for with an explicit ?bucket=
+MAX_TIMELINE_BUCKETS = 2000
+
+api = Blueprint('api', __name__)
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'siem_api_request_seconds', 'API request latency until the response is returned',
+    ('method', 'endpoint', 'status'),
+)
+
+
+def create_app(db_path: str = DB_PATH) -> Flask:
+    """
+    Build the API application. Each app owns a connection pool, so every
+    server thread reads through its own SQLite connection and all writes go
+    through one serialised write connection.
+    """
+    app = Flask(__name__)
+    pool = ConnectionPool(db_path)
+    bus = AlertBus()
+    alert_store = AlertStore(db_path, pool=pool, bus=bus)
+    alert_store.connect()
+    event_store = EventStore(db_path, pool=pool)
+    event_store.connect()
+
+    app.config['CONNECTION_POOL'] = pool
+    app.config['ALERT_BUS'] = bus
+    app.config['ALERT_STORE'] = alert_store
+    app.config['EVENT_STORE'] = event_store
+    threat_intel = ThreatIntel()
+    # Lookups only reopen the swapped store; this thread does the rebuilds
+    threat_intel.start_watcher()
+    app.config['THREAT_INTEL'] = threat_intel
+    app.config['JOB_RUNNER'] = JobRunner()
+    app.config['MITRE_RULES'] = load_mitre_rules()
+    app.register_blueprint(api)
+    if ENABLE_API_METRICS:
+        app.before_request(_start_timer)
+        app.after_request(_record_latency)
+    return app
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        # Route templates, not raw paths, keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(request.method, endpoint, response.status_code).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+
+def _alert_store() -> AlertStore:
+    return current_app.config['ALERT_STORE']
+
+
+def _threat_intel() -> ThreatIntel:
+    return current_app.config['THREAT_INTEL']
+
+
+def _event_store() -> EventStore:
+    return current_app.config['EVENT_STORE']
 
-@app.route('/api/alerts', methods=['GET'])
+
+def _with_mitre(events):
+    """
+    Attach the MITRE techniques each event's message matches. Events only
+    store their first tactic, and matching a page of rows again is cheaper
+    than storing every technique on every event.
+    """
+    rules = current_app.config['MITRE_RULES']
+    for event in events:
+        event['mitre'] = list(match_mitre_rules(event.get('details') or '', rules))
+    return events
+
+
+def _time_arg(name):
+    """
+    Read a time query parameter given as epoch seconds or ISO 8601.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _export_response(rows, columns, basename, encode=None):
+    """
+    Stream rows as NDJSON (default) or CSV, optionally gzip-compressed,
+    without materialising the result set.
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt == 'csv':
+        chunks = csv_chunks(rows, columns)
+        mimetype, ext = 'text/csv', 'csv'
+    elif fmt == 'ndjson':
+        chunks = ndjson_chunks(rows, encode)
+        mimetype, ext = 'application/x-ndjson', 'ndjson'
+    else:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+    filename = f'{basename}.{ext}'
+    if request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes'):
+        chunks = gzip_chunks(chunks)
+        mimetype, filename = 'application/gzip', filename + '.gz'
+
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+@api.route('/api/alerts', methods=['GET'])
 def get_alerts():
     severity = request.args.get('severity')
     status = request.args.get('status')
     limit = request.args.get('limit', 100, type=int)
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
-    
-    alerts = alert_store.query_alerts(
+    technique = request.args.get('technique')
+    if technique and not TECHNIQUE_ID_PATTERN.match(technique):
+        return jsonify({'error': f'Invalid technique id: {technique}'}), 400
+
+    alerts = _alert_store().query_alerts(
         severity=severity,
         status=status,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        technique=technique
     )
-    
-    for alert in alerts[:limit]:
-        if alert.get('mitre_techniques'):
-            try:
-                alert['mitre_techniques'] = eval(alert['mitre_techniques'])
-            except (ValueError, SyntaxError):
-                pass
-    
+
+    page = alerts[:limit]
+    for alert in page:
+        alert['mitre_techniques'] = parse_techniques(alert.get('mitre_techniques'))
+
+    if request.args.get('enrich', 'false').lower() in ('1', 'true', 'yes'):
+        page = _threat_intel().enrich_alerts(page)
+
     return jsonify({
-        'alerts': alerts[:limit],
+        'alerts': page,
         'total': len(alerts)
     })
 
-@app.route('/api/alerts/<int:alert_id>', methods=['GET'])
+@api.route('/api/alerts/stream', methods=['GET'])
+def stream_alerts():
+    """
+    Server-Sent Events feed of new alerts. Clients resume with the standard
+    Last-Event-ID header (or ?last_id=); a client whose buffer overflows gets
+    an 'overflow' event and is disconnected so that it reconnects and
+    catches up from the database instead of holding server memory.
+    """
+    store = _alert_store()
+    bus = current_app.config['ALERT_BUS']
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else store.max_alert_id()
+
+    def events(last_id):
+        sub = bus.subscribe()
+        try:
+            # Subscribe before backfilling so nothing inserted in between is lost
+            yield 'retry: 3000\n\n'
+            check_db = True
+            while True:
+                while check_db:
+                    batch = store.query_alerts_since(last_id)
+                    for alert in batch:
+                        last_id = alert['id']
+                        yield format_sse(encode_alert(alert), alert['id'], 'alert')
+                    check_db = len(batch) >= QUERY_LIMIT
+
+                items = sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if sub.overflowed:
+                    yield format_sse('{}', last_id, 'overflow')
+                    return
+                if not items:
+                    # Idle: re-check the database for alerts written by
+                    # other processes (cron runs, other workers)
+                    check_db = True
+                    yield ': keepalive\n\n'
+                    continue
+                for alert_id, payload in items:
+                    if alert_id > last_id:
+                        last_id = alert_id
+                        yield format_sse(payload, alert_id, 'alert')
+        finally:
+            bus.unsubscribe(sub)
+
+    return Response(
+        stream_with_context(events(last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@api.route('/api/alerts/export', methods=['GET'])
+def export_alerts():
+    technique = request.args.get('technique')
+    if technique and not TECHNIQUE_ID_PATTERN.match(technique):
+        return jsonify({'error': f'Invalid technique id: {technique}'}), 400
+    rows = _alert_store().iter_alerts(
+        severity=request.args.get('severity'),
+        status=request.args.get('status'),
+        start_time=request.args.get('start_time'),
+        end_time=request.args.get('end_time'),
+        technique=technique,
+    )
+    columns = [
+        'id', 'timestamp', 'severity', 'title', 'description', 'source_ip',
+        'destination_ip', 'hostname', 'rule_id', 'mitre_techniques', 'status',
+        'acknowledged_by', 'acknowledged_at',
+    ]
+    return _export_response(rows, columns, 'alerts', encode_alert)
+
+@api.route('/api/events/export', methods=['GET'])
+def export_events():
+    rows = _event_store().iter_events(
+        start_time=request.args.get('start_time'),
+        end_time=request.args.get('end_time'),
+    )
+    columns = [
+        'id', 'timestamp', 'source', 'event_type', 'details', 'hostname',
+        'process', 'pid', 'severity', 'ts_epoch',
+    ]
+    return _export_response(rows, columns, 'events')
+
+@api.route('/api/timeline', methods=['GET'])
+def get_timeline():
+    """
+    Pre-bucketed event counts per (bucket, host, severity). The bucket width
+    follows the requested range, so the response size stays roughly
+    constant whatever the zoom level.
+    """
+    host = request.args.get('host')
+    if host == 'all':
+        host = None
+    try:
+        start, end = _time_arg('start'), _time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    store = _event_store()
+    if start is None or end is None:
+        first, last = store.time_extent(host)
+        if first is None:
+            return jsonify({'bucket_seconds': None, 'buckets': [], 'hosts': store.list_hosts()})
+        start = first if start is None else start
+        end = last + 1 if end is None else end
+
+    width = request.args.get('bucket', type=int)
+    if width is None:
+        width = choose_bucket_width(end - start)
+    elif width <= 0:
+        return jsonify({'error': 'bucket must be a positive number of seconds'}), 400
+    else:
+        # Round up to a ladder width, and widen further if the range would
+        # need more than MAX_TIMELINE_BUCKETS of them
+        width = max(
+            next((w for w in BUCKET_LADDER if w >= width), BUCKET_LADDER[-1]),
+            choose_bucket_width(end - start, MAX_TIMELINE_BUCKETS),
+        )
+    # Align to whole buckets so each one is served from a single rollup row set
+    start = start - start % width
+    end = -(-end // width) * width
+    return jsonify({
+        'start': start,
+        'end': end,
+        'bucket_seconds': width,
+        'buckets': store.timeline_buckets(start, end, width, host),
+        'hosts': store.list_hosts(),
+    })
+
+@api.route('/api/timeline/stats', methods=['GET'])
+def get_timeline_stats():
+    """
+    Event counts over a range grouped by one of hostname, process,
+    severity or tactic, served from the precomputed rollups.
+    """
+    by = request.args.get('by', 'severity')
+    host = request.args.get('host')
+    try:
+        start, end = _time_arg('start'), _time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    store = _event_store()
+    if start is None or end is None:
+        first, last = store.time_extent(None if host == 'all' else host)
+        if first is None:
+            return jsonify({'by': by, 'counts': {}})
+        start = first if start is None else start
+        end = last + 1 if end is None else end
+
+    try:
+        counts = store.event_stats(start, end, by, None if host == 'all' else host)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'by': by, 'start': start, 'end': end, 'counts': counts})
+
+@api.route('/api/timeline/events', methods=['GET'])
+def get_timeline_events():
+    """
+    Raw events of a single bucket, for drill-down under the cursor.
+    """
+    try:
+        start, end = _time_arg('start'), _time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start is None or end is None:
+        return jsonify({'error': 'start and end are required'}), 400
+
+    host = request.args.get('host')
+    events = _event_store().events_in_range(
+        start,
+        end,
+        hostname=None if host == 'all' else host,
+        severity=request.args.get('severity'),
+        limit=min(request.args.get('limit', 50, type=int), 500),
+    )
+    return jsonify({'events': _with_mitre(events)})
+
+@api.route('/api/hosts', methods=['GET'])
+def get_hosts():
+    return jsonify({'hosts': _event_store().list_hosts()})
+
+@api.route('/api/events', methods=['GET'])
+def get_events():
+    """
+    One page of events, newest first, in the shape DataTables' server-side
+    mode expects (draw, recordsTotal, recordsFiltered, data), so the
+    dashboard never holds more than one page.
+    """
+    host = request.args.get('host')
+    host = None if host in (None, '', 'all') else host
+    offset = max(request.args.get('start', 0, type=int), 0)
+    limit = min(max(request.args.get('length', 10, type=int), 1), PAGE_LIMIT)
+    store = _event_store()
+    total = store.count_events(host)
+    return jsonify({
+        'draw': request.args.get('draw', 0, type=int),
+        'recordsTotal': total,
+        'recordsFiltered': total,
+        'data': _with_mitre(store.page_events(host, offset, limit)),
+    })
+
+@api.route('/api/alerts/<int:alert_id>', methods=['GET'])
 def get_alert(alert_id):
-    alerts = alert_store.query_alerts()
-    for alert in alerts:
-        if alert['id'] == alert_id:
-            alert = threat_intel.enrich_alert(alert)
-            return jsonify(alert)
-    return jsonify({'error': 'Alert not found'}), 404
-
-@app.route('/api/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+    alert = _alert_store().get_alert(alert_id)
+    if alert is None:
+        return jsonify({'error': 'Alert not found'}), 404
+    return jsonify(_threat_intel().enrich_alert(alert))
+
+@api.route('/api/alerts/<int:alert_id>/acknowledge', methods=['POST'])
 def acknowledge_alert(alert_id):
     data = request.get_json() or {}
     acknowledged_by = data.get('acknowledged_by', 'analyst')
-    alert_store.update_status(alert_id, 'acknowledged', acknowledged_by)
+    _alert_store().update_status(alert_id, 'acknowledged', acknowledged_by)
     return jsonify({'status': 'success'})
 
-@app.route('/api/alerts/<int:alert_id>/close', methods=['POST'])
+@api.route('/api/alerts/<int:alert_id>/close', methods=['POST'])
 def close_alert(alert_id):
-    alert_store.update_status(alert_id, 'closed')
+    _alert_store().update_status(alert_id, 'closed')
     return jsonify({'status': 'success'})
 
-@app.route('/api/alerts/stats', methods=['GET'])
+@api.route('/api/alerts/stats', methods=['GET'])
 def get_alert_stats():
-    stats = alert_store.get_alert_stats()
-    alerts = alert_store.query_alerts()
-    stats['total_open'] = len([a for a in alerts if a['status'] == 'open'])
-    stats['total_alerts'] = len(alerts)
+    stats = _alert_store().get_alert_stats()
+    stats['total_open'] = stats['by_status'].get('open', 0)
+    stats['total_alerts'] = sum(stats['by_status'].values())
+    stats['by_technique'] = _alert_store().get_technique_counts(
+        status=request.args.get('status')
+    )
     return jsonify(stats)
 
-@app.route('/api/detect', methods=['POST'])
+def _detection_job(alert_store: AlertStore):
+    def run(job):
+        engine = DetectionEngine(alert_store=alert_store)
+        # A failing stage must still release the engine's connections
+        try:
+            job.update(stage='rules')
+            rule_count = engine.run_detection(
+                progress=lambda **p: job.update(**p)
+            )
+            job.update(stage='brute_force', rule_alerts=rule_count)
+            bf_count = engine.run_brute_force_detection(
+                progress=lambda **p: job.update(alerts=rule_count + p.pop('alerts'), **p)
+            )
+            job.update(stage='correlation', brute_force_alerts=bf_count)
+            corr_count = engine.run_correlation(
+                progress=lambda **p: job.update(
+                    alerts=rule_count + bf_count + p.pop('alerts'), **p
+                )
+            )
+        finally:
+            engine.close()
+        job.update(stage='done')
+        return {
+            'alerts_generated': rule_count + bf_count + corr_count,
+            'duplicates_suppressed': engine.suppressor.suppressed,
+            'correlation': engine.correlator.stats(),
+        }
+    return run
+
+@api.route('/api/detect', methods=['POST'])
 def run_detection():
-    engine = DetectionEngine(alert_store=alert_store)
-    count = engine.run_detection()
-    count += engine.run_brute_force_detection()
-    engine.close()
-    return jsonify({'alerts_generated': count})
+    runner = current_app.config['JOB_RUNNER']
+    try:
+        job = runner.submit('detection', _detection_job(_alert_store()))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@api.route('/api/detect/<job_id>', methods=['GET'])
+def get_detection_job(job_id):
+    job = current_app.config['JOB_RUNNER'].get(job_id)
+    if job is None:
+        # Jobs live in the worker that accepted them and are pruned once finished
+        return jsonify({'error': 'Job not found (pruned, or accepted by another worker)'}), 404
+    return jsonify(job.to_dict())
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    if not ENABLE_API_METRICS:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@api.route('/api/rules', methods=['GET'])
+def get_rules():
+    return jsonify(default_registry().to_dict())
 
-@app.route('/api/threat-intel/check', methods=['POST'])
+@api.route('/api/threat-intel/check', methods=['POST'])
 def check_threat():
     data = request.get_json() or {}
     ip = data.get('ip')
     domain = data.get('domain')
-    
+
     results = {}
     if ip:
-        results['ip'] = threat_intel.check_ip(ip)
+        results['ip'] = _threat_intel().check_ip(ip)
     if domain:
-        results['domain'] = threat_intel.check_domain(domain)
-    
+        results['domain'] = _threat_intel().check_domain(domain)
+
     return jsonify(results)
 
+@api.route('/api/threat-intel/reputation', methods=['POST'])
+def check_reputation():
+    data = request.get_json() or {}
+    ips = data.get('ips') or []
+    if data.get('ip'):
+        ips.append(data['ip'])
+    return jsonify(_threat_intel().get_reputations(ips))
+
 if __name__ == '__main__':
-    import os
+    # Development server only; see api/wsgi.py for production serving
     port = int(os.environ.get('PORT', 5000))
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
     print(f"Starting SIEM API on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True)
+    create_app().run(host='0.0.0.0', port=port, debug=debug, threaded=True)
@@ -0,0 +1,19 @@
+"""
+WSGI entry point for running the SIEM API under a production server.
+
+Run from the incident_timeline_tool directory:
+
+    gunicorn --workers 4 --threads 8 --bind 0.0.0.0:5000 api.wsgi:app
+    waitress-serve --threads 16 --listen 0.0.0.0:5000 api.wsgi:app
+
+Each gunicorn worker builds its own app and connection pool; within a
+worker every thread reads through its own SQLite connection.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.alerts_api import create_app
+
+app = create_app(os.environ.get("SIEM_DB_PATH", "db/incident_events.db"))
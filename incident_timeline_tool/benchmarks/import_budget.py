@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Start-up cost of each astro-siem subcommand, measured with `python -X importtime`.
+
+    python3 benchmarks/import_budget.py                 # every subcommand
+    python3 benchmarks/import_budget.py --only detect --top 10
+
+Each subcommand's modules are imported in a fresh interpreter, --repeat
+times; the best run is compared with IMPORT_BUDGETS_MS. Imports the bare
+interpreter already does (site, encodings) are left out. Modules that
+cannot be imported here (Flask for `serve`, say) are reported and skipped.
+Exits non-zero when a subcommand is over budget, so a heavy import added
+at module level shows up before it reaches the cron hosts.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOL_DIR)
+
+from utils.cli import COMMAND_MODULES
+
+DEFAULT_REPEAT = 5
+# Cumulative import time per subcommand, including the CLI itself; about
+# 1.5x what a warm run measured when these were set
+IMPORT_BUDGETS_MS = {
+    "cli": 25,
+    "parse": 70,
+    "detect": 90,
+    "fim": 40,
+    "serve": 250,
+    "bench": 80,
+    "ingest": 150,
+    "collect": 100,
+    "spool": 100,
+    # NumPy alone is most of this
+    "anomaly": 200,
+}
+
+
+def import_times(modules, python=sys.executable):
+    """
+    Import `modules` in a fresh interpreter. Returns {top-level import:
+    cumulative microseconds}, or raises RuntimeError when the import fails.
+    """
+    code = "import utils.cli\n" + "".join(f"import {module}\n" for module in modules)
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        cwd=TOOL_DIR,
+        env={**os.environ, "PYTHONPATH": TOOL_DIR},
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented under the module that triggered them
+        if name.startswith(" ") and not name.startswith("  ") and cumulative.strip().isdigit():
+            times[name.strip()] = times.get(name.strip(), 0) + int(cumulative)
+    return times
+
+
+def measure(modules, baseline, repeat):
+    best = None
+    for _ in range(repeat):
+        times = {k: v for k, v in import_times(modules).items() if k not in baseline}
+        total = sum(times.values())
+        if best is None or total < best[0]:
+            best = (total, times)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check astro-siem subcommand import times against budgets")
+    parser.add_argument("--only", default="", help="comma-separated subcommands")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest top-level imports")
+    args = parser.parse_args()
+
+    commands = {"cli": (), **COMMAND_MODULES}
+    names = [n for n in args.only.split(",") if n] or list(commands)
+    unknown = set(names) - set(commands)
+    if unknown:
+        parser.error(f"unknown subcommands: {', '.join(sorted(unknown))}")
+
+    # Whatever a bare interpreter imports is not the subcommand's cost
+    baseline = set()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            baseline.add(line.split("|")[2].strip())
+
+    over = 0
+    for name in names:
+        budget = IMPORT_BUDGETS_MS.get(name)
+        try:
+            total, times = measure(commands[name], baseline, args.repeat)
+        except RuntimeError as e:
+            print(f"  {name:<10} skipped: {e}")
+            continue
+        ms = total / 1000
+        flag = ""
+        if budget is not None and ms > budget:
+            flag = "  OVER BUDGET"
+            over += 1
+        print(f"  {name:<10} {ms:>8.1f} ms  (budget {budget if budget is not None else '-'} ms){flag}")
+        for module, us in sorted(times.items(), key=lambda item: -item[1])[: args.top]:
+            print(f"      {us / 1000:>8.1f} ms  {module}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the parsing, detection, storage and threat-intel paths.
+
+    python3 benchmarks/run_benchmarks.py --sizes 10000,100000 --output bench.json
+    python3 benchmarks/run_benchmarks.py --only scan_log_file --compare bench.json
+
+Inputs come from benchmarks/synthetic.py, so a given --seed and
+--attack-density always benchmark the same bytes. Benchmarks that write
+to SQLite or the filesystem cap their size (see MAX_SIZES) unless --full is
+given; capped runs are reported as skipped rather than silently shrunk.
+Results are JSON so two commits can be compared with --compare.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOL_DIR)
+
+from benchmarks.synthetic import DEFAULT_ATTACK_DENSITY, DEFAULT_SEED, SyntheticLogGenerator
+
+DEFAULT_SIZES = (10**4, 10**5)
+REGRESSION_THRESHOLD = 1.15
+THREAT_FEED_SIZE = 100000
+# History per series in the rate_anomaly benchmark, whose size counts series-days
+RATE_ANOMALY_DAYS = 14
+MAX_SIZES = {
+    "alert_store_insert": 10**5,
+    "alert_store_query": 10**5,
+    "fim_scan": 10**5,
+    "rate_anomaly": 10**5,
+}
+
+
+class BenchmarkContext:
+    """Generated inputs shared between benchmarks, cached per size."""
+
+    def __init__(self, workdir: str, generator: SyntheticLogGenerator):
+        self.workdir = workdir
+        self.generator = generator
+        self._cache = {}
+
+    def log_files(self, n: int):
+        key = ("logs", n)
+        if key not in self._cache:
+            directory = os.path.join(self.workdir, f"logs_{n}")
+            self._cache[key] = [
+                self.generator.write(os.path.join(directory, "fedora_secure.log"), "secure", n // 2),
+                self.generator.write(
+                    os.path.join(directory, "opensuse_messages.log"), "messages", n - n // 2
+                ),
+            ]
+        return self._cache[key]
+
+    def alert_db(self, n: int, build=None):
+        key = ("alerts", n)
+        if key not in self._cache:
+            path = os.path.join(self.workdir, f"alerts_{n}.db")
+            if build is not None:
+                build(path)
+            self._cache[key] = path
+        return self._cache[key]
+
+
+def bench_parse_log_line(ctx: BenchmarkContext, n: int):
+    from utils.parse_logs import TimestampResolver, load_mitre_rules, parse_log_line
+
+    rules = load_mitre_rules()
+    files = ctx.log_files(n)
+    parsed = 0
+    start = time.perf_counter()
+    for path in files:
+        resolver = TimestampResolver.for_file(path)
+        with open(path, "r") as f:
+            for line in f:
+                if parse_log_line(line, "bench", rules, resolver) is not None:
+                    parsed += 1
+    return time.perf_counter() - start, n, {"parsed": parsed}
+
+
+def bench_match_mitre_rules(ctx: BenchmarkContext, n: int):
+    from utils.parse_logs import load_mitre_rules, match_mitre_rules
+
+    rules = load_mitre_rules()
+    messages = []
+    for path in ctx.log_files(n):
+        with open(path, "r") as f:
+            messages.extend(line.split(": ", 1)[-1] for line in f)
+    hits = 0
+    start = time.perf_counter()
+    for message in messages:
+        if match_mitre_rules(message, rules):
+            hits += 1
+    return time.perf_counter() - start, n, {"messages_with_hits": hits}
+
+
+def bench_scan_log_file(ctx: BenchmarkContext, n: int):
+    from db.alert_store import AlertStore
+    from utils.detection_engine import DetectionEngine
+
+    files = ctx.log_files(n)
+    alert_store = AlertStore(os.path.join(ctx.workdir, "scan.db"))
+    alert_store.connect()
+    engine = DetectionEngine(log_dir=os.path.dirname(files[0]), alert_store=alert_store)
+    detections = 0
+    start = time.perf_counter()
+    for path in files:
+        detections += len(engine.scan_log_file(path))
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return elapsed, n, {
+        "detections": detections,
+        "bytes": sum(os.path.getsize(p) for p in files),
+    }
+
+
+def _retained_bytes(build):
+    """Run `build` under tracemalloc; returns (result, bytes still held by the result)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return result, retained
+
+
+def _dict_entry(entry):
+    # The per-line dict parse_log_line built before LogEntry: own key table,
+    # own process string, fresh MITRE hit dicts
+    return {
+        "timestamp_utc": entry.timestamp_utc,
+        "hostname": entry.hostname,
+        "process": entry.process.encode().decode(),
+        "pid": entry.pid,
+        "message": entry.message,
+        "mitre": [dict(hit) for hit in entry.mitre],
+    }
+
+
+def bench_record_memory(ctx: BenchmarkContext, n: int):
+    """Bytes held per parsed event and per detection, as records and as the old dicts."""
+    from db.alert_store import AlertStore
+    from utils.detection_engine import DetectionEngine
+    from utils.parse_logs import TimestampResolver, load_mitre_rules, parse_log_line
+
+    rules = load_mitre_rules()
+    files = ctx.log_files(n)
+
+    def parse(convert):
+        entries = []
+        for path in files:
+            resolver = TimestampResolver.for_file(path)
+            hostname = os.path.splitext(os.path.basename(path))[0]
+            with open(path, "r") as f:
+                for line in f:
+                    entry = parse_log_line(line, hostname, rules, resolver)
+                    if entry is not None:
+                        entries.append(convert(entry))
+        return entries
+
+    alert_store = AlertStore(os.path.join(ctx.workdir, "memory.db"))
+    alert_store.connect()
+    engine = DetectionEngine(log_dir=os.path.dirname(files[0]), alert_store=alert_store)
+
+    def detect(convert):
+        return [convert(d) for path in files for d in engine.scan_log_file(path)]
+
+    start = time.perf_counter()
+    events, event_bytes = _retained_bytes(lambda: parse(lambda entry: entry))
+    elapsed = time.perf_counter() - start
+    event_count = len(events)
+    del events
+    _, event_dict_bytes = _retained_bytes(lambda: parse(_dict_entry))
+    detections, detection_bytes = _retained_bytes(lambda: detect(lambda d: d))
+    detection_count = len(detections)
+    del detections
+    _, detection_dict_bytes = _retained_bytes(lambda: detect(lambda d: d.to_dict()))
+    engine.close()
+
+    def per(total, count):
+        return round(total / count, 1) if count else None
+
+    return elapsed, event_count, {
+        "events": event_count,
+        "bytes_per_event": per(event_bytes, event_count),
+        "bytes_per_event_dict": per(event_dict_bytes, event_count),
+        "detections": detection_count,
+        "bytes_per_detection": per(detection_bytes, detection_count),
+        "bytes_per_detection_dict": per(detection_dict_bytes, detection_count),
+    }
+
+
+def _insert_alerts(ctx: BenchmarkContext, path: str, n: int) -> float:
+    from db.alert_store import AlertStore
+
+    store = AlertStore(path)
+    store.connect()
+    start = time.perf_counter()
+    for alert in ctx.generator.alerts(n):
+        store.insert_alert(alert)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def bench_alert_store_insert(ctx: BenchmarkContext, n: int):
+    timings = {}
+    ctx.alert_db(n, build=lambda path: timings.setdefault("t", _insert_alerts(ctx, path, n)))
+    if "t" not in timings:
+        # Built earlier by another benchmark: insert into a fresh file instead
+        path = os.path.join(ctx.workdir, f"insert_{n}_{uuid.uuid4().hex}.db")
+        timings["t"] = _insert_alerts(ctx, path, n)
+    return timings["t"], n, {}
+
+
+def bench_alert_store_query(ctx: BenchmarkContext, n: int):
+    from db.alert_store import AlertStore
+
+    path = ctx.alert_db(n, build=lambda p: _insert_alerts(ctx, p, n))
+    store = AlertStore(path)
+    store.connect()
+    queries = (
+        {"severity": "HIGH"},
+        {"technique": "T1078"},
+        {"status": "open", "start_time": "2025-09-23T00:00:00"},
+    )
+    rows = 0
+    start = time.perf_counter()
+    for params in queries:
+        rows += len(store.query_alerts(**params))
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, rows, {"queries": len(queries), "table_rows": n}
+
+
+def bench_threat_intel_check_ip(ctx: BenchmarkContext, n: int):
+    import random
+
+    from db.indicator_store import IndicatorStore
+    from utils.threat_intel import ThreatIntel
+
+    rng = random.Random(f"{ctx.generator.seed}:threat")
+    feed = IndicatorStore(os.path.join(ctx.workdir, "feed.db"))
+    if not feed.exists():
+        indicators = [{"type": "ip", "value": ip} for ip in ctx.generator.attacker_ips]
+        indicators += (
+            {"type": "ip", "value": f"{rng.randint(1, 223)}.{rng.randint(0, 255)}."
+                                    f"{rng.randint(0, 255)}.{rng.randint(1, 254)}"}
+            for _ in range(THREAT_FEED_SIZE)
+        )
+        feed.rebuild(indicators)
+    intel = ThreatIntel(
+        feed_store=feed,
+        blocklist_store=IndicatorStore(os.path.join(ctx.workdir, "blocklist.db"), journal_mode="WAL"),
+        feed_path=None,
+    )
+    ips = [
+        rng.choice(ctx.generator.attacker_ips) if rng.random() < 0.1
+        else f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        for _ in range(n)
+    ]
+    hits = 0
+    start = time.perf_counter()
+    for ip in ips:
+        if intel.check_ip(ip) is not None:
+            hits += 1
+    return time.perf_counter() - start, n, {"hits": hits, "feed_size": feed.count()}
+
+
+def bench_fim_scan(ctx: BenchmarkContext, n: int):
+    from utils import fim_agent
+
+    root = ctx.generator.write_file_tree(os.path.join(ctx.workdir, f"tree_{n}"), n)
+    watched = fim_agent.WATCHED_DIRS
+    fim_agent.WATCHED_DIRS = [root]
+    try:
+        start = time.perf_counter()
+        state = fim_agent.scan_all_files()
+        elapsed = time.perf_counter() - start
+    finally:
+        fim_agent.WATCHED_DIRS = watched
+    shutil.rmtree(root, ignore_errors=True)
+    return elapsed, len(state), {}
+
+
+def bench_rate_anomaly(ctx: BenchmarkContext, n: int):
+    """
+    Scoring only, without the SQLite read: n series-days of hour counts
+    and the last day of minute counts, which is all a run reads at minute
+    resolution.
+    """
+    import numpy as np
+
+    from utils.rate_anomaly import AnomalyRule, SeriesMatrix, spike_alerts
+
+    days = RATE_ANOMALY_DAYS
+    series = max(1, n // days)
+    hours = days * 24
+    minutes = 1440
+    keys = [(f"host{i}", "sshd") for i in range(series)]
+    rng = np.random.default_rng(ctx.generator.seed)
+    per_minute = rng.poisson(0.5, (series, minutes)).astype(np.float64)
+    # A ten-minute burst on every 50th series during the last day
+    per_minute[::50, minutes - 600:minutes - 590] += 150
+    per_hour = rng.poisson(30, (series, hours)).astype(np.float64)
+    per_hour[:, -24:] = per_minute.reshape(series, 24, 60).sum(axis=2)
+
+    def matrix(start_epoch, bucket_seconds, counts):
+        codes, offsets = np.nonzero(counts)
+        return SeriesMatrix(
+            start_epoch, bucket_seconds, counts.shape[1], keys, codes, offsets, counts[codes, offsets]
+        )
+
+    hour_matrix = matrix(0, 3600, per_hour)
+    minute_matrix = matrix((hours - 24) * 3600, 60, per_minute)
+    rule = AnomalyRule({"id": "BENCH", "min_count": 20, "threshold": 6.0})
+    start = time.perf_counter()
+    alerts = spike_alerts(rule, hour_matrix, minute_matrix, np.ones(series, dtype=bool))
+    elapsed = time.perf_counter() - start
+    return elapsed, series * days, {"series": series, "minutes": minutes, "spikes": len(alerts)}
+
+
+BENCHMARKS = {
+    "parse_log_line": bench_parse_log_line,
+    "match_mitre_rules": bench_match_mitre_rules,
+    "scan_log_file": bench_scan_log_file,
+    "record_memory": bench_record_memory,
+    "alert_store_insert": bench_alert_store_insert,
+    "alert_store_query": bench_alert_store_query,
+    "threat_intel_check_ip": bench_threat_intel_check_ip,
+    "fim_scan": bench_fim_scan,
+    "rate_anomaly": bench_rate_anomaly,
+}
+
+
+def run_one(name, func, ctx, n, repeat):
+    runs = []
+    items = 0
+    extra = {}
+    for _ in range(repeat):
+        gc.collect()
+        elapsed, items, extra = func(ctx, n)
+        runs.append(elapsed)
+    best = min(runs)
+    return {
+        "benchmark": name,
+        "size": n,
+        "seconds": round(best, 6),
+        "runs": [round(r, 6) for r in runs],
+        "items": items,
+        "items_per_second": round(items / best, 1) if best > 0 else None,
+        "us_per_item": round(best / items * 1e6, 3) if items else None,
+        **extra,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=TOOL_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, threshold=REGRESSION_THRESHOLD):
+    """Print old/new timings side by side; returns the number of regressions."""
+    old = {(r["benchmark"], r["size"]): r for r in previous["results"] if "seconds" in r}
+    regressions = 0
+    print(f"\nvs {previous['meta'].get('commit') or 'baseline'}:")
+    for result in current["results"]:
+        before = old.get((result["benchmark"], result["size"]))
+        if before is None or "seconds" not in result:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(
+            f"  {result['benchmark']:<24} {result['size']:>9}  "
+            f"{before['seconds']:>10.4f}s -> {result['seconds']:>10.4f}s  x{ratio:.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SIEM benchmark suite")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated line/file counts, e.g. 10000,100000,1000000")
+    parser.add_argument("--only", default="", help="comma-separated benchmark names")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--attack-density", type=float, default=DEFAULT_ATTACK_DENSITY)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark; best is reported")
+    parser.add_argument("--full", action="store_true", help="ignore per-benchmark size caps")
+    parser.add_argument("--workdir", default=None, help="keep generated inputs here")
+    parser.add_argument("--output", default=None, help="write results JSON to this file")
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s]
+    names = [n for n in args.only.split(",") if n] or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Rule packs and MITRE rules are loaded relative to the tool directory
+    for option in ("workdir", "output", "compare"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    os.chdir(TOOL_DIR)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="siem-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    ctx = BenchmarkContext(workdir, SyntheticLogGenerator(args.seed, args.attack_density))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "attack_density": args.attack_density,
+            "repeat": args.repeat,
+        },
+        "results": [],
+    }
+
+    try:
+        for n in sizes:
+            for name in names:
+                cap = MAX_SIZES.get(name)
+                if cap is not None and n > cap and not args.full:
+                    result = {"benchmark": name, "size": n, "skipped": f"size cap {cap}; use --full"}
+                else:
+                    try:
+                        result = run_one(name, BENCHMARKS[name], ctx, n, args.repeat)
+                    except ImportError as e:
+                        result = {"benchmark": name, "size": n, "skipped": f"missing dependency: {e}"}
+                report["results"].append(result)
+                if "skipped" in result:
+                    print(f"{name:<24} {n:>9}  skipped ({result['skipped']})")
+                else:
+                    print(
+                        f"{name:<24} {n:>9}  {result['seconds']:>10.4f}s  "
+                        f"{result['items_per_second']:>14,.0f} items/s"
+                    )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous = json.load(f)
+        if compare(previous, report):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Deterministic synthetic log generator for benchmarks.
+
+Background lines are modelled on the bundled logs/fedora_secure.log (RFC
+3164 timestamps, sshd/sudo/pam/polkit) and logs/opensuse_messages.log (ISO
+8601 timestamps, dominated by spice-vdagent, kernel and systemd chatter).
+A tunable fraction of lines (`attack_density`) is drawn from attack
+templates instead: password guessing from a small pool of attacker
+addresses, invalid users, root logins, new accounts and sudo use. The
+same seed always produces byte-identical output.
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator
+
+DEFAULT_SEED = 1337
+DEFAULT_ATTACK_DENSITY = 0.02
+START_TIME = datetime(2025, 9, 22, 19, 45, 12, tzinfo=timezone.utc)
+ATTACKER_POOL_SIZE = 64
+USERS = ("windowsxp", "admin", "deploy", "backup", "www-data", "postgres")
+GUESSED_USERS = ("root", "admin", "oracle", "test", "ubuntu", "pi", "guest", "user")
+
+SECURE_BACKGROUND = (
+    "sudo[{pid}]: pam_unix(sudo:session): session opened for user root(uid=0) by {user}(uid=1000)",
+    "sudo[{pid}]: pam_unix(sudo:session): session closed for user root",
+    "(systemd)[{pid}]: pam_unix(systemd-user:session): session opened for user {user}(uid=1000) by {user}(uid=0)",
+    "polkitd[{pid}]: Loading rules from directory /etc/polkit-1/rules.d",
+    "polkitd[{pid}]: Finished loading, compiling and executing 20 rules",
+    "gdm-password][{pid}]: gkr-pam: unable to locate daemon control file",
+    "gdm-password][{pid}]: gkr-pam: gnome-keyring-daemon started properly and unlocked keyring",
+    "sshd[{pid}]: Accepted publickey for {user} from {internal_ip} port {port} ssh2",
+    "sshd[{pid}]: pam_unix(sshd:session): session closed for user {user}",
+)
+MESSAGES_BACKGROUND = (
+    "spice-vdagent[{pid}]: vdagent started",
+    "spice-vdagentd: opening vdagent virtio channel",
+    "spice-vdagentd: An agent is already connected for this session",
+    "kernel: [    T{pid}] audit: type=1400 audit({epoch}:{pid}): apparmor=\"STATUS\"",
+    "systemd[1]: Started Session {pid} of User {user}.",
+    "systemd[{pid}]: Queued start job for default target Graphical Interface.",
+    "gnome-shell[{pid}]: libEGL warning: egl: failed to create dri2 screen",
+    "avahi-daemon[{pid}]: Registering new address record for {internal_ip} on eth0.IPv4.",
+    "PackageKit: daemon start",
+    "irqbalance[{pid}]: Failed to initialize thermal events.",
+)
+ATTACK_TEMPLATES = (
+    (6, "sshd[{pid}]: Failed password for {guess} from {attacker_ip} port {port} ssh2"),
+    (3, "sshd[{pid}]: Failed password for invalid user {guess} from {attacker_ip} port {port} ssh2"),
+    (2, "sshd[{pid}]: Invalid user {guess} from {attacker_ip} port {port}"),
+    (2, "sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={attacker_ip}  user={guess}"),
+    (1, "sshd[{pid}]: Accepted password for {guess} from {attacker_ip} port {port} ssh2"),
+    (1, "sshd[{pid}]: Accepted password for root from {attacker_ip} port {port} ssh2"),
+    (1, "useradd[{pid}]: new user: name={guess}, UID=1001, GID=1001, home=/home/{guess}, shell=/bin/bash, from=none"),
+    (1, "sudo[{pid}]: {guess} : TTY=pts/0 ; PWD=/home/{guess} ; USER=root ; COMMAND=/usr/bin/cat /etc/shadow"),
+    (1, "kernel: [UFW BLOCK] IN=eth0 OUT= SRC={attacker_ip} DST=10.0.0.5 PROTO=TCP DPT={port} Connection refused"),
+)
+FIM_PATHS = ("/etc/passwd", "/etc/shadow", "/etc/sudoers", "/etc/ssh/sshd_config", "/var/www/html/index.html")
+
+
+class SyntheticLogGenerator:
+    def __init__(
+        self,
+        seed: int = DEFAULT_SEED,
+        attack_density: float = DEFAULT_ATTACK_DENSITY,
+        start: datetime = START_TIME,
+    ):
+        if not 0.0 <= attack_density <= 1.0:
+            raise ValueError("attack_density must be between 0 and 1")
+        self.seed = seed
+        self.attack_density = attack_density
+        self.start = start
+        rng = random.Random(seed)
+        self.attacker_ips = [
+            f"{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            for _ in range(ATTACKER_POOL_SIZE)
+        ]
+        self._attack_templates = [t for _, t in ATTACK_TEMPLATES]
+        self._attack_weights = [w for w, _ in ATTACK_TEMPLATES]
+
+    def _rng(self, stream: str) -> random.Random:
+        # Independent, reproducible stream per output kind
+        return random.Random(f"{self.seed}:{stream}")
+
+    def _fields(self, rng: random.Random, ts: datetime) -> Dict:
+        return {
+            "pid": rng.randint(300, 65000),
+            "port": rng.randint(1024, 65535),
+            "user": rng.choice(USERS),
+            "guess": rng.choice(GUESSED_USERS),
+            "attacker_ip": rng.choice(self.attacker_ips),
+            "internal_ip": f"10.0.{rng.randint(0, 3)}.{rng.randint(2, 254)}",
+            "epoch": int(ts.timestamp()),
+        }
+
+    def _messages(self, stream: str, background, n: int) -> Iterator[tuple]:
+        rng = self._rng(stream)
+        ts = self.start
+        for _ in range(n):
+            ts += timedelta(microseconds=rng.randint(1000, 2000000))
+            if rng.random() < self.attack_density:
+                template = rng.choices(self._attack_templates, self._attack_weights)[0]
+            else:
+                template = rng.choice(background)
+            yield ts, template.format(**self._fields(rng, ts))
+
+    def secure_lines(self, n: int, hostname: str = "fedora") -> Iterator[str]:
+        """RFC 3164 lines shaped like /var/log/secure on Fedora/RHEL."""
+        for ts, message in self._messages("secure", SECURE_BACKGROUND, n):
+            yield f"{ts.strftime('%b')} {ts.day:2d} {ts.strftime('%H:%M:%S')} {hostname} {message}\n"
+
+    def messages_lines(self, n: int, hostname: str = "localhost") -> Iterator[str]:
+        """ISO 8601 lines shaped like /var/log/messages on openSUSE."""
+        for ts, message in self._messages("messages", MESSAGES_BACKGROUND, n):
+            yield f"{ts.isoformat()} {hostname} {message}\n"
+
+    def fim_lines(self, n: int, hostname: str = "fedora") -> Iterator[str]:
+        """JSON change records in the format utils/fim_agent.py writes."""
+        rng = self._rng("fim")
+        ts = self.start
+        for _ in range(n):
+            ts += timedelta(seconds=rng.randint(1, 600))
+            change = rng.choice(("modified", "modified", "created", "deleted"))
+            meta = {
+                "hash": "%064x" % rng.getrandbits(256),
+                "size": rng.randint(0, 65536),
+                "mtime": ts.isoformat(),
+                "mode": "0o644",
+                "owner": "0:0",
+            }
+            entry = {
+                "timestamp_utc": ts.isoformat(),
+                "hostname": hostname,
+                "path": rng.choice(FIM_PATHS),
+                "change": change,
+                "old": None if change == "created" else meta,
+                "new": None if change == "deleted" else meta,
+            }
+            yield json.dumps(entry) + "\n"
+
+    def write(self, path: str, kind: str, n: int) -> str:
+        lines = {
+            "secure": self.secure_lines,
+            "messages": self.messages_lines,
+            "fim": self.fim_lines,
+        }[kind](n)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.writelines(lines)
+        return path
+
+    def write_file_tree(self, root: str, n_files: int, files_per_dir: int = 500) -> str:
+        """Small files spread over subdirectories, for FIM scan benchmarks."""
+        rng = self._rng("tree")
+        for index in range(n_files):
+            directory = os.path.join(root, f"d{index // files_per_dir:05d}")
+            if index % files_per_dir == 0:
+                os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"f{index:08d}.conf"), "wb") as f:
+                f.write(rng.randbytes(rng.randint(64, 4096)))
+        return root
+
+    def alerts(self, n: int) -> Iterator[Dict]:
+        """Alert dicts in the shape DetectionEngine produces."""
+        rng = self._rng("alerts")
+        rules = (
+            ("BRUTE-001", "HIGH", ["T1110"]),
+            ("SSH-001", "LOW", ["T1078"]),
+            ("SUDO-001", "MEDIUM", ["T1548"]),
+            ("ROOT-001", "CRITICAL", ["T1078", "T1005"]),
+            ("PORT-001", "MEDIUM", ["T1046"]),
+        )
+        ts = self.start
+        for _ in range(n):
+            ts += timedelta(milliseconds=rng.randint(1, 5000))
+            rule_id, severity, mitre = rng.choice(rules)
+            yield {
+                "rule_id": rule_id,
+                "timestamp": ts.isoformat(),
+                "severity": severity,
+                "title": rule_id,
+                "description": "synthetic benchmark alert",
+                "source_ip": rng.choice(self.attacker_ips),
+                "hostname": rng.choice(("fedora", "localhost")),
+                "mitre_techniques": json.dumps(mitre),
+            }
@@ -1,6 +1,12 @@
+import json
 import sqlite3
-from typing import List, Dict, Optional
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime, timezone
+from db.connection_pool import ConnectionPool
+from utils.alert_bus import AlertBus
+from utils.metrics import REGISTRY
 
 DB_PATH = "db/incident_events.db"
 BATCH_SIZE = 100
@@ -9,71 +15,204 @@ ENABLE_QUERY_CACHE = True
 DEFAULT_SEVERITY = "MEDIUM"
 ALERT_TTL_DAYS = 90
 ENABLE_BATCH_MODE = False
+ALERT_INSERT_SECONDS = REGISTRY.histogram(
+    "siem_alert_insert_seconds", "Latency of storing one alert", ("rule",)
+)
+ALERT_INSERT_COLUMNS = (
+    "id", "timestamp", "severity", "title", "description", "source_ip",
+    "destination_ip", "hostname", "rule_id", "mitre_techniques", "status",
+    "count", "first_seen", "last_seen", "dedup_key",
+)
+# Columns added after the original schema; migrated in place on connect
+DEDUP_COLUMNS = {
+    "count": "INTEGER NOT NULL DEFAULT 1",
+    "first_seen": "TEXT",
+    "last_seen": "TEXT",
+    "dedup_key": "TEXT",
+}
 
 
 class AlertStore:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        pool: Optional[ConnectionPool] = None,
+        bus: Optional[AlertBus] = None,
+    ):
         self.db_path = db_path
+        self.pool = pool
+        self.bus = bus
         self.conn = None
         self.cursor = None
 
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+        if self.pool is None:
+            self.conn = sqlite3.connect(self.db_path)
+            self.cursor = self.conn.cursor()
         self._create_table()
 
+    @contextmanager
+    def _write(self):
+        if self.pool is None:
+            yield self.cursor
+            self.conn.commit()
+        else:
+            with self.pool.writer() as conn:
+                yield conn.cursor()
+
+    def _read(self) -> sqlite3.Cursor:
+        if self.pool is None:
+            return self.cursor
+        return self.pool.reader().cursor()
+
     def _create_table(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                severity TEXT NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                source_ip TEXT,
-                destination_ip TEXT,
-                hostname TEXT,
-                rule_id TEXT,
-                mitre_techniques TEXT,
-                status TEXT DEFAULT 'open',
-                acknowledged_by TEXT,
-                acknowledged_at TEXT
+        with self._write() as cursor:
+            # Hold the write lock from the column check to the migration, so
+            # processes connecting at the same time cannot both add a column
+            if not cursor.connection.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    source_ip TEXT,
+                    destination_ip TEXT,
+                    hostname TEXT,
+                    rule_id TEXT,
+                    mitre_techniques TEXT,
+                    status TEXT DEFAULT 'open',
+                    acknowledged_by TEXT,
+                    acknowledged_at TEXT
+                )
+            """)
+            cursor.execute("PRAGMA table_info(alerts)")
+            existing = {row[1] for row in cursor.fetchall()}
+            for column, column_type in DEDUP_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE alerts ADD COLUMN {column} {column_type}")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_alerts_dedup
+                ON alerts (dedup_key, last_seen)
+                WHERE dedup_key IS NOT NULL
+            """)
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alert_techniques'"
             )
-        """)
-        self.conn.commit()
+            backfill = cursor.fetchone() is None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS alert_techniques (
+                    technique_id TEXT NOT NULL,
+                    alert_id INTEGER NOT NULL,
+                    PRIMARY KEY (technique_id, alert_id)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_alert_techniques_alert
+                ON alert_techniques (alert_id)
+            """)
+            if backfill:
+                self._backfill_techniques(cursor)
+
+    def _backfill_techniques(self, cursor: sqlite3.Cursor):
+        cursor.execute(
+            "SELECT id, mitre_techniques FROM alerts WHERE mitre_techniques IS NOT NULL"
+        )
+        rows = []
+        for alert_id, techniques in cursor.fetchall():
+            for technique_id in parse_techniques(techniques):
+                rows.append((technique_id, alert_id))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO alert_techniques (technique_id, alert_id) VALUES (?, ?)",
+            rows,
+        )
 
     def insert_alert(self, alert: Dict):
-        self.cursor.execute(
+        techniques = parse_techniques(alert.get("mitre_techniques"))
+        timestamp = alert.get("timestamp", datetime.now(timezone.utc).isoformat())
+        row = (
+            timestamp,
+            alert.get("severity", "MEDIUM"),
+            alert.get("title", ""),
+            alert.get("description", ""),
+            alert.get("source_ip"),
+            alert.get("destination_ip"),
+            alert.get("hostname"),
+            alert.get("rule_id"),
+            json.dumps(techniques) if techniques else None,
+            alert.get("status", "open"),
+            alert.get("count", 1),
+            alert.get("first_seen", timestamp),
+            alert.get("last_seen", alert.get("first_seen", timestamp)),
+            alert.get("dedup_key"),
+        )
+        started = time.perf_counter()
+        with self._write() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO alerts (timestamp, severity, title, description,
+                                 source_ip, destination_ip, hostname, rule_id,
+                                 mitre_techniques, status, count, first_seen,
+                                 last_seen, dedup_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                row,
+            )
+            alert_id = cursor.lastrowid
+            if techniques:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO alert_techniques (technique_id, alert_id) "
+                    "VALUES (?, ?)",
+                    [(technique_id, alert_id) for technique_id in techniques],
+                )
+        ALERT_INSERT_SECONDS.labels(alert.get("rule_id") or "").observe(
+            time.perf_counter() - started
+        )
+
+        if self.bus is not None:
+            self.bus.publish(dict(zip(ALERT_INSERT_COLUMNS, (alert_id,) + row)))
+        return alert_id
+
+    def find_open_alert(self, dedup_key: str, since: str, until: str) -> Optional[Dict]:
+        """
+        Most recent open alert with this dedup key whose first_seen..last_seen
+        span overlaps since..until, or None. Used to fold duplicates across
+        detection runs.
+        """
+        cursor = self._read()
+        cursor.execute(
             """
-            INSERT INTO alerts (timestamp, severity, title, description, 
-                             source_ip, destination_ip, hostname, rule_id, 
-                             mitre_techniques, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT id, count, first_seen, last_seen FROM alerts
+            WHERE dedup_key = ? AND last_seen >= ? AND first_seen <= ?
+              AND status = 'open'
+            ORDER BY last_seen DESC LIMIT 1
         """,
-            (
-                alert.get("timestamp", datetime.now(timezone.utc).isoformat()),
-                alert.get("severity", "MEDIUM"),
-                alert.get("title", ""),
-                alert.get("description", ""),
-                alert.get("source_ip"),
-                alert.get("destination_ip"),
-                alert.get("hostname"),
-                alert.get("rule_id"),
-                alert.get("mitre_techniques"),
-                alert.get("status", "open"),
-            ),
+            (dedup_key, since, until),
         )
-        self.conn.commit()
-        return self.cursor.lastrowid
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "count", "first_seen", "last_seen"), row))
 
-    def query_alerts(
-        self,
-        severity: Optional[str] = None,
-        status: Optional[str] = None,
-        start_time: Optional[str] = None,
-        end_time: Optional[str] = None,
-    ) -> List[Dict]:
-        query = "SELECT * FROM alerts"
+    def fold_duplicates(self, updates: List[tuple]):
+        """
+        Apply (alert_id, extra_count, last_seen) updates in one transaction.
+        """
+        if not updates:
+            return
+        with self._write() as cursor:
+            cursor.executemany(
+                """
+                UPDATE alerts
+                SET count = count + ?, last_seen = MAX(COALESCE(last_seen, ''), ?)
+                WHERE id = ?
+            """,
+                [(extra, last_seen, alert_id) for alert_id, extra, last_seen in updates],
+            )
+
+    def _filters(self, severity, status, start_time, end_time, technique=None):
         params = []
         conditions = []
 
@@ -89,37 +228,109 @@ class AlertStore:
         if end_time:
             conditions.append("timestamp <= ?")
             params.append(end_time)
+        if technique:
+            # Matches the technique itself and its sub-techniques (T1110 -> T1110.001)
+            conditions.append(
+                "id IN (SELECT alert_id FROM alert_techniques "
+                "WHERE technique_id = ? OR technique_id GLOB ?)"
+            )
+            params.extend([technique, technique + ".*"])
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        query += " ORDER BY timestamp DESC"
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
 
-        self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
+    def query_alerts(
+        self,
+        severity: Optional[str] = None,
+        status: Optional[str] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        technique: Optional[str] = None,
+    ) -> List[Dict]:
+        where, params = self._filters(severity, status, start_time, end_time, technique)
+        query = "SELECT * FROM alerts" + where + " ORDER BY timestamp DESC"
+
+        cursor = self._read()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def iter_alerts(
+        self,
+        severity: Optional[str] = None,
+        status: Optional[str] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        technique: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """
+        Like query_alerts(), but yields rows from a dedicated cursor in
+        batches of BATCH_SIZE so memory stays flat for any result size.
+        """
+        where, params = self._filters(severity, status, start_time, end_time, technique)
+        query = "SELECT * FROM alerts" + where + " ORDER BY timestamp DESC"
+
+        conn = self.conn if self.pool is None else self.pool.reader()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+
+    def get_alert(self, alert_id: int) -> Optional[Dict]:
+        cursor = self._read()
+        cursor.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        columns = [desc[0] for desc in cursor.description]
+        return dict(zip(columns, row))
 
-        columns = [desc[0] for desc in self.cursor.description]
+    def query_alerts_since(self, last_id: int, limit: int = QUERY_LIMIT) -> List[Dict]:
+        cursor = self._read()
+        cursor.execute(
+            "SELECT * FROM alerts WHERE id > ? ORDER BY id ASC LIMIT ?",
+            (last_id, limit),
+        )
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
         return [dict(zip(columns, row)) for row in rows]
 
+    def max_alert_id(self) -> int:
+        cursor = self._read()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM alerts")
+        return cursor.fetchone()[0]
+
     def update_status(self, alert_id: int, status: str, acknowledged_by: str = None):
         ack_time = datetime.now(timezone.utc).isoformat() if acknowledged_by else None
-        self.cursor.execute(
-            """
-            UPDATE alerts 
-            SET status = ?, acknowledged_by = ?, acknowledged_at = ?
-            WHERE id = ?
-        """,
-            (status, acknowledged_by, ack_time, alert_id),
-        )
-        self.conn.commit()
+        with self._write() as cursor:
+            cursor.execute(
+                """
+                UPDATE alerts
+                SET status = ?, acknowledged_by = ?, acknowledged_at = ?
+                WHERE id = ?
+            """,
+                (status, acknowledged_by, ack_time, alert_id),
+            )
 
     def get_alert_stats(self) -> Dict:
-        self.cursor.execute("""
-            SELECT severity, status, COUNT(*) as count 
-            FROM alerts 
+        cursor = self._read()
+        cursor.execute("""
+            SELECT severity, status, COUNT(*) as count
+            FROM alerts
             GROUP BY severity, status
             ORDER BY count DESC
         """)
-        rows = self.cursor.fetchall()
+        rows = cursor.fetchall()
         stats = {"by_severity": {}, "by_status": {}}
         for row in rows:
             severity, status, count = row
@@ -129,13 +340,41 @@ class AlertStore:
             stats["by_status"][status] = stats["by_status"].get(status, 0) + count
         return stats
 
+    def get_technique_counts(self, status: Optional[str] = None) -> Dict[str, int]:
+        query = "SELECT t.technique_id, COUNT(*) FROM alert_techniques t"
+        params = []
+        if status:
+            query += " JOIN alerts a ON a.id = t.alert_id WHERE a.status = ?"
+            params.append(status)
+        query += " GROUP BY t.technique_id ORDER BY COUNT(*) DESC"
+
+        cursor = self._read()
+        cursor.execute(query, params)
+        return {technique_id: count for technique_id, count in cursor.fetchall()}
+
     def close(self):
+        # Pooled connections belong to the pool's owner, not to this store
         if self.conn:
             self.conn.close()
             self.conn = None
             self.cursor = None
 
 
+def parse_techniques(value) -> List[str]:
+    """
+    Normalise a mitre_techniques value (JSON text, list or None) to a list
+    of technique ids.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return [str(t) for t in value if t]
+
+
 if __name__ == "__main__":
     store = AlertStore()
     store.connect()
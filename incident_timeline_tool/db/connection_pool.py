@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+DB_PATH = "db/incident_events.db"
+DB_CONNECTION_TIMEOUT = 30
+
+
+def _close_quietly(conn: sqlite3.Connection):
+    try:
+        conn.close()
+    except sqlite3.ProgrammingError:
+        pass
+
+
+class _Reader:
+    """
+    Holds one thread's read connection. Only the thread's local storage
+    refers to it, so it is collected when the thread exits, and its
+    finalizer closes the connection.
+    """
+
+    __slots__ = ("conn", "pid", "close", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, pid: int):
+        self.conn = conn
+        self.pid = pid
+        self.close = weakref.finalize(self, _close_quietly, conn)
+
+
+class ConnectionPool:
+    """
+    SQLite connections for a multi-threaded server: one read connection per
+    thread, opened lazily, and a single write connection serialised behind a
+    lock. The database runs in WAL mode so readers never wait on the writer.
+
+    Connections are tagged with the process id they were opened in, so a
+    pool created before a pre-fork server forks its workers is safe to use
+    in each worker. A thread's read connection is closed when the thread
+    exits, so servers that start a thread per request do not accumulate
+    one open connection per request.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, timeout: float = DB_CONNECTION_TIMEOUT):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._write_conn = None
+        self._write_pid = None
+        self._readers = weakref.WeakSet()
+        self._readers_lock = threading.Lock()
+
+    def _open(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            conn = sqlite3.connect(
+                uri, uri=True, timeout=self.timeout, check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path, timeout=self.timeout, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "reader", None)
+        # Reopen after a fork, or after close_all() closed this thread's connection
+        if holder is None or holder.pid != os.getpid() or not holder.close.alive:
+            # Make sure the file exists and is in WAL mode before opening read-only
+            with self.writer():
+                pass
+            holder = _Reader(self._open(read_only=True), os.getpid())
+            self._local.reader = holder
+            with self._readers_lock:
+                self._readers.add(holder)
+        return holder.conn
+
+    def open_readers(self) -> int:
+        with self._readers_lock:
+            return len(self._readers)
+
+    @contextmanager
+    def writer(self):
+        """
+        Yields the shared write connection inside a transaction; commits on
+        success and rolls back on error.
+        """
+        with self._write_lock:
+            if self._write_conn is None or self._write_pid != os.getpid():
+                self._write_conn = self._open()
+                self._write_pid = os.getpid()
+            conn = self._write_conn
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close_all(self):
+        with self._readers_lock:
+            for holder in list(self._readers):
+                holder.close()
+            self._readers = weakref.WeakSet()
+        with self._write_lock:
+            if self._write_conn is not None and self._write_pid == os.getpid():
+                self._write_conn.close()
+            self._write_conn = None
@@ -1,5 +1,7 @@
 import sqlite3
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Dict, Optional, Sequence, Tuple
+from db.connection_pool import ConnectionPool
 
 DB_PATH = "db/incident_events.db"
 MAX_EVENT_AGE_DAYS = 90
@@ -7,58 +9,216 @@ EVENT_RETENTION_DAYS = 30
 DB_CONNECTION_TIMEOUT = 30
 ENABLE_EVENT_INDEXING = True
 ENABLE_EVENT_COMPRESSION = False
+FETCH_BATCH_SIZE = 500
+# Rows per batch from rollup_series(), which callers convert column-wise
+SERIES_BATCH_SIZE = 50000
+DRILLDOWN_LIMIT = 200
+PAGE_LIMIT = 100
+TARGET_BUCKETS = 120
+BUCKET_LADDER = [
+    60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400,
+]
+
+# Columns added to the original events table for parsed log lines
+EVENT_COLUMNS = {
+    "hostname": "TEXT",
+    "process": "TEXT",
+    "pid": "TEXT",
+    "severity": "TEXT",
+    "ts_epoch": "INTEGER",
+    "fingerprint": "TEXT",
+    "mitre_tactic": "TEXT",
+}
+
+# Rollup tables maintained by triggers on events, coarsest first
+ROLLUP_RESOLUTIONS = [("day", 86400), ("hour", 3600), ("minute", 60)]
+ROLLUP_DIMENSIONS = {
+    "hostname": "COALESCE(hostname, '')",
+    "process": "COALESCE(process, '')",
+    "severity": "COALESCE(severity, '')",
+    "tactic": "COALESCE(mitre_tactic, '')",
+}
 
 
 class EventStore:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, pool: Optional[ConnectionPool] = None):
         self.db_path = db_path
+        self.pool = pool
         self.conn = None
         self.cursor = None
 
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+        if self.pool is None:
+            self.conn = sqlite3.connect(self.db_path, timeout=DB_CONNECTION_TIMEOUT)
+            self.cursor = self.conn.cursor()
         self._create_table()
 
+    @contextmanager
+    def _write(self):
+        if self.pool is None:
+            yield self.cursor
+            self.conn.commit()
+        else:
+            with self.pool.writer() as conn:
+                yield conn.cursor()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        if self.pool is None:
+            return self.conn
+        return self.pool.reader()
+
     def _create_table(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                source TEXT NOT NULL,
-                event_type TEXT NOT NULL,
-                details TEXT
+        with self._write() as cursor:
+            # Hold the write lock from the column check to the migration, so
+            # processes connecting at the same time cannot both add a column
+            if not cursor.connection.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    details TEXT
+                )
+            """)
+            cursor.execute("PRAGMA table_info(events)")
+            existing = {row[1] for row in cursor.fetchall()}
+            for column, column_type in EVENT_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE events ADD COLUMN {column} {column_type}")
+            if ENABLE_EVENT_INDEXING:
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts_epoch)"
+                )
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_events_host_ts "
+                    "ON events (hostname, ts_epoch)"
+                )
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_fingerprint "
+                "ON events (fingerprint)"
             )
-        """)
-        self.conn.commit()
+            self._create_rollups(cursor)
+
+    def _create_rollups(self, cursor: sqlite3.Cursor):
+        """
+        Minute/hour/day count tables keyed by (bucket, host, process,
+        severity, tactic). Triggers keep them in step with every insert and
+        delete on events, so late-arriving events land in the right bucket
+        without any rebuild.
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_rollup_minute'"
+        )
+        backfill = cursor.fetchone() is None
+        dims = ", ".join(ROLLUP_DIMENSIONS)
+        values = ", ".join(f"{expr.replace('(', '(NEW.', 1)}" for expr in ROLLUP_DIMENSIONS.values())
+        old_match = " AND ".join(
+            f"{dim} = {expr.replace('(', '(OLD.', 1)}"
+            for dim, expr in ROLLUP_DIMENSIONS.items()
+        )
+
+        for name, seconds in ROLLUP_RESOLUTIONS:
+            table = f"event_rollup_{name}"
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER NOT NULL,
+                    hostname TEXT NOT NULL,
+                    process TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    tactic TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, hostname, process, severity, tactic)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+                AFTER INSERT ON events WHEN NEW.ts_epoch IS NOT NULL
+                BEGIN
+                    INSERT INTO {table} (bucket, {dims}, count)
+                    VALUES ((NEW.ts_epoch / {seconds}) * {seconds}, {values}, 1)
+                    ON CONFLICT (bucket, {dims}) DO UPDATE SET count = count + 1;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_delete
+                AFTER DELETE ON events WHEN OLD.ts_epoch IS NOT NULL
+                BEGIN
+                    UPDATE {table} SET count = count - 1
+                    WHERE bucket = (OLD.ts_epoch / {seconds}) * {seconds} AND {old_match};
+                    DELETE FROM {table}
+                    WHERE bucket = (OLD.ts_epoch / {seconds}) * {seconds}
+                      AND {old_match} AND count <= 0;
+                END
+            """)
+            if backfill:
+                cursor.execute(f"""
+                    INSERT INTO {table} (bucket, {dims}, count)
+                    SELECT (ts_epoch / {seconds}) * {seconds},
+                           {", ".join(ROLLUP_DIMENSIONS.values())}, COUNT(*)
+                    FROM events WHERE ts_epoch IS NOT NULL
+                    GROUP BY 1, 2, 3, 4, 5
+                """)
 
     def insert_event(self, event: Dict[str, str]):
         """
         Insert a single event into the database.
         event should have keys: timestamp, source, event_type, details (details can be optional)
         """
-        self.cursor.execute(
-            """
-            INSERT INTO events (timestamp, source, event_type, details)
-            VALUES (?, ?, ?, ?)
-        """,
-            (
-                event.get("timestamp"),
-                event.get("source"),
-                event.get("event_type"),
-                event.get("details", None),
-            ),
-        )
-        self.conn.commit()
+        with self._write() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO events (timestamp, source, event_type, details)
+                VALUES (?, ?, ?, ?)
+            """,
+                (
+                    event.get("timestamp"),
+                    event.get("source"),
+                    event.get("event_type"),
+                    event.get("details", None),
+                ),
+            )
 
-    def query_events(
-        self, start_time: Optional[str] = None, end_time: Optional[str] = None
-    ) -> List[Dict]:
+    def insert_events(self, events: Iterable[Dict]) -> int:
         """
-        Query events optionally between start_time and end_time (ISO 8601 strings).
-        Returns list of event dictionaries.
+        Insert parsed log events in one transaction. Events carrying a
+        fingerprint that is already stored are skipped, so re-parsing the
+        same file is idempotent. Returns the number of new rows.
         """
-        query = "SELECT id, timestamp, source, event_type, details FROM events"
+        rows = [
+            (
+                e.get("timestamp"),
+                e.get("source"),
+                e.get("event_type"),
+                e.get("details"),
+                e.get("hostname"),
+                e.get("process"),
+                e.get("pid"),
+                e.get("severity"),
+                e.get("ts_epoch"),
+                e.get("fingerprint"),
+                e.get("mitre_tactic"),
+            )
+            for e in events
+        ]
+        with self._write() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM events")
+            last_id = cursor.fetchone()[0]
+            cursor.executemany(
+                """
+                INSERT OR IGNORE INTO events (timestamp, source, event_type, details,
+                                              hostname, process, pid, severity,
+                                              ts_epoch, fingerprint, mitre_tactic)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                rows,
+            )
+            # total_changes would also count the rollup trigger writes
+            cursor.execute("SELECT COUNT(*) FROM events WHERE id > ?", (last_id,))
+            return cursor.fetchone()[0]
+
+    def _time_filter(self, start_time, end_time):
         params = []
         conditions = []
 
@@ -69,26 +229,213 @@ class EventStore:
             conditions.append("timestamp <= ?")
             params.append(end_time)
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
 
-        query += " ORDER BY timestamp ASC"
+    def query_events(
+        self, start_time: Optional[str] = None, end_time: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Query events optionally between start_time and end_time (ISO 8601 strings).
+        Returns list of event dictionaries.
+        """
+        return list(self.iter_events(start_time, end_time))
+
+    def iter_events(
+        self, start_time: Optional[str] = None, end_time: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Stream events between start_time and end_time from a dedicated
+        cursor, FETCH_BATCH_SIZE rows at a time.
+        """
+        where, params = self._time_filter(start_time, end_time)
+        query = "SELECT * FROM events" + where + " ORDER BY timestamp ASC"
 
-        self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
+        cursor = self._read_conn().cursor()
+        try:
+            cursor.execute(query, params)
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
 
-        events = []
-        for row in rows:
-            events.append(
-                {
-                    "id": row[0],
-                    "timestamp": row[1],
-                    "source": row[2],
-                    "event_type": row[3],
-                    "details": row[4],
-                }
-            )
-        return events
+    def _range_filter(self, start_epoch, end_epoch, hostname=None, severity=None):
+        conditions = ["ts_epoch >= ?", "ts_epoch < ?"]
+        params = [start_epoch, end_epoch]
+        if hostname:
+            conditions.append("hostname = ?")
+            params.append(hostname)
+        if severity:
+            conditions.append("severity = ?")
+            params.append(severity)
+        return " WHERE " + " AND ".join(conditions), params
+
+    def time_extent(self, hostname: Optional[str] = None) -> Tuple[Optional[int], Optional[int]]:
+        query = "SELECT MIN(ts_epoch), MAX(ts_epoch) FROM events WHERE ts_epoch IS NOT NULL"
+        params = []
+        if hostname:
+            query += " AND hostname = ?"
+            params.append(hostname)
+        return self._read_conn().execute(query, params).fetchone()
+
+    def list_hosts(self) -> List[str]:
+        # The day rollup has a handful of rows per host and day, far fewer than events
+        rows = self._read_conn().execute(
+            "SELECT DISTINCT hostname FROM event_rollup_day WHERE hostname != '' ORDER BY hostname"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def aggregate_counts(
+        self,
+        start_epoch: int,
+        end_epoch: int,
+        group_by: Sequence[str],
+        bucket_seconds: Optional[int] = None,
+        hostname: Optional[str] = None,
+    ) -> Dict[Tuple, int]:
+        """
+        Event counts over [start, end) grouped by the given rollup
+        dimensions (and by time bucket when bucket_seconds is set). Each
+        stretch of the range is read from the coarsest rollup table that
+        covers it exactly; only unaligned edges fall back to finer tables
+        or the raw events table.
+        """
+        for dim in group_by:
+            if dim not in ROLLUP_DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {dim}")
+
+        counts = {}
+        conn = self._read_conn()
+        for table, seg_start, seg_end in plan_rollup_reads(
+            start_epoch, end_epoch, bucket_seconds
+        ):
+            if table == "raw":
+                source, time_col, total = "events", "ts_epoch", "COUNT(*)"
+                columns = [ROLLUP_DIMENSIONS[dim] for dim in group_by]
+                host_col = ROLLUP_DIMENSIONS["hostname"]
+            else:
+                source, time_col, total = f"event_rollup_{table}", "bucket", "SUM(count)"
+                columns = list(group_by)
+                host_col = "hostname"
+
+            if bucket_seconds:
+                columns = [f"({time_col} / {int(bucket_seconds)}) * {int(bucket_seconds)}"] + columns
+            query = f"SELECT {', '.join(columns + [total])} FROM {source} WHERE {time_col} >= ? AND {time_col} < ?"
+            params = [seg_start, seg_end]
+            if hostname:
+                query += f" AND {host_col} = ?"
+                params.append(hostname)
+            if columns:
+                query += " GROUP BY " + ", ".join(str(i) for i in range(1, len(columns) + 1))
+
+            for row in conn.execute(query, params):
+                key = tuple(row[:-1])
+                counts[key] = counts.get(key, 0) + row[-1]
+        return counts
+
+    def rollup_series(
+        self, start_epoch: int, end_epoch: int, resolution: str = "minute"
+    ) -> Iterator[List[Tuple[int, str, str, str, int]]]:
+        """
+        Raw rollup rows of one resolution ("minute", "hour" or "day") over
+        [start, end) as batches of (bucket, hostname, process, severity,
+        count), in primary-key order. A (host, process, severity) can have
+        several rows per bucket, one per tactic; callers sum them. Grouping
+        here would make SQLite sort the whole range, which costs more than
+        the caller's vectorized sum. Buckets with no events have no row.
+        """
+        if resolution not in dict(ROLLUP_RESOLUTIONS):
+            raise ValueError(f"unknown rollup resolution: {resolution}")
+        cursor = self._read_conn().execute(
+            f"SELECT bucket, hostname, process, severity, count FROM event_rollup_{resolution} "
+            "WHERE bucket >= ? AND bucket < ?",
+            (start_epoch, end_epoch),
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(SERIES_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def timeline_buckets(
+        self,
+        start_epoch: int,
+        end_epoch: int,
+        bucket_seconds: int,
+        hostname: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Event counts per (bucket, hostname, severity) for [start, end).
+        """
+        counts = self.aggregate_counts(
+            start_epoch, end_epoch, ("hostname", "severity"), bucket_seconds, hostname
+        )
+        return [
+            {"bucket": bucket, "hostname": host, "severity": sev, "count": count}
+            for (bucket, host, sev), count in sorted(counts.items())
+        ]
+
+    def event_stats(
+        self,
+        start_epoch: int,
+        end_epoch: int,
+        by: str,
+        hostname: Optional[str] = None,
+    ) -> Dict[str, int]:
+        counts = self.aggregate_counts(start_epoch, end_epoch, (by,), hostname=hostname)
+        return {key[0]: count for key, count in sorted(counts.items(), key=lambda kv: -kv[1])}
+
+    def events_in_range(
+        self,
+        start_epoch: int,
+        end_epoch: int,
+        hostname: Optional[str] = None,
+        severity: Optional[str] = None,
+        limit: int = DRILLDOWN_LIMIT,
+    ) -> List[Dict]:
+        where, params = self._range_filter(start_epoch, end_epoch, hostname, severity)
+        cursor = self._read_conn().execute(
+            "SELECT * FROM events" + where + " ORDER BY ts_epoch ASC LIMIT ?",
+            params + [limit],
+        )
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def count_events(self, hostname: Optional[str] = None) -> int:
+        """Timestamped events, optionally for one host, summed from the day rollup."""
+        query = "SELECT COALESCE(SUM(count), 0) FROM event_rollup_day"
+        params = []
+        if hostname:
+            query += " WHERE hostname = ?"
+            params.append(hostname)
+        return self._read_conn().execute(query, params).fetchone()[0]
+
+    def page_events(
+        self, hostname: Optional[str] = None, offset: int = 0, limit: int = PAGE_LIMIT
+    ) -> List[Dict]:
+        """
+        One page of timestamped events, newest first, for the dashboard's
+        logs table. Served by the (ts_epoch) and (hostname, ts_epoch)
+        indexes, so a page costs the same whatever the table size, apart
+        from the rows skipped by a deep offset.
+        """
+        query = "SELECT * FROM events WHERE ts_epoch IS NOT NULL"
+        params = []
+        if hostname:
+            query += " AND hostname = ?"
+            params.append(hostname)
+        query += " ORDER BY ts_epoch DESC LIMIT ? OFFSET ?"
+        cursor = self._read_conn().execute(query, params + [min(limit, PAGE_LIMIT), max(offset, 0)])
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
     def close(self):
         if self.conn:
@@ -97,6 +444,42 @@ class EventStore:
             self.cursor = None
 
 
+def plan_rollup_reads(
+    start_epoch: int, end_epoch: int, bucket_seconds: Optional[int] = None
+) -> List[Tuple[str, int, int]]:
+    """
+    Split [start, end) into (table, start, end) segments, using the
+    coarsest rollup whose boundaries fit inside the range. When the result
+    is bucketed, only resolutions that divide the bucket width are used so
+    no rollup row straddles two buckets.
+    """
+    if start_epoch >= end_epoch:
+        return []
+    for name, seconds in ROLLUP_RESOLUTIONS:
+        if bucket_seconds and bucket_seconds % seconds:
+            continue
+        aligned_start = -(-start_epoch // seconds) * seconds
+        aligned_end = (end_epoch // seconds) * seconds
+        if aligned_start < aligned_end:
+            return (
+                plan_rollup_reads(start_epoch, aligned_start, bucket_seconds)
+                + [(name, aligned_start, aligned_end)]
+                + plan_rollup_reads(aligned_end, end_epoch, bucket_seconds)
+            )
+    return [("raw", start_epoch, end_epoch)]
+
+
+def choose_bucket_width(span_seconds: int, target: int = TARGET_BUCKETS) -> int:
+    """
+    Smallest width from BUCKET_LADDER that keeps the number of buckets for
+    the given span at or below `target`.
+    """
+    for width in BUCKET_LADDER:
+        if span_seconds / width <= target:
+            return width
+    return BUCKET_LADDER[-1]
+
+
 # Example usage
 if __name__ == "__main__":
     store = EventStore()
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+FEED_DB_PATH = "data/threat_intel.db"
+BLOCKLIST_DB_PATH = "data/blocklist.db"
+RELOAD_CHECK_INTERVAL = 1.0
+MMAP_SIZE = 256 * 1024 * 1024
+IMPORT_BATCH_SIZE = 10000
+
+
+class IndicatorStore:
+    """
+    On-disk indicator index backed by a WITHOUT ROWID SQLite table keyed on
+    (type, value). Pages are memory-mapped, so every worker process shares
+    the OS page cache instead of holding its own copy of the feed.
+
+    Readers keep one connection per thread and reopen it when the file is
+    atomically replaced by rebuild(); lookups already running on the old
+    connection finish against the old snapshot. Stores that are only ever
+    appended to (the local blocklist) can use WAL mode instead; stores that
+    get rebuilt must stay in rollback-journal mode so no WAL file outlives
+    the swap.
+    """
+
+    def __init__(self, db_path: str = FEED_DB_PATH, journal_mode: str = "DELETE"):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        _create_table(conn)
+        return conn
+
+    def _file_id(self):
+        try:
+            stat = os.stat(self.db_path)
+            return (stat.st_dev, stat.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def _connection(self) -> sqlite3.Connection:
+        local = self._local
+        now = time.monotonic()
+        conn = getattr(local, "conn", None)
+        if conn is not None and now - local.checked_at < RELOAD_CHECK_INTERVAL:
+            return conn
+
+        file_id = self._file_id()
+        if conn is None or file_id != local.file_id:
+            if conn is not None:
+                conn.close()
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = self._open()
+            local.conn = conn
+            local.file_id = self._file_id()
+        local.checked_at = now
+        return conn
+
+    def exists(self) -> bool:
+        return os.path.exists(self.db_path)
+
+    def mtime_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.db_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def lookup(self, indicator_type: str, value: str) -> Optional[Dict]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT risk, source, description FROM indicators "
+                "WHERE type = ? AND value = ?",
+                (indicator_type, value),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return {"risk": row[0], "source": row[1], "description": row[2]}
+
+    def add_indicator(
+        self,
+        indicator_type: str,
+        value: str,
+        risk: str = "HIGH",
+        source: str = "local",
+        description: str = "",
+    ):
+        """
+        Insert or update a single indicator in place, without rewriting the
+        rest of the store.
+        """
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO indicators "
+                "(type, value, risk, source, description) VALUES (?, ?, ?, ?, ?)",
+                (indicator_type, value, risk, source, description),
+            )
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM indicators").fetchone()[0]
+
+    def rebuild(self, indicators: Iterable[Dict], mtime_ns: Optional[int] = None):
+        """
+        Build a fresh store from an iterable of indicator dicts next to the
+        live file and atomically swap it into place. `mtime_ns`, when given,
+        is stamped on the new file so callers can tell which source it was
+        built from.
+        """
+        # The temporary file lives next to the store, so its directory must exist first
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        tmp_path = f"{self.db_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        _create_table(conn)
+
+        batch = []
+        for indicator in indicators:
+            if not indicator.get("type") or not indicator.get("value"):
+                continue
+            batch.append(
+                (
+                    indicator["type"],
+                    indicator["value"],
+                    indicator.get("risk", "HIGH"),
+                    indicator.get("source", "local"),
+                    indicator.get("description", ""),
+                )
+            )
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _insert_batch(conn, batch)
+                batch = []
+        if batch:
+            _insert_batch(conn, batch)
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        if mtime_ns is not None:
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp_path, self.db_path)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _create_table(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS indicators (
+            type TEXT NOT NULL,
+            value TEXT NOT NULL,
+            risk TEXT,
+            source TEXT,
+            description TEXT,
+            PRIMARY KEY (type, value)
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+
+
+def _insert_batch(conn: sqlite3.Connection, batch):
+    conn.executemany(
+        "INSERT OR REPLACE INTO indicators "
+        "(type, value, risk, source, description) VALUES (?, ?, ?, ?, ?)",
+        batch,
+    )
@@ -1,22 +1,14 @@
+#!/bin/bash
 
-# Define endpoint IP
-FEDORA_IP="192.168.122.63"
-REMOTE_FILE="log_export/secure.log"
-DEST_FILE="logs/fedora_secure.log"
+# Fetch new lines of the Fedora/RHEL secure log. Endpoint addresses now live
+# in data/collector_inventory.json; the collector only downloads what was
+# appended since the last run and refetches in full after log rotation.
+cd "$( dirname "${BASH_SOURCE[0]}" )" || exit 1
 
-# Create logs directory if it doesn't exist
-mkdir -p logs
-
-# Fetch the log file via Apache
-curl -s "http://$FEDORA_IP/$REMOTE_FILE" -o "$DEST_FILE"
-
-# Check if download succeeded
-if [[ $? -eq 0 ]]; then
-    echo "Log fetched and saved to $DEST_FILE"
-else
+python3 utils/log_collector.py --only fedora "$@" || {
     echo "Failed to fetch log from Fedora endpoint"
     exit 1
-fi
+}
 
 # OPTIONAL: Automatically parse the logs
 # python3 utils/parse_logs.py
@@ -1,23 +1,14 @@
 #!/bin/bash
 
-# Define endpoint IP (replace with your openSUSE VM IP)
-OPENSUSE_IP="192.168.122.105" #Change this 
-REMOTE_FILE="log_export/messages.log"
-DEST_FILE="logs/opensuse_messages.log"
+# Fetch new lines of the openSUSE messages log. Endpoint addresses now live
+# in data/collector_inventory.json; the collector only downloads what was
+# appended since the last run and refetches in full after log rotation.
+cd "$( dirname "${BASH_SOURCE[0]}" )" || exit 1
 
-# Create logs directory if it doesn't exist
-mkdir -p logs
-
-# Fetch the log file via Apache
-curl -s "http://$OPENSUSE_IP/$REMOTE_FILE" -o "$DEST_FILE"
-
-# Check if download succeeded
-if [[ $? -eq 0 ]]; then
-    echo "Log fetched and saved to $DEST_FILE"
-else
+python3 utils/log_collector.py --only opensuse "$@" || {
     echo "Failed to fetch log from openSUSE endpoint"
     exit 1
-fi
+}
 
 # OPTIONAL: Automatically parse the logs
 # python3 utils/parse_logs.py
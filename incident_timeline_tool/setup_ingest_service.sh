@@ -0,0 +1,42 @@
+#!/bin/bash
+
+# Absolute path to project directory
+PROJECT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Paths
+DAEMON_SCRIPT="$PROJECT_DIR/utils/ingest_daemon.py"
+UNIT_NAME="astro-siem-ingest.service"
+UNIT_FILE="/etc/systemd/system/$UNIT_NAME"
+LEGACY_PARSER="$PROJECT_DIR/utils/parse_logs.py"
+
+if [ "$EUID" -ne 0 ]; then
+  echo "[!] Run as root to install the systemd service."
+  exit 1
+fi
+
+# The daemon replaces the old two-minute copy-and-reparse cron job
+if crontab -l 2>/dev/null | grep -F "$LEGACY_PARSER" >/dev/null; then
+  crontab -l 2>/dev/null | grep -vF "$LEGACY_PARSER" | crontab -
+  echo "[+] Removed legacy parse_logs.py cron job."
+fi
+
+cat > "$UNIT_FILE" <<EOFUNIT
+[Unit]
+Description=AstroSIEM log ingestion daemon
+After=network.target
+
+[Service]
+Type=simple
+WorkingDirectory=$PROJECT_DIR
+ExecStart=/usr/bin/env python3 $DAEMON_SCRIPT
+Restart=on-failure
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOFUNIT
+
+systemctl daemon-reload
+systemctl enable --now "$UNIT_NAME"
+echo "[+] $UNIT_NAME installed and started."
+echo "    Sources: $PROJECT_DIR/data/ingest_sources.json"
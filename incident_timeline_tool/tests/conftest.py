@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOL_DIR)
+
+
+@pytest.fixture(autouse=True)
+def tool_dir(monkeypatch):
+    # Rule and config files are read relative to incident_timeline_tool/, as the scripts run from there
+    monkeypatch.chdir(TOOL_DIR)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db.alert_store import AlertStore
+from utils.alert_suppressor import AlertSuppressor
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    store.connect()
+    yield store
+    store.close()
+
+
+def alert(source_ip="203.0.113.5"):
+    return {
+        "rule_id": "AUTH-001",
+        "hostname": "web1",
+        "source_ip": source_ip,
+        "severity": "HIGH",
+        "title": "Failed login",
+        "description": "Failed password",
+    }
+
+
+def run(store, times, ips=("203.0.113.5",), max_keys=100):
+    suppressor = AlertSuppressor(store, window_seconds=60, max_keys=max_keys)
+    for seconds in times:
+        for ip in ips:
+            suppressor.submit(alert(ip), T0 + timedelta(seconds=seconds))
+    suppressor.flush()
+    return suppressor
+
+
+def rows(store):
+    return [
+        tuple(row)
+        for row in store.conn.execute(
+            "SELECT source_ip, count, first_seen, last_seen FROM alerts ORDER BY id"
+        )
+    ]
+
+
+def test_repeats_within_window_fold_into_one_alert(store):
+    suppressor = run(store, [0, 30, 60, 90])
+    assert (suppressor.inserted, suppressor.suppressed) == (1, 3)
+    assert rows(store) == [
+        ("203.0.113.5", 4, T0.isoformat(), (T0 + timedelta(seconds=90)).isoformat())
+    ]
+
+
+def test_quiet_gap_longer_than_window_starts_new_alert(store):
+    run(store, [0, 30, 200])
+    assert [row[1] for row in rows(store)] == [2, 1]
+
+
+def test_rescan_does_not_inflate_counts(store):
+    run(store, [0, 30, 60])
+    again = run(store, [0, 30, 60])
+    assert (again.inserted, again.suppressed) == (0, 3)
+    assert [row[1] for row in rows(store)] == [3]
+
+
+def test_rescan_counts_only_new_events(store):
+    run(store, [0, 30])
+    run(store, [0, 30, 60, 90])
+    assert [row[1] for row in rows(store)] == [4]
+
+
+def test_eviction_keeps_pending_counts(store):
+    # Two keys through a one-entry cache: each submit evicts the other key
+    run(store, range(0, 600, 30), ips=("203.0.113.5", "198.51.100.7"), max_keys=1)
+    assert [row[1] for row in rows(store)] == [20, 20]
+    again = run(store, range(0, 600, 30), ips=("203.0.113.5", "198.51.100.7"), max_keys=1)
+    assert again.inserted == 0
+    assert [row[1] for row in rows(store)] == [20, 20]
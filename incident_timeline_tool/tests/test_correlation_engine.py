@@ -0,0 +1,65 @@
+from utils.correlation_engine import CorrelationEngine, CorrelationRule
+
+BRUTE_THEN_LOGIN = {
+    "id": "CORR-T1",
+    "key": ["hostname", "source_ip"],
+    "window_seconds": 600,
+    "steps": [
+        {"pattern": r"Failed password for \S+ from (?P<source_ip>[\d.]+)", "min_count": 3},
+        {"pattern": r"Accepted password for \S+ from (?P<source_ip>[\d.]+)"},
+    ],
+}
+
+
+def event(ts, message, hostname="web1"):
+    return {"ts": ts, "hostname": hostname, "message": message}
+
+
+def failed(ts, ip="203.0.113.5", hostname="web1"):
+    return event(ts, f"Failed password for root from {ip} port 22 ssh2", hostname)
+
+
+def accepted(ts, ip="203.0.113.5", hostname="web1"):
+    return event(ts, f"Accepted password for root from {ip} port 22 ssh2", hostname)
+
+
+def engine():
+    return CorrelationEngine([CorrelationRule(BRUTE_THEN_LOGIN)])
+
+
+def test_sequence_fires_once_all_steps_match():
+    alerts = list(engine().feed([failed(0), failed(10), failed(20), accepted(30)]))
+    assert len(alerts) == 1
+    assert alerts[0]["rule_id"] == "CORR-T1"
+    assert alerts[0]["source_ip"] == "203.0.113.5"
+    assert alerts[0]["first_seen"] < alerts[0]["last_seen"]
+
+
+def test_step_needs_its_min_count():
+    assert list(engine().feed([failed(0), failed(10), accepted(30)])) == []
+
+
+def test_keys_are_tracked_separately():
+    events = [failed(0), failed(10, ip="198.51.100.7"), failed(20), accepted(30)]
+    assert list(engine().feed(events)) == []
+
+
+def test_sequence_expires_after_window():
+    correlator = engine()
+    assert list(correlator.feed([failed(0), failed(10), failed(20), accepted(700)])) == []
+    assert correlator.expired == 1
+
+
+def test_snapshot_carries_partial_sequence_to_next_stream():
+    first = engine()
+    assert list(first.feed([failed(0), failed(10), failed(20)])) == []
+    second = engine()
+    second.restore(first.snapshot())
+    assert len(list(second.feed([accepted(30)]))) == 1
+
+
+def test_finish_drops_partial_sequences():
+    correlator = engine()
+    list(correlator.feed([failed(0), failed(10), failed(20)]))
+    correlator.finish()
+    assert list(correlator.feed([accepted(30)])) == []
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.log_collector import LogCollector
+
+RANGE = re.compile(r"bytes=(\d+)-$")
+
+
+class FileServer(ThreadingHTTPServer):
+    """Serves `files` (path -> bytes) with ETags, If-None-Match and open-ended Range requests."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files = {}
+        self.statuses = []
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            return self._send(404, b"")
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, None, {"ETag": etag})
+        match = RANGE.match(self.headers.get("Range", ""))
+        if match is None:
+            return self._send(200, body, {"ETag": etag})
+        start = int(match.group(1))
+        if start >= len(body):
+            return self._send(416, b"", {"Content-Range": f"bytes */{len(body)}"})
+        headers = {"ETag": etag, "Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"}
+        return self._send(206, body[start:], headers)
+
+    def _send(self, status, body, headers=None):
+        self.server.statuses.append(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def lines(start, count):
+    return b"".join(b"Jan  1 00:00:%02d web1 sshd[1]: line %d\n" % (i % 60, i) for i in range(start, start + count))
+
+
+def collect(collector):
+    [result] = collector.collect()
+    return result
+
+
+@pytest.fixture
+def flat(server, tmp_path):
+    dest = tmp_path / "web1.log"
+    collector = LogCollector([{"name": "web1", "url": server.url("/secure.log"), "dest": str(dest)}], {})
+    yield collector, dest
+    collector.close()
+
+
+def test_first_fetch_is_full_then_unchanged(server, flat):
+    collector, dest = flat
+    server.files["/secure.log"] = lines(0, 50)
+    assert collect(collector)["status"] == "full"
+    assert collect(collector)["status"] == "unchanged"
+    assert server.statuses == [200, 304]
+    assert dest.read_bytes() == server.files["/secure.log"]
+
+
+def test_appended_bytes_are_fetched_by_range(server, flat):
+    collector, dest = flat
+    server.files["/secure.log"] = lines(0, 50)
+    collect(collector)
+    server.files["/secure.log"] += lines(50, 10)
+    result = collect(collector)
+    assert result["status"] == "appended"
+    assert result["bytes"] == len(lines(50, 10))
+    assert server.statuses[-1] == 206
+    assert dest.read_bytes() == server.files["/secure.log"]
+
+
+def test_shorter_file_is_refetched_after_416(server, flat):
+    collector, dest = flat
+    server.files["/secure.log"] = lines(0, 50)
+    collect(collector)
+    server.files["/secure.log"] = lines(100, 2)
+    assert collect(collector)["status"] == "rotated"
+    assert server.statuses[-2:] == [416, 200]
+    assert dest.read_bytes() == server.files["/secure.log"]
+
+
+def test_rotated_file_that_grew_is_refetched(server, flat):
+    collector, dest = flat
+    server.files["/secure.log"] = lines(0, 50)
+    collect(collector)
+    # Longer than before, but the bytes where the local copy ends differ
+    server.files["/secure.log"] = lines(1000, 60)
+    assert collect(collector)["status"] == "rotated"
+    assert server.statuses[-2:] == [206, 200]
+    assert dest.read_bytes() == server.files["/secure.log"]
+
+
+def test_collector_closes_its_connections(server, flat):
+    collector, _ = flat
+    server.files["/secure.log"] = lines(0, 5)
+    collect(collector)
+    collect(collector)
+    assert collector.connections.open_count() == 1
+    collector.close()
+    assert collector.connections.open_count() == 0
+
+
+def publish_export(server, stamp, entries):
+    """Lay out an agent export: gzip each delta and list it in manifest.json."""
+    sources = []
+    for filename, data, fields in entries:
+        raw = gzip.compress(data)
+        server.files[f"/latest/{filename}"] = raw
+        sources.append(dict(
+            fields,
+            filename=filename,
+            size=len(raw),
+            sha256=hashlib.sha256(raw).hexdigest(),
+            encoding="gzip",
+        ))
+    server.files["/latest/manifest.json"] = json.dumps(
+        {"export_timestamp": stamp, "sources": sources}
+    ).encode()
+
+
+def delta(data, inode, offset):
+    return {"source": "/var/log/secure", "inode": inode, "offset": offset, "length": len(data), "end_offset": offset + len(data)}
+
+
+@pytest.fixture
+def export(server, tmp_path):
+    endpoint = {"name": "web1", "mode": "export", "url": server.url("/latest/"), "dest": str(tmp_path)}
+    collector = LogCollector([endpoint], {})
+    yield collector, tmp_path / "web1_secure.log"
+    collector.close()
+
+
+def test_export_deltas_are_appended_once(server, export):
+    collector, dest = export
+    first, second = lines(0, 5), lines(5, 5)
+    publish_export(server, "t1", [("secure.gz", first, delta(first, 7, 0))])
+    assert collect(collector)["bytes"] == len(first)
+    assert collect(collector)["status"] == "unchanged"
+    # Re-shipped from offset 0: only the new half is appended
+    publish_export(server, "t2", [("secure.gz", first + second, delta(first + second, 7, 0))])
+    assert collect(collector)["bytes"] == len(second)
+    assert dest.read_bytes() == first + second
+
+
+def test_export_rotation_and_gap(server, export):
+    collector, dest = export
+    first, tail, fresh = lines(0, 5), lines(5, 2), lines(100, 3)
+    publish_export(server, "t1", [("secure.gz", first, delta(first, 7, 0))])
+    collect(collector)
+    publish_export(server, "t2", [
+        ("secure.rotated.gz", tail, dict(delta(tail, 7, len(first)), source="/var/log/secure.1")),
+        ("secure.gz", fresh, delta(fresh, 8, 0)),
+    ])
+    result = collect(collector)
+    assert (result["bytes"], result["gaps"]) == (len(tail + fresh), 0)
+    publish_export(server, "t3", [("secure.gz", first, delta(first, 8, len(fresh) + 40))])
+    assert collect(collector)["gaps"] == 40
+    assert dest.read_bytes() == first + tail + fresh + first
+
+
+def test_export_with_bad_checksum_is_rejected(server, export):
+    collector, dest = export
+    data = lines(0, 5)
+    publish_export(server, "t1", [("secure.gz", data, delta(data, 7, 0))])
+    server.files["/latest/secure.gz"] = gzip.compress(lines(50, 5))
+    result = collect(collector)
+    assert result["status"] == "error"
+    assert not dest.exists()
+    assert "web1" not in collector.state
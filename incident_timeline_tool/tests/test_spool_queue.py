@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from utils import spool_queue
+from utils.spool_queue import SpoolWorker, enqueue_lines, parse_segment_name, reap_expired, spool_status
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool")
+
+
+@pytest.fixture
+def worker(spool, tmp_path):
+    worker = SpoolWorker(spool, worker_id="w1", db_path=str(tmp_path / "siem.db"))
+    yield worker
+    worker.close()
+
+
+def enqueue(spool, hostname):
+    return enqueue_lines(spool, hostname, [b"Jan  1 00:00:01 web1 sshd[1]: hello\n"])
+
+
+def test_claim_takes_oldest_segment(spool, worker):
+    first = enqueue(spool, "web1")
+    enqueue(spool, "web1")
+    claimed = worker.claim()
+    assert os.path.basename(claimed) == f"{first}@w1"
+    assert spool_status(spool)["claimed"] == 1
+
+
+def test_host_with_a_claimed_segment_waits(spool, worker):
+    enqueue(spool, "web1")
+    enqueue(spool, "web1")
+    other = enqueue(spool, "db1")
+    assert worker.claim() is not None
+    # web1's second segment waits for its first; db1 is free
+    claimed = worker.claim()
+    assert parse_segment_name(os.path.basename(claimed))["name"] == other
+    assert worker.claim() is None
+
+
+def test_expired_lease_returns_segment_with_next_attempt(spool, worker):
+    name = enqueue(spool, "web1")
+    worker.claim()
+    assert reap_expired(spool, lease_seconds=3600) == 0
+    assert reap_expired(spool, lease_seconds=0) == 1
+    [released] = os.listdir(os.path.join(spool, "incoming"))
+    assert parse_segment_name(released)["attempt"] == parse_segment_name(name)["attempt"] + 1
+
+
+def test_segment_fails_after_max_attempts(spool, worker):
+    enqueue(spool, "web1")
+    for _ in range(spool_queue.MAX_ATTEMPTS):
+        assert worker.claim() is not None
+        reap_expired(spool, lease_seconds=0)
+    assert spool_status(spool) == {"incoming": 0, "claimed": 0, "done": 0, "failed": 1}
+
+
+def test_processed_segment_is_committed(spool, worker):
+    enqueue(spool, "web1")
+    claimed = worker.claim()
+    assert worker.process(claimed)
+    assert spool_status(spool)["done"] == 1
+    assert worker.claim() is None
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from utils.parse_logs import TimestampResolver
+
+
+def years(resolver, lines):
+    return [resolver.parse(line)[0].year for line in lines]
+
+
+def test_year_advances_when_december_rolls_into_january():
+    resolver = TimestampResolver(reference=datetime(2026, 1, 2, tzinfo=timezone.utc))
+    lines = [
+        "Dec 31 23:59:58 web1 sshd[1]: a",
+        "Dec 31 23:59:59 web1 sshd[1]: b",
+        "Jan  1 00:00:01 web1 sshd[1]: c",
+    ]
+    assert years(resolver, lines) == [2025, 2025, 2026]
+
+
+def test_first_line_in_the_future_is_last_year():
+    resolver = TimestampResolver(reference=datetime(2026, 3, 1, tzinfo=timezone.utc))
+    assert years(resolver, ["Nov  5 10:00:00 web1 sshd[1]: a"]) == [2025]
+
+
+def test_small_step_back_keeps_the_year():
+    resolver = TimestampResolver(reference=datetime(2026, 6, 1, tzinfo=timezone.utc))
+    lines = ["May  3 10:00:00 web1 sshd[1]: a", "May  2 09:00:00 web1 sshd[1]: b"]
+    assert years(resolver, lines) == [2026, 2026]
+
+
+def test_resume_continues_across_a_rollover():
+    first = TimestampResolver(reference=datetime(2025, 12, 31, 12, tzinfo=timezone.utc))
+    assert years(first, ["Dec 31 23:59:59 web1 sshd[1]: a"]) == [2025]
+    # A later stretch of the same log, read after the new year began
+    second = TimestampResolver(reference=datetime(2026, 1, 1, 1, tzinfo=timezone.utc))
+    second.resume(first.position())
+    assert years(second, ["Jan  1 00:00:01 web1 sshd[1]: b"]) == [2026]
+
+
+def test_naive_timestamps_use_the_file_timezone():
+    resolver = TimestampResolver(tz=ZoneInfo("Europe/Berlin"))
+    timestamp, rest = resolver.parse("2026-07-01T12:00:00 web1 sshd[1]: a")
+    assert timestamp.astimezone(timezone.utc).hour == 10
+    assert rest == "web1 sshd[1]: a"
+
+
+def test_unrecognised_timestamp_raises():
+    with pytest.raises(ValueError):
+        TimestampResolver().parse("not a log line")
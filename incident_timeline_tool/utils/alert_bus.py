@@ -0,0 +1,108 @@
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+SUBSCRIBER_BUFFER_SIZE = 256
+
+
+class Subscription:
+    """
+    One listener's bounded buffer of (alert_id, payload) pairs. When the
+    listener falls behind by more than `max_size` alerts it is marked as
+    overflowed instead of growing without bound; the consumer is expected
+    to reconnect and resume from the last id it delivered.
+    """
+
+    def __init__(self, max_size: int = SUBSCRIBER_BUFFER_SIZE):
+        self.max_size = max_size
+        self.overflowed = False
+        self._buffer = deque()
+        self._cond = threading.Condition()
+
+    def push(self, item: Tuple[int, str]) -> bool:
+        with self._cond:
+            if self.overflowed:
+                return False
+            if len(self._buffer) >= self.max_size:
+                self.overflowed = True
+                self._buffer.clear()
+                self._cond.notify()
+                return False
+            self._buffer.append(item)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout: float) -> List[Tuple[int, str]]:
+        with self._cond:
+            if not self._buffer and not self.overflowed:
+                self._cond.wait(timeout)
+            items = list(self._buffer)
+            self._buffer.clear()
+            return items
+
+
+class AlertBus:
+    """
+    In-process publish/subscribe for newly stored alerts. Each alert is
+    serialised once on publish and the same payload string is handed to
+    every subscriber.
+    """
+
+    def __init__(self, buffer_size: int = SUBSCRIBER_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self) -> Subscription:
+        sub = Subscription(self.buffer_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, alert: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        # Most inserts happen with nobody listening; skip the encoding then
+        if not subscribers:
+            return
+        item = (alert["id"], encode_alert(alert))
+        for sub in subscribers:
+            if not sub.push(item):
+                self.unsubscribe(sub)
+                with self._lock:
+                    self.dropped_subscribers += 1
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def encode_alert(alert: Dict) -> str:
+    alert = dict(alert)
+    techniques = alert.get("mitre_techniques")
+    if isinstance(techniques, str):
+        try:
+            alert["mitre_techniques"] = json.loads(techniques)
+        except ValueError:
+            pass
+    elif techniques is None:
+        alert["mitre_techniques"] = []
+    return json.dumps(alert, default=str)
+
+
+def format_sse(payload: str, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {payload}")
+    return "\n".join(lines) + "\n\n"
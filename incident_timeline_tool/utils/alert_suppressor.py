@@ -0,0 +1,199 @@
+import hashlib
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from db.alert_store import AlertStore
+from utils.metrics import REGISTRY
+from utils.records import Detection
+
+DEFAULT_WINDOW_SECONDS = 60
+MAX_TRACKED_KEYS = 10000
+
+ALERTS_SUPPRESSED = REGISTRY.counter(
+    "siem_alerts_suppressed_total", "Detections folded into an existing alert", ("rule",)
+)
+
+_LEADING_TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\dT\S+|[A-Z][a-z]{2}\s+\d+\s+[\d:]+)\s+")
+_VARIABLE_TOKENS = re.compile(r"0x[0-9a-fA-F]+|\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def message_fingerprint(text: str) -> str:
+    """
+    Hash of a log line with its timestamp, numbers (pids, ports, counters)
+    and whitespace runs normalised away, so repeats of the same message
+    share a fingerprint.
+    """
+    text = _LEADING_TIMESTAMP.sub("", text or "")
+    text = _VARIABLE_TOKENS.sub("#", text)
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=8).hexdigest()
+
+
+def dedup_key(alert: Dict) -> str:
+    discriminator = alert.get("source_ip") or message_fingerprint(
+        alert.get("matched_text") or alert.get("description", "")
+    )
+    return f"{alert.get('rule_id')}|{alert.get('hostname') or ''}|{discriminator}"
+
+
+def _as_utc(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # Naive values come from alerts stored before timestamps carried a zone; they are UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class _Entry:
+    __slots__ = ("alert_id", "last_seen", "pending", "watermark")
+
+    def __init__(self, alert_id: int, last_seen: datetime, watermark: Optional[datetime] = None):
+        self.alert_id = alert_id
+        self.last_seen = last_seen
+        self.pending = 0
+        # last_seen as already stored by an earlier run; events at or before
+        # it were counted then and are skipped when a file is rescanned
+        self.watermark = watermark
+
+
+class AlertSuppressor:
+    """
+    Folds repeated detections into one alert row.
+
+    Detections sharing a dedup key (rule, host, source IP or message
+    fingerprint) whose event times fall within `window_seconds` of the
+    alert's last_seen are counted onto that alert instead of inserted.
+    The window slides, so a steady stream stays one alert until it goes
+    quiet for longer than the window. Events at or before an alert's
+    stored last_seen were counted by an earlier run and are skipped, so
+    rescanning the same log file does not inflate counts. Count updates
+    are buffered and written in one transaction by flush(). Entries this
+    run inserted or counted onto are set aside when evicted from the
+    cache and picked up again if their alert comes back, so a run never
+    mistakes its own pending counts for an earlier run's.
+    """
+
+    def __init__(
+        self,
+        alert_store: AlertStore,
+        window_seconds: int = DEFAULT_WINDOW_SECONDS,
+        max_keys: int = MAX_TRACKED_KEYS,
+    ):
+        self.alert_store = alert_store
+        self.window = timedelta(seconds=window_seconds)
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        # dedup key -> entries evicted from _entries that this run inserted or has pending counts for
+        self._evicted = {}
+        self.inserted = 0
+        self.suppressed = 0
+
+    def _lookup(self, key: str, seen: datetime) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if abs(seen - entry.last_seen) <= self.window:
+                return entry
+            # Outside the cached alert's window. Events can arrive out of
+            # order (rescans, several workers), so ask the store which
+            # alert, if any, covers this event before deciding
+            self._set_aside(key, entry)
+            del self._entries[key]
+        entry = self._load(key, seen)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def _load(self, key: str, seen: datetime) -> Optional[_Entry]:
+        # The stored row lacks this run's pending counts and last_seen; an
+        # entry set aside earlier in the run still has them
+        evicted = self._evicted.get(key, [])
+        for index, entry in enumerate(evicted):
+            if abs(seen - entry.last_seen) <= self.window:
+                return evicted.pop(index)
+        row = self.alert_store.find_open_alert(
+            key, (seen - self.window).isoformat(), (seen + self.window).isoformat()
+        )
+        if row is None or not row["last_seen"]:
+            return None
+        for index, entry in enumerate(evicted):
+            if entry.alert_id == row["id"]:
+                return evicted.pop(index)
+        last_seen = _as_utc(row["last_seen"])
+        return _Entry(row["id"], last_seen, watermark=last_seen)
+
+    def _set_aside(self, key: str, entry: _Entry):
+        if entry.pending or entry.watermark is None:
+            self._evicted.setdefault(key, []).append(entry)
+
+    def _remember(self, key: str, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._set_aside(evicted_key, evicted)
+
+    def submit(self, alert, seen=None) -> bool:
+        """
+        Store `alert` (a Detection or an alert dict) unless it duplicates
+        a recent one. `seen` is the event time (datetime or ISO string);
+        defaults to alert["first_seen"], then to now. A new row is stored
+        with last_seen = `seen`, and keeps the alert's own first_seen when
+        that is earlier. Returns True when a new alert row was inserted.
+        """
+        seen = _as_utc(seen or alert.get("first_seen") or datetime.now(timezone.utc))
+        key = dedup_key(alert)
+        entry = self._lookup(key, seen)
+
+        if entry is not None and entry.watermark is not None and seen <= entry.watermark:
+            self.suppressed += 1
+            ALERTS_SUPPRESSED.labels(alert.get("rule_id") or "").inc()
+            return False
+
+        if entry is not None and abs(seen - entry.last_seen) <= self.window:
+            self.suppressed += 1
+            ALERTS_SUPPRESSED.labels(alert.get("rule_id") or "").inc()
+            entry.pending += 1
+            if seen > entry.last_seen:
+                entry.last_seen = seen
+            return False
+
+        if entry is not None:
+            self._set_aside(key, entry)
+        stamp = seen.isoformat()
+        # `seen` drives the window and watermark; an earlier first_seen on the
+        # alert itself (a correlation sequence's first event) is kept as is
+        first_seen = alert.get("first_seen")
+        first = stamp if not first_seen or _as_utc(first_seen) >= seen else _as_utc(first_seen).isoformat()
+        if isinstance(alert, Detection):
+            alert = alert._replace(dedup_key=key, count=1, first_seen=first, last_seen=stamp)
+        else:
+            alert = dict(alert, dedup_key=key, count=1, first_seen=first, last_seen=stamp)
+        alert_id = self.alert_store.insert_alert(alert)
+        self._remember(key, _Entry(alert_id, seen))
+        self.inserted += 1
+        return True
+
+    def flush(self):
+        """
+        Write buffered counts and forget cached keys, so alerts closed or
+        acknowledged between runs are not folded into.
+        """
+        entries = [e for evicted in self._evicted.values() for e in evicted]
+        entries += self._entries.values()
+        self.alert_store.fold_duplicates(
+            [(e.alert_id, e.pending, e.last_seen.isoformat()) for e in entries if e.pending]
+        )
+        self._evicted = {}
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "inserted": self.inserted,
+            "suppressed": self.suppressed,
+            "tracked_keys": len(self._entries),
+        }
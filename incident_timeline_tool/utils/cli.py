@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the SIEM's periodic and long-running jobs.
+
+    ./astro-siem parse                 # logs/ -> data/parsed_logs.json and the event store
+    ./astro-siem detect                # rule, brute-force and correlation detection
+    ./astro-siem fim [--parse]         # file integrity scan, optionally parse its log
+    ./astro-siem serve [--port 5000]   # development API server
+    ./astro-siem bench [ARGS...]       # benchmarks/run_benchmarks.py
+    ./astro-siem anomaly [--days 14]   # event-rate spikes from the minute rollups
+
+parse, detect and fim take --profile [cpu|memory|all] (see utils/profiling.py).
+
+Run it from incident_timeline_tool/, like the scripts it wraps. Each
+subcommand imports what it needs only when it runs, so a periodic `detect`
+does not pay for Flask, PyYAML or the benchmark harness at start-up.
+benchmarks/import_budget.py measures those costs against budgets.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_PORT = 5000
+
+# Subcommands that hand their remaining arguments to an existing script's main()
+PASSTHROUGH = {
+    "bench": ("benchmarks.run_benchmarks", "Run the benchmark suite"),
+    "ingest": ("utils.ingest_daemon", "Tail log files and ingest new lines continuously"),
+    "collect": ("utils.log_collector", "Fetch new log data from every endpoint"),
+    "spool": ("utils.spool_queue", "Enqueue, process or inspect spool segments"),
+    "anomaly": ("utils.rate_anomaly", "Raise alerts for per-host event-rate spikes (needs NumPy)"),
+}
+
+# Modules each subcommand imports; benchmarks/import_budget.py times these
+COMMAND_MODULES = {
+    "parse": ("utils.parse_logs",),
+    "detect": ("utils.run_detection",),
+    "fim": ("utils.fim_agent", "utils.parse_fim_logs"),
+    "serve": ("api.alerts_api",),
+    **{name: (module,) for name, (module, _) in PASSTHROUGH.items()},
+}
+
+
+def cmd_parse(args) -> int:
+    from utils.parse_logs import main
+
+    main(args.profile, args.profile_output)
+    return 0
+
+
+def cmd_detect(args) -> int:
+    from utils.run_detection import main
+
+    return main(args.profile, args.profile_output)
+
+
+def cmd_fim(args) -> int:
+    from utils.fim_agent import main
+
+    main(args.profile, args.profile_output)
+    if args.parse:
+        from utils.parse_fim_logs import parse_fim_logs
+
+        parse_fim_logs()
+    return 0
+
+
+def cmd_serve(args) -> int:
+    try:
+        from api.alerts_api import create_app
+    except ImportError as e:
+        print(f"[!] serve needs the API dependencies: {e}")
+        return 1
+    # Development server only; see api/wsgi.py for production serving
+    print(f"Starting SIEM API on port {args.port}")
+    create_app().run(host=args.host, port=args.port, debug=args.debug, threaded=True)
+    return 0
+
+
+def run_passthrough(command: str, argv) -> int:
+    module = importlib.import_module(PASSTHROUGH[command][0])
+    sys.argv = [f"astro-siem {command}"] + list(argv)
+    return module.main() or 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # Not needed by the pass-through subcommands, which skip this parser
+    from utils.profiling import add_profile_arguments
+
+    parser = argparse.ArgumentParser(prog="astro-siem", description="AstroSIEM command line")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    parse = commands.add_parser("parse", help="Parse logs/ into the event store and data/parsed_logs.json")
+    add_profile_arguments(parse)
+    detect = commands.add_parser("detect", help="Run rule, brute-force and correlation detection")
+    add_profile_arguments(detect)
+
+    fim = commands.add_parser("fim", help="Scan watched files for integrity changes")
+    fim.add_argument("--parse", action="store_true", help="also rewrite data/parsed_fim_logs.json")
+    add_profile_arguments(fim)
+
+    serve = commands.add_parser("serve", help="Run the alerts API development server")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=int(os.environ.get("PORT", DEFAULT_PORT)))
+    serve.add_argument("--debug", action="store_true", default=os.environ.get("FLASK_DEBUG", "0") == "1")
+
+    # Listed for --help; main() dispatches these before argparse sees their options
+    for name, (_, help_text) in PASSTHROUGH.items():
+        commands.add_parser(name, help=help_text)
+    return parser
+
+
+HANDLERS = {
+    "parse": cmd_parse,
+    "detect": cmd_detect,
+    "fim": cmd_fim,
+    "serve": cmd_serve,
+}
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in PASSTHROUGH:
+        return run_passthrough(argv[0], argv[1:])
+    args = build_parser().parse_args(argv)
+    return HANDLERS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
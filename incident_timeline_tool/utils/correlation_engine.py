@@ -0,0 +1,266 @@
+import json
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CORRELATION_RULES_FILE = "data/correlation_rules.json"
+MAX_CORRELATION_STATES = 50000
+SWEEP_INTERVAL = 1000
+DEFAULT_WINDOW_SECONDS = 300
+
+
+def load_correlation_rules(path: str = CORRELATION_RULES_FILE) -> List["CorrelationRule"]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Same {"enabled": ..., "rules": [...]} wrapper as mitre_auth_rules.json
+    if isinstance(data, dict):
+        data = data.get("rules", []) if data.get("enabled", True) else []
+    return [CorrelationRule(spec) for spec in data if spec.get("enabled", True)]
+
+
+class CorrelationStep:
+    __slots__ = ("pattern", "min_count")
+
+    def __init__(self, spec: Dict):
+        self.pattern = re.compile(spec["pattern"], re.IGNORECASE)
+        self.min_count = max(1, int(spec.get("min_count", 1)))
+
+
+class CorrelationRule:
+    """
+    An ordered sequence of message patterns that must all be seen for the
+    same key within `window_seconds` of the first matching event. Key
+    fields come from named regex groups, falling back to event fields
+    such as hostname.
+    """
+
+    def __init__(self, spec: Dict):
+        self.id = spec["id"]
+        self.name = spec.get("name", self.id)
+        self.severity = spec.get("severity", "MEDIUM")
+        self.description = spec.get("description", "")
+        self.mitre = list(spec.get("mitre", []))
+        key = spec.get("key", ["hostname"])
+        self.key = (key,) if isinstance(key, str) else tuple(key)
+        self.window_seconds = float(spec.get("window_seconds", DEFAULT_WINDOW_SECONDS))
+        try:
+            self.steps = [CorrelationStep(step) for step in spec.get("steps", [])]
+        except re.error as e:
+            raise ValueError(f"{self.id}: invalid step pattern: {e}")
+        if not self.steps:
+            raise ValueError(f"{self.id}: correlation rule needs at least one step")
+
+    def key_for(self, event: Dict, fields: Dict) -> Optional[Tuple]:
+        values = []
+        for name in self.key:
+            value = fields.get(name) or event.get(name)
+            if not value:
+                return None
+            values.append(value)
+        return tuple(values)
+
+
+class _State:
+    __slots__ = ("rule", "step", "count", "events", "started", "updated", "fields")
+
+    def __init__(self, rule: CorrelationRule, ts: float):
+        self.rule = rule
+        self.step = 0
+        self.count = 0
+        self.events = 0
+        self.started = ts
+        self.updated = ts
+        self.fields = {}
+
+
+class CorrelationEngine:
+    """
+    Runs correlation rules over an ordered event stream.
+
+    Each (rule, key) pair has a small state machine that advances when the
+    next step's pattern matches. Partial sequences expire once the stream
+    moves more than the rule's window past their first event, and at most
+    `max_states` are kept, least recently updated evicted first, so memory
+    is bounded however many distinct keys the stream carries.
+
+    Events are dicts with "ts" (UTC epoch seconds), "message" and any key
+    fields (e.g. "hostname"); "raw" is copied into alerts when present.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[CorrelationRule],
+        max_states: int = MAX_CORRELATION_STATES,
+    ):
+        self.rules = list(rules)
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._max_window = max((r.window_seconds for r in self.rules), default=0)
+        self._watermark = None
+        self.events_processed = 0
+        self.alerts_fired = 0
+        self.expired = 0
+        self.evicted = 0
+        self.peak_states = 0
+        self.fired_by_rule = {}
+
+    def process(self, event: Dict) -> List[Dict]:
+        ts = event["ts"]
+        if self._watermark is None or ts > self._watermark:
+            self._watermark = ts
+        self.events_processed += 1
+        if self.events_processed % SWEEP_INTERVAL == 0:
+            self._sweep()
+
+        message = event.get("message", "")
+        alerts = []
+        for rule in self.rules:
+            alert = self._advance(rule, event, message, ts)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    def feed(self, events: Iterable[Dict]) -> Iterator[Dict]:
+        for event in events:
+            yield from self.process(event)
+
+    def _advance(self, rule: CorrelationRule, event: Dict, message: str, ts: float) -> Optional[Dict]:
+        for index, step in enumerate(rule.steps):
+            match = step.pattern.search(message)
+            if match is None:
+                continue
+            fields = {k: v for k, v in match.groupdict().items() if v}
+            key = rule.key_for(event, fields)
+            if key is None:
+                continue
+
+            state_key = (rule.id, key)
+            state = self._states.get(state_key)
+            if state is not None and ts - state.started > rule.window_seconds:
+                del self._states[state_key]
+                self.expired += 1
+                state = None
+            if state is None:
+                if index != 0:
+                    continue
+                state = self._track(state_key, _State(rule, ts))
+            if state.step != index:
+                continue
+
+            state.count += 1
+            state.events += 1
+            state.updated = ts
+            state.fields.update(fields)
+            self._states.move_to_end(state_key)
+            if state.count < step.min_count:
+                return None
+            state.step += 1
+            state.count = 0
+            if state.step < len(rule.steps):
+                return None
+
+            del self._states[state_key]
+            return self._fire(state, event, ts)
+        return None
+
+    def _track(self, state_key: Tuple, state: _State) -> _State:
+        self._states[state_key] = state
+        if len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+            self.evicted += 1
+        self.peak_states = max(self.peak_states, len(self._states))
+        return state
+
+    def _sweep(self):
+        # States are ordered by last update, so expired ones sit at the front
+        horizon = self._watermark - self._max_window
+        while self._states:
+            state_key, state = next(iter(self._states.items()))
+            if state.updated >= horizon:
+                break
+            del self._states[state_key]
+            self.expired += 1
+
+    def _fire(self, state: _State, event: Dict, ts: float) -> Dict:
+        rule = state.rule
+        self.alerts_fired += 1
+        self.fired_by_rule[rule.id] = self.fired_by_rule.get(rule.id, 0) + 1
+        details = ", ".join(f"{k}={v}" for k, v in sorted(state.fields.items()))
+        return {
+            "rule_id": rule.id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "severity": rule.severity,
+            "title": rule.name,
+            "description": f"{rule.description} ({details}; {state.events} events)",
+            "matched_text": event.get("raw", event.get("message", "")),
+            "hostname": event.get("hostname") or state.fields.get("hostname"),
+            "source_ip": state.fields.get("source_ip"),
+            "mitre_techniques": json.dumps(rule.mitre),
+            "first_seen": _iso(state.started),
+            "last_seen": _iso(ts),
+        }
+
+    def finish(self):
+        """
+        End the current stream: drop partial sequences and reset the clock
+        so the next stream (e.g. another host's log) starts clean.
+        """
+        self._states.clear()
+        self._watermark = None
+
+    def snapshot(self) -> Dict:
+        """Partial sequences and clock as JSON-able data, for restore() on a later part of the stream."""
+        return {
+            "watermark": self._watermark,
+            "states": [
+                {
+                    "rule": rule_id,
+                    "key": list(key),
+                    "step": state.step,
+                    "count": state.count,
+                    "events": state.events,
+                    "started": state.started,
+                    "updated": state.updated,
+                    "fields": state.fields,
+                }
+                for (rule_id, key), state in self._states.items()
+            ],
+        }
+
+    def restore(self, data: Dict):
+        """
+        Start a stream where snapshot() left it. States of rules that are
+        no longer loaded, or whose steps changed length, are dropped.
+        """
+        self.finish()
+        rules = {rule.id: rule for rule in self.rules}
+        for item in data.get("states", []):
+            rule = rules.get(item["rule"])
+            if rule is None or item["step"] >= len(rule.steps):
+                continue
+            state = _State(rule, item["started"])
+            state.step = item["step"]
+            state.count = item["count"]
+            state.events = item["events"]
+            state.updated = item["updated"]
+            state.fields = dict(item["fields"])
+            self._track((rule.id, tuple(item["key"])), state)
+        self._watermark = data.get("watermark")
+
+    def stats(self) -> Dict:
+        return {
+            "rules": len(self.rules),
+            "events_processed": self.events_processed,
+            "alerts_fired": self.alerts_fired,
+            "fired_by_rule": dict(self.fired_by_rule),
+            "active_states": len(self._states),
+            "peak_states": self.peak_states,
+            "max_states": self.max_states,
+            "expired_states": self.expired,
+            "evicted_states": self.evicted,
+        }
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
@@ -1,9 +1,15 @@
-import json
-import re
+import os
+import time
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional
 from pathlib import Path
 from db.alert_store import AlertStore
+from utils.alert_suppressor import AlertSuppressor
+from utils.correlation_engine import CorrelationEngine, load_correlation_rules
+from utils.metrics import REGISTRY
+from utils.parse_logs import TimestampResolver, load_timezones, parse_timestamp
+from utils.records import Detection, intern
+from utils.rule_packs import RuleRegistry, default_registry
 
 max_retries = 3
 detection_timeout = 60
@@ -11,176 +17,318 @@ enable_alerts = True
 parallel_scan = True
 alert_cooldown_seconds = 60
 DETECTION_WORKERS = 4
+BRUTE_FORCE_RULE_ID = "BRUTE-001"
+# Per-rule timing costs two clock reads per rule per line, so it is off by
+# default and, when on, only every RULE_TIMING_SAMPLE-th line is timed
+ENABLE_RULE_TIMING = False
+RULE_TIMING_SAMPLE = 100
 
-DETECTION_RULES = {
-    "BRUTE-001": {
-        "name": "Brute Force Attack",
-        "severity": "HIGH",
-        "description": "Multiple failed login attempts detected",
-        "pattern": r"Failed password for.*from (\d+\.\d+\.\d+\.\d+)",
-        "threshold": 5,
-        "timewindow": 300,
-        "mitre": ["T1110"],
-    },
-    "SSH-001": {
-        "name": "SSH Authentication Success",
-        "severity": "LOW",
-        "description": "Successful SSH login",
-        "pattern": r"Accepted password for (\w+)",
-        "mitre": ["T1078"],
-    },
-    "SUDO-001": {
-        "name": "Sudo Command Execution",
-        "severity": "MEDIUM",
-        "description": "User executed command with sudo",
-        "pattern": r"COMMAND=/.*",
-        "mitre": ["T1548"],
-    },
-    "ROOT-001": {
-        "name": "Root Login Detected",
-        "severity": "CRITICAL",
-        "description": "Root user login detected",
-        "pattern": r"Accepted.*for root",
-        "mitre": ["T1078", "T1005"],
-    },
-    "FAIL-001": {
-        "name": "Authentication Failure",
-        "severity": "MEDIUM",
-        "description": "Authentication failure detected",
-        "pattern": r"authentication failure.*user=(\w+)",
-        "mitre": ["T1110"],
-    },
-    "CRON-001": {
-        "name": "Cron Job Execution",
-        "severity": "LOW",
-        "description": "Scheduled cron job executed",
-        "pattern": r"CMD \((.*?)\)",
-        "mitre": ["T1053"],
-    },
-    "WARN-001": {
-        "name": "Warning Message",
-        "severity": "LOW",
-        "description": "System warning detected",
-        "pattern": r"warning:|warn:",
-        "mitre": [],
-    },
-    "ERR-001": {
-        "name": "Error Message",
-        "severity": "MEDIUM",
-        "description": "System error detected",
-        "pattern": r"error:|failed:",
-        "mitre": [],
-    },
-    "SUSP-001": {
-        "name": "Suspicious Activity",
-        "severity": "HIGH",
-        "description": "Suspicious activity pattern detected",
-        "pattern": r"invalid user|unknown user",
-        "mitre": ["T1110", "T1078"],
-    },
-    "PORT-001": {
-        "name": "Port Scan Detected",
-        "severity": "MEDIUM",
-        "description": "Potential port scanning activity detected",
-        "pattern": r" Connection refused|Connection reset",
-        "mitre": ["T1046"],
-    },
-}
+LINES_SCANNED = REGISTRY.counter(
+    "siem_detection_lines_scanned_total", "Log lines scanned by rule detection", ("hostname",)
+)
+BYTES_READ = REGISTRY.counter(
+    "siem_detection_bytes_read_total", "Log bytes read by rule detection", ("hostname",)
+)
+RULE_EVALUATIONS = REGISTRY.counter(
+    "siem_rule_evaluations_total", "Lines each detection rule was evaluated against", ("rule",)
+)
+RULE_HITS = REGISTRY.counter(
+    "siem_rule_hits_total", "Lines each detection rule matched", ("rule",)
+)
+RULE_EVAL_SECONDS = REGISTRY.histogram(
+    "siem_rule_eval_seconds", "Time to evaluate each detection rule against one sampled line", ("rule",),
+    buckets=(1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2),
+)
+FILE_SCAN_SECONDS = REGISTRY.histogram(
+    "siem_detection_file_scan_seconds", "Time to scan one log file with all rules",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
 
 
 class DetectionEngine:
-    def __init__(self, log_dir: str = "logs", alert_store: AlertStore = None):
+    def __init__(
+        self,
+        log_dir: str = "logs",
+        alert_store: AlertStore = None,
+        rules: Optional[RuleRegistry] = None,
+    ):
         self.log_dir = log_dir
-        self.alert_store = alert_store or AlertStore()
-        self.alert_store.connect()
+        self.rules = rules or default_registry()
+        # A store passed in is already connected by its owner
+        if alert_store is None:
+            alert_store = AlertStore()
+            alert_store.connect()
+        self.alert_store = alert_store
         self.detection_counts = {}
+        self.suppressor = AlertSuppressor(self.alert_store, alert_cooldown_seconds)
+        self.correlator = None
+        self.timezones = load_timezones()
 
-    def scan_log_file(self, filepath: str) -> List[Dict]:
-        detections = []
+    def scan_log_file(self, filepath: str) -> List[Detection]:
+        hostname = Path(filepath).stem
+        started = time.perf_counter()
+        resolver = TimestampResolver.for_file(filepath, self.timezones)
         with open(filepath, "r") as f:
-            for line in f:
-                for rule_id, rule in DETECTION_RULES.items():
-                    match = re.search(rule["pattern"], line, re.IGNORECASE)
-                    if match:
-                        detection = {
-                            "rule_id": rule_id,
-                            "timestamp": datetime.now(timezone.utc).isoformat(),
-                            "severity": rule["severity"],
-                            "title": rule["name"],
-                            "description": rule["description"],
-                            "matched_text": line.strip(),
-                            "hostname": Path(filepath).stem,
-                            "mitre_techniques": json.dumps(rule["mitre"]),
-                        }
-                        if match.groups():
-                            detection["source_ip"] = match.group(1)
-                        detections.append(detection)
+            detections = self.scan_lines(f, hostname, resolver)
+        FILE_SCAN_SECONDS.observe(time.perf_counter() - started)
+        BYTES_READ.labels(hostname).inc(os.path.getsize(filepath))
+        return detections
+
+    def scan_lines(
+        self,
+        lines: Iterable[str],
+        hostname: str,
+        resolver: Optional[TimestampResolver] = None,
+    ) -> List[Detection]:
+        """
+        Run every detection rule over `lines` from one host. `resolver`
+        dates the matched lines; pass the file's own to get its timezone
+        and year right.
+        """
+        detections = []
+        hostname = intern(hostname)
+        # One snapshot per call, so a reload mid-scan cannot mix rule versions
+        rule_set = self.rules.current()
+        rules = [
+            (index, rule, "source_ip" in rule.pattern.groupindex)
+            for index, rule in enumerate(rule_set.rules)
+        ]
+        # Per-rule totals and timing samples are kept locally and published once per call
+        eval_seconds = [[] for _ in rules]
+        hits = [0] * len(rules)
+        timed = ENABLE_RULE_TIMING
+        clock = time.perf_counter
+        count = 0
+        detected_at = datetime.now(timezone.utc).isoformat()
+        for line in lines:
+            # Lines 0, RULE_TIMING_SAMPLE, ...: even a short file gets a sample
+            sampled = timed and count % RULE_TIMING_SAMPLE == 0
+            count += 1
+            seen = None
+            for index, rule, has_source_ip in rules:
+                if sampled:
+                    t0 = clock()
+                    match = rule.pattern.search(line)
+                    eval_seconds[index].append(clock() - t0)
+                else:
+                    match = rule.pattern.search(line)
+                if match:
+                    hits[index] += 1
+                    if seen is None:
+                        seen = _event_time(line, resolver)
+                    detections.append(
+                        Detection(
+                            rule.id,
+                            detected_at,
+                            rule.severity,
+                            rule.name,
+                            rule.description,
+                            line.strip(),
+                            hostname,
+                            rule.mitre_json,
+                            seen,
+                            (match.group("source_ip") or None) if has_source_ip else None,
+                        )
+                    )
+
+        LINES_SCANNED.labels(hostname).inc(count)
+        for index, rule, _ in rules:
+            RULE_EVALUATIONS.labels(rule.id).inc(count)
+            RULE_HITS.labels(rule.id).inc(hits[index])
+            if eval_seconds[index]:
+                timing = RULE_EVAL_SECONDS.labels(rule.id)
+                for seconds in eval_seconds[index]:
+                    timing.observe(seconds)
         return detections
 
-    def run_detection(self) -> int:
+    def run_detection(self, progress: Optional[Callable[..., None]] = None) -> int:
         total_alerts = 0
         log_files = list(Path(self.log_dir).glob("*.log"))
+        bytes_scanned = 0
 
-        for log_file in log_files:
+        for index, log_file in enumerate(log_files, 1):
             detections = self.scan_log_file(str(log_file))
             for detection in detections:
-                self.alert_store.insert_alert(detection)
-                total_alerts += 1
+                if self.suppressor.submit(detection):
+                    total_alerts += 1
+            bytes_scanned += os.path.getsize(log_file)
+            if progress:
+                progress(
+                    files_done=index,
+                    files_total=len(log_files),
+                    bytes_scanned=bytes_scanned,
+                    alerts=total_alerts,
+                    suppressed=self.suppressor.suppressed,
+                )
 
+        self.suppressor.flush()
         return total_alerts
 
     def detect_brute_force(self, log_file: str) -> List[Dict]:
+        """
+        One alert per burst of failed logins from a source IP: a run of
+        attempts in which every `timewindow` seconds hold at least
+        `threshold` of them. Attempts are placed by their line timestamps,
+        so first_seen and last_seen are the burst's own and a rescan finds
+        the same bursts; lines without a timestamp are skipped.
+        """
         brute_force_alerts = []
-        ip_attempts = {}
+        rule = self.rules.current().by_id.get(BRUTE_FORCE_RULE_ID)
+        if rule is None:
+            return brute_force_alerts
+        threshold = rule.threshold or 5
+        timewindow = rule.timewindow or 300
+        hostname = Path(log_file).stem
 
+        ip_attempts = {}
+        resolver = TimestampResolver.for_file(log_file, self.timezones)
         with open(log_file, "r") as f:
             for line in f:
-                match = re.search(
-                    r"Failed password for.*from (\d+\.\d+\.\d+\.\d+)", line
-                )
-                if match:
-                    ip = match.group(1)
-                    if ip not in ip_attempts:
-                        ip_attempts[ip] = []
-                    ip_attempts[ip].append(datetime.now(timezone.utc))
+                match = rule.pattern.search(line)
+                if not match:
+                    continue
+                ip = match.groupdict().get("source_ip")
+                if not ip:
+                    continue
+                try:
+                    timestamp, _ = parse_timestamp(line, resolver)
+                except ValueError:
+                    continue
+                ip_attempts.setdefault(ip, []).append(timestamp)
 
+        detected_at = datetime.now(timezone.utc).isoformat()
         for ip, attempts in ip_attempts.items():
-            recent_attempts = [
-                a
-                for a in attempts
-                if (datetime.now(timezone.utc) - a).total_seconds() < 300
-            ]
-            if len(recent_attempts) >= 5:
+            attempts.sort()
+            bursts = []
+            first = 0
+            for index, timestamp in enumerate(attempts):
+                while (timestamp - attempts[first]).total_seconds() > timewindow:
+                    first += 1
+                if index - first + 1 < threshold:
+                    continue
+                # Windows that overlap the previous burst extend it
+                if bursts and first <= bursts[-1][1]:
+                    bursts[-1][1] = index
+                else:
+                    bursts.append([first, index])
+            for start, end in bursts:
                 brute_force_alerts.append(
                     {
-                        "rule_id": "BRUTE-001",
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                        "severity": "HIGH",
+                        "rule_id": rule.id,
+                        "timestamp": detected_at,
+                        "severity": rule.severity,
                         "title": "Brute Force Attack Detected",
-                        "description": f"{len(recent_attempts)} failed login attempts from {ip}",
+                        "description": f"{end - start + 1} failed login attempts from {ip}",
+                        "hostname": hostname,
                         "source_ip": ip,
-                        "mitre_techniques": json.dumps(["T1110"]),
+                        "mitre_techniques": rule.mitre_json,
+                        "first_seen": attempts[start].astimezone(timezone.utc).isoformat(),
+                        "last_seen": attempts[end].astimezone(timezone.utc).isoformat(),
                     }
                 )
 
         return brute_force_alerts
 
-    def run_brute_force_detection(self) -> int:
+    def run_brute_force_detection(
+        self, progress: Optional[Callable[..., None]] = None
+    ) -> int:
+        total_alerts = 0
+        log_files = list(Path(self.log_dir).glob("*.log"))
+        bytes_scanned = 0
+
+        for index, log_file in enumerate(log_files, 1):
+            for alert in self.detect_brute_force(str(log_file)):
+                # Keyed on the burst's last attempt, so a rerun over the same log is skipped
+                if self.suppressor.submit(alert, alert["last_seen"]):
+                    total_alerts += 1
+            bytes_scanned += os.path.getsize(log_file)
+            if progress:
+                progress(
+                    files_done=index,
+                    files_total=len(log_files),
+                    bytes_scanned=bytes_scanned,
+                    alerts=total_alerts,
+                    suppressed=self.suppressor.suppressed,
+                )
+
+        self.suppressor.flush()
+        return total_alerts
+
+    def run_correlation(self, progress: Optional[Callable[..., None]] = None) -> int:
+        """
+        Feed each log file through the correlation rules as one ordered
+        event stream and store the sequence alerts they raise.
+        """
+        if self.correlator is None:
+            self.correlator = CorrelationEngine(load_correlation_rules())
         total_alerts = 0
         log_files = list(Path(self.log_dir).glob("*.log"))
+        bytes_scanned = 0
 
-        for log_file in log_files:
-            alerts = self.detect_brute_force(str(log_file))
-            for alert in alerts:
-                self.alert_store.insert_alert(alert)
-                total_alerts += 1
+        for index, log_file in enumerate(log_files, 1):
+            for alert in self.correlator.feed(iter_line_events(str(log_file), self.timezones)):
+                if self.suppressor.submit(alert, alert["last_seen"]):
+                    total_alerts += 1
+            self.correlator.finish()
+            bytes_scanned += os.path.getsize(log_file)
+            if progress:
+                progress(
+                    files_done=index,
+                    files_total=len(log_files),
+                    bytes_scanned=bytes_scanned,
+                    alerts=total_alerts,
+                )
 
+        self.suppressor.flush()
         return total_alerts
 
     def close(self):
         self.alert_store.close()
 
 
+def iter_line_events(filepath: str, timezones=()) -> Iterator[Dict]:
+    """
+    Yield correlation events ({"ts", "hostname", "message", "raw"}) for the
+    lines of a log file, skipping lines without a parseable timestamp.
+    """
+    hostname = Path(filepath).stem
+    resolver = TimestampResolver.for_file(filepath, timezones)
+    with open(filepath, "r") as f:
+        for line in f:
+            event = line_event(line, hostname, resolver)
+            if event is not None:
+                yield event
+
+
+def line_event(
+    line: str, hostname: str, resolver: Optional[TimestampResolver] = None
+) -> Optional[Dict]:
+    """Correlation event for one log line, or None without a parseable timestamp."""
+    try:
+        timestamp, rest = parse_timestamp(line, resolver)
+    except ValueError:
+        return None
+    parts = rest.split(": ", 1)
+    return {
+        "ts": timestamp.timestamp(),
+        "hostname": hostname,
+        "message": (parts[1] if len(parts) > 1 else rest).strip(),
+        "raw": line.strip(),
+    }
+
+
+def _event_time(line: str, resolver: Optional[TimestampResolver] = None) -> str:
+    """
+    Event time of a log line as a UTC ISO string, or the current time when
+    the line has no parseable timestamp.
+    """
+    try:
+        timestamp, _ = parse_timestamp(line, resolver)
+    except ValueError:
+        return datetime.now(timezone.utc).isoformat()
+    return timestamp.astimezone(timezone.utc).isoformat()
+
+
 if __name__ == "__main__":
     engine = DetectionEngine()
     print("Running detection on log files...")
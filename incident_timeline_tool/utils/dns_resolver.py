@@ -0,0 +1,152 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+from typing import Callable, Dict, Iterable, Optional
+
+CACHE_TTL = 3600
+NEGATIVE_CACHE_TTL = 300
+MAX_CACHE_SIZE = 1000
+LOOKUP_TIMEOUT = 2.0
+RESOLVER_WORKERS = 8
+
+
+def system_reverse_lookup(ip: str) -> Optional[str]:
+    try:
+        hostname, _, _ = socket.gethostbyaddr(ip)
+        return hostname
+    except (socket.herror, socket.gaierror, OSError):
+        return None
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a per-entry TTL.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns (hit, value). A hit may carry a cached None (negative entry).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ReverseResolver:
+    """
+    Cached reverse-DNS resolver. Lookups run on a shared thread pool so a
+    slow nameserver costs at most `timeout` seconds per call instead of
+    blocking the caller indefinitely.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[str], Optional[str]] = system_reverse_lookup,
+        ttl: float = CACHE_TTL,
+        negative_ttl: float = NEGATIVE_CACHE_TTL,
+        max_cache_size: int = MAX_CACHE_SIZE,
+        timeout: float = LOOKUP_TIMEOUT,
+        workers: int = RESOLVER_WORKERS,
+    ):
+        self.lookup = lookup
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.cache = TTLCache(max_cache_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="rdns"
+        )
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def _submit(self, ip: str):
+        # Coalesce concurrent lookups of the same address onto one future
+        with self._pending_lock:
+            future = self._pending.get(ip)
+            if future is None:
+                future = self._executor.submit(self._lookup_and_cache, ip)
+                self._pending[ip] = future
+            return future
+
+    def _lookup_and_cache(self, ip: str) -> Optional[str]:
+        try:
+            hostname = self.lookup(ip)
+        except Exception:
+            hostname = None
+        self.cache.set(ip, hostname, self.ttl if hostname else self.negative_ttl)
+        with self._pending_lock:
+            self._pending.pop(ip, None)
+        return hostname
+
+    def resolve(self, ip: str) -> Optional[str]:
+        hit, hostname = self.cache.get(ip)
+        if hit:
+            return hostname
+        try:
+            return self._submit(ip).result(timeout=self.timeout)
+        except TimeoutError:
+            return None
+
+    def resolve_many(self, ips: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Resolve a batch of addresses concurrently. Addresses that do not
+        answer within the timeout map to None; their lookups keep running
+        and will populate the cache for the next call.
+        """
+        results = {}
+        futures = {}
+        for ip in set(ips):
+            hit, hostname = self.cache.get(ip)
+            if hit:
+                results[ip] = hostname
+            else:
+                futures[ip] = self._submit(ip)
+
+        if futures:
+            wait(futures.values(), timeout=self.timeout)
+            for ip, future in futures.items():
+                results[ip] = future.result() if future.done() else None
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class StubResolver(ReverseResolver):
+    """
+    Resolver backed by a fixed mapping, for tests and offline runs.
+    """
+
+    def __init__(self, mapping: Optional[Dict[str, str]] = None, **kwargs):
+        self.mapping = dict(mapping or {})
+        self.calls = []
+        super().__init__(lookup=self._stub_lookup, **kwargs)
+
+    def _stub_lookup(self, ip: str) -> Optional[str]:
+        self.calls.append(ip)
+        return self.mapping.get(ip)
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _buffered(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def ndjson_chunks(
+    rows: Iterable[Dict], encode: Optional[Callable[[Dict], str]] = None
+) -> Iterator[bytes]:
+    encode = encode or (lambda row: json.dumps(row, default=str))
+    return _buffered(encode(row) + "\n" for row in rows)
+
+
+def csv_chunks(rows: Iterable[Dict], columns: List[str]) -> Iterator[bytes]:
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row.get(c, "") for c in columns])
+            if out.tell() >= CHUNK_SIZE:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        yield out.getvalue()
+
+    return _buffered(lines())
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,9 +1,15 @@
+import argparse
 import os
+import sys
 import json
 import hashlib
 from pathlib import Path
 from datetime import datetime, timezone
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.profiling import add_profile_arguments, get_profiler
+
 # Directories to monitor
 WATCHED_DIRS = ["/etc", "/var/www", "/home"]
 BASELINE_FILE = "fim_baseline.json"
@@ -63,24 +69,32 @@ def write_log(change_type, path, old, new):
     with open(CHANGE_LOG, "a") as f:
         f.write(json.dumps(entry) + "\n")
 
-def main():
-    old_state = load_baseline()
-    new_state = scan_all_files()
-
-    old_paths = set(old_state.keys())
-    new_paths = set(new_state.keys())
-
-    for path in old_paths - new_paths:
-        write_log("deleted", path, old_state[path], None)
-
-    for path in new_paths - old_paths:
-        write_log("created", path, None, new_state[path])
+def main(profile=None, profile_output=None):
+    # `profile` (or SIEM_PROFILE) captures a profile of the scan
+    with get_profiler("fim_agent", profile, profile_output) as profiler:
+        with profiler.stage("parse"):
+            old_state = load_baseline()
+        with profiler.stage("read"):
+            new_state = scan_all_files()
 
-    for path in old_paths & new_paths:
-        if old_state[path] != new_state[path]:
-            write_log("modified", path, old_state[path], new_state[path])
+        with profiler.stage("match"):
+            old_paths = set(old_state.keys())
+            new_paths = set(new_state.keys())
+            changes = [("deleted", path, old_state[path], None) for path in old_paths - new_paths]
+            changes += [("created", path, None, new_state[path]) for path in new_paths - old_paths]
+            changes += [
+                ("modified", path, old_state[path], new_state[path])
+                for path in old_paths & new_paths
+                if old_state[path] != new_state[path]
+            ]
 
-    save_baseline(new_state)
+        with profiler.stage("write"):
+            for change in changes:
+                write_log(*change)
+            save_baseline(new_state)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scan watched files for integrity changes")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    main(args.profile, args.profile_output)
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Resident ingestion service: tails log files and streams new lines through
+parsing, MITRE tagging, rule detection, correlation and storage.
+
+    python3 utils/ingest_daemon.py                      # sources from data/ingest_sources.json
+    python3 utils/ingest_daemon.py --source /var/log/auth.log
+
+Three threads connected by bounded queues:
+
+  tail     wakes on inotify events for the sources' directories (or every
+           POLL_INTERVAL seconds without inotify), reads complete lines
+           appended since the last offset and queues them in batches
+  process  parses and MITRE-tags each line, runs the detection rules and
+           per-host correlation engines
+  store    inserts events and alerts, and every CHECKPOINT_SECONDS flushes
+           folded alert counts and saves the offsets it has stored
+
+When storage falls behind the queues fill and the tailer stops reading,
+so memory stays bounded and unread data waits in the log file. Offsets
+are saved only for lines already stored, so after a crash the daemon
+re-reads at most one checkpoint's worth; events are deduplicated by
+fingerprint and alerts by the suppressor, so re-reading is harmless.
+
+A changed inode or a shorter file means the log was rotated or
+truncated: the old file is read to its end before the new one is
+opened from the start. If the daemon was down across a rotation, the
+saved inode is looked up in `<path>.1` and the remainder read from there.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import glob
+import json
+import os
+import queue
+import select
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.alert_store import AlertStore
+from db.connection_pool import ConnectionPool
+from db.event_store import EventStore
+from utils.correlation_engine import CorrelationEngine, load_correlation_rules
+from utils.detection_engine import DetectionEngine, line_event
+from utils.log_collector import load_state, save_state
+from utils.metrics import REGISTRY
+from utils.parse_logs import (
+    TimestampResolver,
+    load_mitre_rules,
+    load_timezones,
+    parse_log_line,
+    timezone_for,
+    to_event,
+)
+
+SOURCES_FILE = "data/ingest_sources.json"
+STATE_FILE = "data/ingest_state.json"
+POLL_INTERVAL = 0.5
+READ_CHUNK = 256 * 1024
+BATCH_LINES = 1000
+LINE_QUEUE_BATCHES = 64
+STORE_QUEUE_BATCHES = 16
+CHECKPOINT_SECONDS = 2.0
+START_AT_END = False
+
+# inotify(7) event bits
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+LINES_INGESTED = REGISTRY.counter(
+    "siem_ingest_lines_total", "Log lines read by the ingestion daemon", ("hostname",)
+)
+INGEST_LATENCY = REGISTRY.histogram(
+    "siem_ingest_latency_seconds", "Time from reading a batch of lines to storing its events and alerts",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+def load_sources(path: str = SOURCES_FILE) -> List[Dict]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Same {"enabled": ..., "sources": [...]} wrapper as the other data files
+    if isinstance(data, dict):
+        data = data.get("sources", []) if data.get("enabled", True) else []
+    return [s for s in data if s.get("enabled", True)]
+
+
+class Batch:
+    __slots__ = (
+        "path", "hostname", "inode", "end_offset", "lines", "resolver", "read_at", "events", "alerts",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        hostname: str,
+        inode: int,
+        end_offset: int,
+        lines: List[str],
+        resolver: TimestampResolver,
+    ):
+        self.path = path
+        self.hostname = hostname
+        self.inode = inode
+        self.end_offset = end_offset
+        self.lines = lines
+        self.resolver = resolver
+        self.read_at = time.monotonic()
+        self.events = []
+        self.alerts = []
+
+
+class Inotify:
+    """
+    Minimal inotify wrapper used only as a wake-up signal; events are
+    drained, not decoded. Raises OSError when inotify is unavailable.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+
+    def watch(self, directory: str):
+        if directory in self._watched:
+            return
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) >= 0:
+            self._watched.add(directory)
+
+    def wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TailedFile:
+    """Read position in one log file, following it across rotation and truncation."""
+
+    def __init__(self, path: str, hostname: str, saved: Optional[Dict] = None, timezones=()):
+        self.path = path
+        self.hostname = hostname
+        # Only the process thread uses it, in file order, so the year carries across batches
+        self.resolver = TimestampResolver(timezone_for(path, timezones))
+        self.handle = None
+        self.inode = None
+        self.offset = 0
+        self._partial = b""
+        self._resume = saved or {}
+
+    def _open(self, path: str, offset: int) -> bool:
+        try:
+            handle = open(path, "rb")
+        except OSError:
+            return False
+        if self.handle is not None:
+            self.handle.close()
+        self.handle = handle
+        self.inode = os.fstat(handle.fileno()).st_ino
+        self.offset = offset
+        self._partial = b""
+        handle.seek(offset)
+        return True
+
+    def _open_initial(self) -> bool:
+        saved_inode, saved_offset = self._resume.get("inode"), self._resume.get("offset", 0)
+        self._resume = {}
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            return False
+        if saved_inode == current.st_ino and saved_offset <= current.st_size:
+            return self._open(self.path, saved_offset)
+        if saved_inode is not None:
+            # Rotated while we were down: finish the old file first if it is still around
+            try:
+                if os.stat(self.path + ".1").st_ino == saved_inode:
+                    return self._open(self.path + ".1", saved_offset)
+            except OSError:
+                pass
+            return self._open(self.path, 0)
+        return self._open(self.path, current.st_size if START_AT_END else 0)
+
+    def poll(self) -> Iterator[Batch]:
+        """
+        Yield batches of complete lines appended since the last poll. A
+        generator, so a full queue stops the reading rather than buffering.
+        """
+        if self.handle is None and not self._open_initial():
+            return
+
+        yield from self._read_available()
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            return
+        if current.st_ino != self.inode:
+            # Rotated: drain the old file, then start the new one from the beginning
+            yield from self._read_available(final=True)
+            if self._open(self.path, 0):
+                yield from self._read_available()
+        elif current.st_size < self.offset:
+            self._open(self.path, 0)
+            yield from self._read_available()
+
+    def _read_available(self, final: bool = False) -> Iterator[Batch]:
+        lines = []
+        while True:
+            chunk = self.handle.read(READ_CHUNK)
+            if not chunk:
+                break
+            data = self._partial + chunk
+            end = data.rfind(b"\n") + 1
+            self._partial = data[end:]
+            for raw in data[:end].split(b"\n")[:-1]:
+                self.offset += len(raw) + 1
+                lines.append(raw.decode("utf-8", "replace"))
+                if len(lines) >= BATCH_LINES:
+                    yield Batch(self.path, self.hostname, self.inode, self.offset, lines, self.resolver)
+                    lines = []
+        if final and self._partial:
+            # The old file will not grow any more, so its unterminated last line is complete
+            self.offset += len(self._partial)
+            lines.append(self._partial.decode("utf-8", "replace"))
+            self._partial = b""
+        if lines:
+            yield Batch(self.path, self.hostname, self.inode, self.offset, lines, self.resolver)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class IngestDaemon:
+    def __init__(self, sources: List[Dict], state_path: str = STATE_FILE, pool: Optional[ConnectionPool] = None):
+        self.sources = sources
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        # Stores are shared between threads, so they go through a pool
+        self._owns_pool = pool is None
+        self.pool = pool or ConnectionPool()
+        self.event_store = EventStore(pool=self.pool)
+        self.event_store.connect()
+        alert_store = AlertStore(pool=self.pool)
+        alert_store.connect()
+        self.engine = DetectionEngine(alert_store=alert_store)
+        self.mitre_rules = load_mitre_rules()
+        self.timezones = load_timezones()
+        self.correlation_rules = load_correlation_rules()
+        self.correlators = {}
+        self.files = {}
+        self.lines_queue = queue.Queue(maxsize=LINE_QUEUE_BATCHES)
+        self.store_queue = queue.Queue(maxsize=STORE_QUEUE_BATCHES)
+        self.stopping = threading.Event()
+        self.failed = threading.Event()
+        self.error = None
+        self.lines_read = 0
+        self.events_stored = 0
+        self.alerts_raised = 0
+
+    def _discover(self, notifier: Optional[Inotify]):
+        for source in self.sources:
+            pattern = source["path"]
+            paths = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+            for path in paths:
+                path = os.path.abspath(path)
+                if path in self.files:
+                    continue
+                hostname = source.get("hostname") or Path(path).stem
+                self.files[path] = TailedFile(path, hostname, self.state.get(path), self.timezones)
+                if notifier is not None and os.path.isdir(os.path.dirname(path)):
+                    notifier.watch(os.path.dirname(path))
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        # Blocks while the next stage is behind; gives up only if it has failed
+        while True:
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if self.failed.is_set():
+                    return False
+
+    def _fail(self, stage: str, error: Exception):
+        if not self.failed.is_set():
+            self.error = f"{stage}: {error!r}"
+            print(f"[!] ingest {self.error}", file=sys.stderr)
+        self.failed.set()
+        self.stopping.set()
+
+    def _tail_loop(self):
+        try:
+            notifier = Inotify()
+        except OSError:
+            notifier = None
+        try:
+            while not self.stopping.is_set():
+                self._discover(notifier)
+                for tailed in list(self.files.values()):
+                    for batch in tailed.poll():
+                        self.lines_read += len(batch.lines)
+                        LINES_INGESTED.labels(batch.hostname).inc(len(batch.lines))
+                        if not self._put(self.lines_queue, batch) or self.stopping.is_set():
+                            break
+                    if self.stopping.is_set():
+                        break
+                # The timeout also covers changes inotify cannot see (e.g. network filesystems)
+                if notifier is not None:
+                    notifier.wait(POLL_INTERVAL)
+                else:
+                    self.stopping.wait(POLL_INTERVAL)
+        except Exception as e:
+            self._fail("tail", e)
+        finally:
+            for tailed in self.files.values():
+                tailed.close()
+            if notifier is not None:
+                notifier.close()
+            self._put(self.lines_queue, None)
+
+    def _process_loop(self):
+        while True:
+            batch = self.lines_queue.get()
+            if batch is None:
+                break
+            if self.failed.is_set():
+                continue
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                self._fail("process", e)
+                continue
+            self._put(self.store_queue, batch)
+        self._put(self.store_queue, None)
+
+    def process_batch(self, batch: Batch):
+        """Parse, tag and run detection and correlation over one batch."""
+        source = os.path.basename(batch.path)
+        # Each pass dates the lines from the same starting year; the last one advances the file's resolver
+        resolver = batch.resolver.copy()
+        for line in batch.lines:
+            entry = parse_log_line(line, batch.hostname, self.mitre_rules, resolver)
+            if entry:
+                batch.events.append(to_event(entry, source, line))
+
+        batch.alerts = [
+            (d, None) for d in self.engine.scan_lines(batch.lines, batch.hostname, batch.resolver.copy())
+        ]
+
+        correlator = self.correlators.get(batch.hostname)
+        if correlator is None:
+            correlator = self.correlators[batch.hostname] = CorrelationEngine(self.correlation_rules)
+        for line in batch.lines:
+            event = line_event(line, batch.hostname, batch.resolver)
+            if event is not None:
+                for alert in correlator.process(event):
+                    batch.alerts.append((alert, alert["last_seen"]))
+
+    def _store_loop(self):
+        committed = {}
+        last_checkpoint = time.monotonic()
+        while True:
+            try:
+                batch = self.store_queue.get(timeout=CHECKPOINT_SECONDS)
+            except queue.Empty:
+                batch = False
+            if batch is None:
+                break
+            if self.failed.is_set():
+                continue
+            try:
+                if batch:
+                    self.store_batch(batch)
+                    committed[batch.path] = (batch.inode, batch.end_offset)
+                if committed and time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                    self.checkpoint(committed)
+                    committed = {}
+                    last_checkpoint = time.monotonic()
+            except Exception as e:
+                self._fail("store", e)
+
+        if not self.failed.is_set():
+            try:
+                self.checkpoint(committed)
+            except Exception as e:
+                self._fail("store", e)
+
+    def store_batch(self, batch: Batch):
+        if batch.events:
+            self.events_stored += self.event_store.insert_events(batch.events)
+        for alert, seen in batch.alerts:
+            if self.engine.suppressor.submit(alert, seen):
+                self.alerts_raised += 1
+        INGEST_LATENCY.observe(time.monotonic() - batch.read_at)
+
+    def checkpoint(self, committed: Dict):
+        """Write folded alert counts, then the offsets of everything stored so far."""
+        self.engine.suppressor.flush()
+        updated_at = datetime.now(timezone.utc).isoformat()
+        for path, (inode, offset) in committed.items():
+            self.state[path] = {"inode": inode, "offset": offset, "updated_at": updated_at}
+        save_state(self.state, self.state_path)
+
+    def run(self) -> int:
+        threads = [
+            threading.Thread(target=self._tail_loop, name="ingest-tail"),
+            threading.Thread(target=self._process_loop, name="ingest-process"),
+            threading.Thread(target=self._store_loop, name="ingest-store"),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self.stopping.wait(1.0):
+                pass
+        finally:
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+            if self._owns_pool:
+                self.pool.close_all()
+        return 1 if self.failed.is_set() else 0
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self.files),
+            "lines_read": self.lines_read,
+            "events_stored": self.events_stored,
+            "alerts_raised": self.alerts_raised,
+            "duplicates_suppressed": self.engine.suppressor.suppressed,
+            "error": self.error,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail log files and ingest new lines continuously")
+    parser.add_argument("--sources", default=SOURCES_FILE, help="JSON list of files or glob patterns to tail")
+    parser.add_argument("--source", action="append", default=[], help="file or glob to tail instead (repeatable)")
+    parser.add_argument("--state", default=STATE_FILE)
+    args = parser.parse_args()
+
+    sources = [{"path": p} for p in args.source] or load_sources(args.sources)
+    if not sources:
+        parser.error("no sources configured")
+
+    daemon = IngestDaemon(sources, args.state)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    print(f"[*] Tailing {len(sources)} sources; state in {args.state}")
+    status = daemon.run()
+    print(f"[+] Ingest stopped: {json.dumps(daemon.stats())}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+MAX_QUEUED_JOBS = 4
+MAX_FINISHED_JOBS = 100
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[["Job"], Dict]):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.func = func
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._finished = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            progress = dict(self.progress)
+        if self._started is None:
+            duration = None
+        else:
+            duration = (self._finished or time.monotonic()) - self._started
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": round(duration, 3) if duration is not None else None,
+        }
+
+
+class JobRunner:
+    """
+    Runs jobs one at a time on a background thread from a bounded queue.
+
+    submit() is single-flight per name: while a job with the same name is
+    queued or running, further submissions return that job instead of
+    enqueueing another one. Job state lives in this process only, so under
+    a multi-worker server a job must be polled on the worker that accepted it.
+    """
+
+    def __init__(self, max_queue: int = MAX_QUEUED_JOBS):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._work, name="job-runner", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, name: str, func: Callable[[Job], Dict]) -> Job:
+        with self._lock:
+            active = self._active.get(name)
+            if active is not None and not active.done:
+                return active
+
+            job = Job(name, func)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(f"Job queue is full ({self._queue.maxsize} pending)")
+            self._jobs[job.id] = job
+            self._active[name] = job
+            self._prune()
+            self._ensure_worker()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc).isoformat()
+            job._started = time.monotonic()
+            try:
+                job.result = job.func(job)
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job._finished = time.monotonic()
+                job.finished_at = datetime.now(timezone.utc).isoformat()
+                self._queue.task_done()
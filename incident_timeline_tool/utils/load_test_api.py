@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Simple HTTP load generator for the SIEM API.
+
+    python3 utils/load_test_api.py --url http://127.0.0.1:5000/api/alerts \
+        --concurrency 16 --duration 20
+
+Run it once against the development server (python3 api/alerts_api.py) and
+once against the WSGI profile (gunicorn ... api.wsgi:app) to compare
+requests/sec, or pass both and get the two side by side:
+
+    python3 utils/load_test_api.py --baseline-url http://127.0.0.1:5001/api/alerts \
+        --url http://127.0.0.1:5000/api/alerts --concurrency 16
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def worker(url, deadline, latencies, errors, lock):
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    local_latencies = []
+    local_errors = 0
+
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                local_errors += 1
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+            continue
+        local_latencies.append(time.perf_counter() - start)
+
+    conn.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[index]
+
+
+def run_load(url, concurrency, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    threads = [
+        threading.Thread(target=worker, args=(url, deadline, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    return {
+        "url": url,
+        "ok": len(latencies),
+        "errors": sum(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a SIEM API endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/api/alerts")
+    parser.add_argument("--baseline-url", default=None,
+                        help="load this endpoint first and report both as before/after")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    runs = []
+    if args.baseline_url:
+        runs.append(("before", run_load(args.baseline_url, args.concurrency, args.duration)))
+    runs.append(("after" if runs else "result", run_load(args.url, args.concurrency, args.duration)))
+
+    print(f"Concurrency:  {args.concurrency}")
+    for label, r in runs:
+        print(f"[{label}] {r['url']}")
+        print(f"  Requests:     {r['ok']} ok, {r['errors']} errors")
+        print(f"  Throughput:   {r['rps']:.1f} req/s")
+        print(f"  Latency p50:  {r['p50']:.1f} ms")
+        print(f"  Latency p95:  {r['p95']:.1f} ms")
+        print(f"  Latency p99:  {r['p99']:.1f} ms")
+    if len(runs) == 2 and runs[0][1]["rps"] > 0:
+        print(f"Speed-up:     {runs[1][1]['rps'] / runs[0][1]['rps']:.2f}x req/s")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Incremental log collector for the endpoints' exported log files.
+
+    python3 utils/log_collector.py                 # every endpoint in the inventory
+    python3 utils/log_collector.py --only fedora   # one endpoint
+
+Endpoints are listed in data/collector_inventory.json and fetched
+concurrently, each worker thread reusing one keep-alive connection per
+host. For every endpoint the collector remembers the local offset, ETag
+and Last-Modified in data/collector_state.json and asks only for what is
+new:
+
+  * nothing saved yet, or the local copy is missing: full GET
+  * otherwise: GET with Range starting OVERLAP_BYTES before the saved
+    offset, plus If-None-Match / If-Modified-Since. 304 means unchanged.
+    206 appends the new bytes once the overlap matches the local tail.
+  * 416, a mismatching overlap or a shorter remote file means the log was
+    rotated or truncated, and the collector falls back to a full fetch.
+  * a 200 answer to a Range request (a server without range support)
+    replaces the local copy.
+
+Endpoints with "mode": "export" point at an agent's export directory
+(http://<host>/log_export/latest/) instead of a single file, and `dest`
+is the local log directory. The agents ship only what each log gained
+since their previous run, listed in manifest.json with its source file,
+inode, byte offset and sha256. Each new export is downloaded and checked
+against those sums before anything is written; then every syslog delta
+is appended to <dest>/<host>_<log>.log (e.g. logs/fedora_secure.log)
+from the offset the collector has reached, and journal entries to
+<dest>/<host>.journal.json. <host> is the entry's "hostname", or its name.
+Bytes the collector already holds are skipped, and a delta that starts
+past them (an export that was never fetched) is reported as a gap.
+"""
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INVENTORY_FILE = "data/collector_inventory.json"
+STATE_FILE = "data/collector_state.json"
+COLLECTOR_WORKERS = 8
+REQUEST_TIMEOUT = 30
+OVERLAP_BYTES = 512
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "astro-siem-collector/1.0"
+EXPORT_MANIFEST = "manifest.json"
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class CollectorError(Exception):
+    pass
+
+
+class ConnectionCache:
+    """
+    One http.client connection per (scheme, host, port) per thread, kept
+    open between requests so repeat fetches from a host skip the handshake.
+    Every connection is also registered under a lock, so close() from any
+    thread closes those opened by all threads.
+    """
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = set()
+        # Bumped by close(), so threads drop their per-thread maps of closed connections
+        self._generation = 0
+
+    def _connections(self) -> Dict:
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.connections = {}
+            self._local.generation = self._generation
+        return self._local.connections
+
+    def _forget(self, conn):
+        conn.close()
+        with self._lock:
+            self._open.discard(conn)
+
+    def request(self, url: str, headers: Dict) -> http.client.HTTPResponse:
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        headers = {"User-Agent": USER_AGENT, **headers}
+
+        # A kept-alive connection may have been closed by the server; retry once on a fresh one
+        for attempt in (1, 2):
+            conn = self._connections().get(key)
+            if conn is None:
+                cls = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+                conn = cls(parsed.hostname, parsed.port, timeout=self.timeout)
+                self._connections()[key] = conn
+                with self._lock:
+                    self._open.add(conn)
+            try:
+                conn.request("GET", path, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._forget(conn)
+                del self._connections()[key]
+                if attempt == 2:
+                    raise
+
+    def discard(self, url: str):
+        parsed = urlparse(url)
+        conn = self._connections().pop((parsed.scheme, parsed.hostname, parsed.port), None)
+        if conn is not None:
+            self._forget(conn)
+
+    def open_count(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def close(self):
+        with self._lock:
+            connections, self._open = self._open, set()
+            self._generation += 1
+        for conn in connections:
+            conn.close()
+
+
+def load_inventory(path: str = INVENTORY_FILE) -> List[Dict]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    endpoints = data.get("endpoints", []) if isinstance(data, dict) else data
+    for endpoint in endpoints:
+        if not endpoint.get("name") or not endpoint.get("url") or not endpoint.get("dest"):
+            raise CollectorError(f"inventory entry needs name, url and dest: {endpoint}")
+    return [e for e in endpoints if e.get("enabled", True)]
+
+
+def load_state(path: str = STATE_FILE) -> Dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state: Dict, path: str = STATE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class LogCollector:
+    def __init__(
+        self,
+        endpoints: List[Dict],
+        state: Optional[Dict] = None,
+        workers: int = COLLECTOR_WORKERS,
+        timeout: float = REQUEST_TIMEOUT,
+        spool_dir: Optional[str] = None,
+    ):
+        self.endpoints = endpoints
+        self.state = state if state is not None else {}
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.connections = ConnectionCache(timeout)
+        self._lock = threading.Lock()
+        # Created on the first collect() and kept until close(), so the
+        # worker threads, and the connections they hold, outlive one pass
+        self._pool = None
+
+    def collect(self) -> List[Dict]:
+        """Fetch every endpoint concurrently; returns one result dict per endpoint."""
+        if not self.endpoints:
+            return []
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=min(self.workers, len(self.endpoints)),
+                thread_name_prefix="collector",
+            )
+        return list(self._pool.map(self._collect_safely, self.endpoints))
+
+    def _collect_safely(self, endpoint: Dict) -> Dict:
+        started = time.perf_counter()
+        try:
+            result = self.collect_endpoint(endpoint)
+        except (OSError, http.client.HTTPException, CollectorError) as e:
+            self.connections.discard(endpoint["url"])
+            result = {"status": "error", "error": str(e)}
+        result["name"] = endpoint["name"]
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def collect_endpoint(self, endpoint: Dict) -> Dict:
+        if endpoint.get("mode") == "export":
+            return self.collect_export(endpoint)
+        name, url, dest = endpoint["name"], endpoint["url"], endpoint["dest"]
+        with self._lock:
+            saved = dict(self.state.get(name, {}))
+
+        local_size = os.path.getsize(dest) if os.path.exists(dest) else None
+        result = None
+        if saved.get("url") == url and local_size is not None and local_size == saved.get("offset"):
+            result = self._fetch_range(url, dest, saved, local_size)
+        if result is None:
+            result = self._fetch_full(url, dest, saved if local_size is not None else {})
+        result = self._record(name, url, dest, result)
+
+        if self.spool_dir and result["bytes"]:
+            # Deferred: the spool module pulls in the whole detection stack
+            from utils.spool_queue import enqueue_file
+
+            # Hand the new lines to the detection workers as spool segments
+            start = local_size if result["status"] == "appended" else 0
+            hostname = endpoint.get("hostname") or os.path.splitext(os.path.basename(dest))[0]
+            result["segments"] = len(enqueue_file(self.spool_dir, hostname, dest, start))
+        return result
+
+    def collect_export(self, endpoint: Dict) -> Dict:
+        """Apply the agent export at `url` if it is one not applied yet."""
+        name, dest_dir = endpoint["name"], endpoint["dest"]
+        host = endpoint.get("hostname") or name
+        base = endpoint["url"].rstrip("/") + "/"
+        with self._lock:
+            saved = dict(self.state.get(name, {}))
+        if saved.get("url") != base:
+            saved = {}
+
+        response = self.connections.request(base + EXPORT_MANIFEST, self._validators(saved))
+        if response.status == 304:
+            response.read()
+            return self._record_export(name, base, saved, response, {"status": "unchanged", "bytes": 0})
+        if response.status != 200:
+            response.read()
+            raise CollectorError(f"{base}{EXPORT_MANIFEST}: unexpected HTTP {response.status}")
+        try:
+            manifest = json.loads(response.read())
+        except ValueError as e:
+            raise CollectorError(f"{base}{EXPORT_MANIFEST}: {e}")
+        exported = manifest.get("export_timestamp")
+        if exported and exported == saved.get("export"):
+            return self._record_export(name, base, saved, response, {"status": "unchanged", "bytes": 0})
+        saved["export"] = exported
+
+        # Download and verify the whole export before appending any of it,
+        # so a bad file leaves the local logs and offsets as they were
+        downloads = []
+        try:
+            for item in manifest.get("sources", []):
+                local = _export_target(item, host)
+                if local is None:
+                    continue
+                downloads.append((item, os.path.join(dest_dir, local), self._download(base, item, dest_dir)))
+            result = self._apply_export(downloads, saved)
+        finally:
+            for _, _, tmp_path in downloads:
+                os.remove(tmp_path)
+        return self._record_export(name, base, saved, response, result)
+
+    def _download(self, base: str, item: Dict, dest_dir: str) -> str:
+        url = base + item["filename"]
+        response = self.connections.request(url, {})
+        if response.status != 200:
+            response.read()
+            raise CollectorError(f"{url}: unexpected HTTP {response.status}")
+        os.makedirs(dest_dir or ".", exist_ok=True)
+        tmp_path = os.path.join(dest_dir, f".{item['filename']}.{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            if size != item.get("size") or digest.hexdigest() != item.get("sha256"):
+                raise CollectorError(f"{url}: size or sha256 does not match the manifest")
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _apply_export(self, downloads: List, saved: Dict) -> Dict:
+        """
+        Append verified export files to their local logs, skipping the
+        bytes `saved["sources"]` says are already held. Returns the result
+        dict; `saved["sources"]` is advanced in place.
+        """
+        sources = saved.setdefault("sources", {})
+        gaps = 0
+        # Local size of each log before this export
+        appended = {}
+        for item, dest, tmp_path in downloads:
+            skip = 0
+            if "offset" in item:
+                mark = sources.get(dest)
+                if mark is not None and mark["inode"] == item.get("inode"):
+                    if item["offset"] > mark["offset"]:
+                        gaps += item["offset"] - mark["offset"]
+                    skip = mark["offset"] - item["offset"]
+                elif mark is not None:
+                    # A new file after rotation; anything before `offset` was missed
+                    gaps += item["offset"]
+                sources[dest] = {"inode": item.get("inode"), "offset": item["end_offset"]}
+            opener = gzip.open if item.get("encoding") == "gzip" else open
+            with opener(tmp_path, "rb") as src:
+                if skip > 0:
+                    # Same inode, already held up to our offset
+                    src.seek(skip)
+                if dest not in appended:
+                    appended[dest] = os.path.getsize(dest) if os.path.exists(dest) else 0
+                with open(dest, "ab") as out:
+                    shutil.copyfileobj(src, out, CHUNK_SIZE)
+        written = sum(os.path.getsize(dest) - start for dest, start in appended.items())
+        return {
+            "status": "appended" if written else "unchanged",
+            "bytes": written,
+            "gaps": gaps,
+            "appended": appended,
+        }
+
+    def _record_export(
+        self, name: str, base: str, saved: Dict, response: http.client.HTTPResponse, result: Dict
+    ) -> Dict:
+        appended = result.pop("appended", {})
+        if self.spool_dir:
+            from utils.spool_queue import enqueue_file
+
+            # The spool workers read syslog lines; journal exports are left to parse_logs
+            result["segments"] = sum(
+                len(enqueue_file(self.spool_dir, os.path.splitext(os.path.basename(dest))[0], dest, start))
+                for dest, start in appended.items()
+                if dest.endswith(".log") and os.path.getsize(dest) > start
+            )
+        with self._lock:
+            entry = dict(saved, url=base, mode="export")
+            if response.status != 304:
+                entry["etag"] = response.getheader("ETag")
+                entry["last_modified"] = response.getheader("Last-Modified")
+            entry["checked_at"] = datetime.now(timezone.utc).isoformat()
+            if result["bytes"]:
+                entry["fetched_at"] = entry["checked_at"]
+            self.state[name] = entry
+        result["export"] = entry.get("export")
+        return result
+
+    def _validators(self, saved: Dict) -> Dict:
+        headers = {}
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+        return headers
+
+    def _fetch_range(self, url: str, dest: str, saved: Dict, local_size: int) -> Optional[Dict]:
+        """
+        Returns the result of an incremental fetch, or None when the remote
+        file was rotated and a full fetch is needed.
+        """
+        overlap = min(OVERLAP_BYTES, local_size)
+        start = local_size - overlap
+        headers = {"Range": f"bytes={start}-", **self._validators(saved)}
+        response = self.connections.request(url, headers)
+
+        if response.status == 304:
+            response.read()
+            return {"status": "unchanged", "bytes": 0, "response": response}
+        if response.status == 416:
+            # Requested start is past the end: the file shrank
+            response.read()
+            return None
+        if response.status == 200:
+            # Server ignored Range; the body is the whole file
+            written = self._write_body(response, dest, append=False)
+            return {"status": "replaced", "bytes": written, "response": response}
+        if response.status != 206:
+            response.read()
+            raise CollectorError(f"{url}: unexpected HTTP {response.status}")
+
+        match = _CONTENT_RANGE.match(response.getheader("Content-Range", ""))
+        if match is None or int(match.group(1)) != start:
+            response.read()
+            return None
+
+        head = _read_exactly(response, overlap)
+        if head != _read_tail(dest, overlap):
+            # Same length or longer, but different bytes where ours end: rotated
+            response.read()
+            return None
+        written = self._write_body(response, dest, append=True)
+        return {"status": "appended" if written else "unchanged", "bytes": written, "response": response}
+
+    def _fetch_full(self, url: str, dest: str, saved: Dict) -> Dict:
+        response = self.connections.request(url, self._validators(saved))
+        if response.status == 304:
+            response.read()
+            return {"status": "unchanged", "bytes": 0, "response": response}
+        if response.status != 200:
+            response.read()
+            raise CollectorError(f"{url}: unexpected HTTP {response.status}")
+        written = self._write_body(response, dest, append=False)
+        status = "rotated" if saved.get("offset") else "full"
+        return {"status": status, "bytes": written, "response": response}
+
+    def _write_body(self, response: http.client.HTTPResponse, dest: str, append: bool) -> int:
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        written = 0
+        if append:
+            with open(dest, "ab") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+            return written
+
+        # Full fetches land in a temp file and replace the copy in one step,
+        # so readers never see a half-downloaded log
+        tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
+
+    def _record(self, name: str, url: str, dest: str, result: Dict) -> Dict:
+        response = result.pop("response")
+        with self._lock:
+            entry = self.state.setdefault(name, {})
+            entry["url"] = url
+            if os.path.exists(dest):
+                entry["offset"] = os.path.getsize(dest)
+            # A 304 carries no new validators; keep the ones that produced it
+            if response.status != 304:
+                entry["etag"] = response.getheader("ETag")
+                entry["last_modified"] = response.getheader("Last-Modified")
+            entry["checked_at"] = datetime.now(timezone.utc).isoformat()
+            if result["bytes"]:
+                entry["fetched_at"] = entry["checked_at"]
+            result["offset"] = entry.get("offset", 0)
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.connections.close()
+
+
+def _export_target(item: Dict, host: str) -> Optional[str]:
+    """Local file name for a manifest entry, or None for files that are not logs (fim.json)."""
+    source = item.get("source", "")
+    if source == "journald":
+        return f"{host}.journal.json"
+    if "offset" not in item:
+        return None
+    # secure.gz, auth.log.rotated.gz -> secure, auth: the live log the delta belongs to
+    log = item["filename"]
+    for suffix in (".gz", ".rotated", ".log"):
+        if log.endswith(suffix):
+            log = log[: -len(suffix)]
+    return f"{host}_{log}.log"
+
+
+def _read_exactly(response: http.client.HTTPResponse, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = response.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _read_tail(path: str, size: int) -> bytes:
+    if size <= 0:
+        return b""
+    with open(path, "rb") as f:
+        f.seek(-size, os.SEEK_END)
+        return f.read(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch new log data from every endpoint")
+    parser.add_argument("--inventory", default=INVENTORY_FILE)
+    parser.add_argument("--state", default=STATE_FILE)
+    parser.add_argument("--only", action="append", default=[], help="endpoint name (repeatable)")
+    parser.add_argument("--workers", type=int, default=COLLECTOR_WORKERS)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument("--spool", help="also queue fetched lines as segments in this spool directory")
+    args = parser.parse_args()
+
+    endpoints = load_inventory(args.inventory)
+    if args.only:
+        endpoints = [e for e in endpoints if e["name"] in args.only]
+        missing = set(args.only) - {e["name"] for e in endpoints}
+        if missing:
+            parser.error(f"unknown endpoints: {', '.join(sorted(missing))}")
+
+    collector = LogCollector(endpoints, load_state(args.state), args.workers, args.timeout, args.spool)
+    results = collector.collect()
+    collector.close()
+    save_state(collector.state, args.state)
+
+    failed = 0
+    for result in results:
+        if result["status"] == "error":
+            failed += 1
+            print(f"[!] {result['name']}: {result['error']}")
+        else:
+            position = f"export {result['export']}" if "export" in result else f"offset {result['offset']}"
+            print(
+                f"[+] {result['name']}: {result['status']} "
+                f"({result['bytes']} bytes, {position}, {result['seconds']}s)"
+            )
+            if result.get("gaps"):
+                print(f"[!] {result['name']}: {result['gaps']} bytes missed between exports")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
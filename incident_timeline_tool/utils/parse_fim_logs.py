@@ -1,5 +1,6 @@
 import os
 import json
+from datetime import datetime
 
 FIM_LOG_DIR = "logs"
 OUTPUT_JSON = "data/parsed_fim_logs.json"
@@ -14,8 +15,10 @@ def parse_fim_logs():
                 for line in f:
                     try:
                         entry = json.loads(line.strip())
+                        # Same UTC epoch seconds as parsed_logs.json
+                        entry["timestamp_utc"] = int(datetime.fromisoformat(entry["timestamp_utc"]).timestamp())
                         parsed_entries.append(entry)
-                    except json.JSONDecodeError:
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
                         continue
 
     parsed_entries.sort(key=lambda x: x["timestamp_utc"], reverse=True)
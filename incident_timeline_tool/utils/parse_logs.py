@@ -1,7 +1,20 @@
+import argparse
 import os
+import sys
 import json
-from datetime import datetime
+import gzip
+import hashlib
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatch
+from itertools import islice
 from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.event_store import EventStore
+from utils.profiling import add_profile_arguments, get_profiler
+from utils.records import LogEntry, MitreRule, intern
 
 LOG_DIR = "logs"
 OUTPUT_FILE = "data/parsed_logs.json"
@@ -16,47 +29,231 @@ LOG_RETENTION_DAYS = 30
 MAX_LOG_SIZE_MB = 100
 PARSE_BUFFER_SIZE = 4096
 OUTPUT_INDENT = 2
+ENABLE_EVENT_STORE = True
+EVENT_INSERT_BATCH = 5000
+# journalctl -o json exports written by the agents, optionally gzip-compressed
+JOURNAL_SUFFIXES = (".journal.json", ".journal.json.gz")
+TIMEZONES_FILE = "data/log_timezones.json"
+DEFAULT_TIMEZONE = "UTC"
+# A syslog timestamp this far behind the previous line means the year rolled over
+YEAR_ROLLBACK = timedelta(days=183)
+# How far past the file's mtime a first timestamp may be before it is taken as last year
+FUTURE_TOLERANCE = timedelta(days=1)
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+    )
+}
 
 
 def load_mitre_rules():
     with open(MITRE_FILE, "r") as f:
-        return json.load(f)
+        data = json.load(f)
+    # The rules file wraps the rule list as {"enabled": ..., "rules": [...]}
+    if isinstance(data, dict):
+        data = data.get("rules", []) if data.get("enabled", True) else []
+    return compile_mitre_rules(data)
+
+
+def compile_mitre_rules(rules):
+    """Lower-case each rule's keywords and build its hit record once, up front."""
+    return [
+        MitreRule(
+            keywords=tuple(keyword.lower() for keyword in rule["keywords"]),
+            hit={
+                "technique_id": rule["technique_id"],
+                "technique_name": rule["technique_name"],
+                "tactic": rule["tactic"],
+                "description": rule["description"],
+            },
+        )
+        for rule in rules
+    ]
 
 
 def match_mitre_rules(message, rules):
     matched = []
     msg_lower = message.lower()
     for rule in rules:
-        for keyword in rule["keywords"]:
-            if keyword.lower() in msg_lower:
-                matched.append(
-                    {
-                        "technique_id": rule["technique_id"],
-                        "technique_name": rule["technique_name"],
-                        "tactic": rule["tactic"],
-                        "description": rule["description"],
-                    }
-                )
+        for keyword in rule.keywords:
+            if keyword in msg_lower:
+                matched.append(rule.hit)
                 break
-    return matched
+    return tuple(matched)
+
+
+def classify_severity(message):
+    """
+    Same rules, in the same order, as the dashboard's former classifySeverity:
+    a routine "session opened" (even for root) is info, and only other
+    root + opened lines are critical.
+    """
+    msg = (message or "").lower()
+    if "fail" in msg or "denied" in msg or "error" in msg:
+        return "error"
+    if "warning" in msg or "invalid" in msg:
+        return "warning"
+    if "session opened" in msg or "accepted" in msg:
+        return "info"
+    if "root" in msg and "opened" in msg:
+        return "critical"
+    return "info"
 
 
-def parse_log_line(line, hostname, mitre_rules):
+def to_event(entry, source, raw_line):
+    """
+    Map a parsed log entry onto an EventStore row. The fingerprint makes
+    re-parsing the same line a no-op.
+    """
+    fingerprint = hashlib.blake2b(
+        f"{entry.hostname}\0{raw_line.rstrip()}".encode("utf-8", "replace"),
+        digest_size=16,
+    ).hexdigest()
+    return {
+        "timestamp": datetime.fromtimestamp(entry.timestamp_utc, timezone.utc).isoformat(),
+        "source": source,
+        "event_type": "syslog",
+        "details": entry.message,
+        "hostname": entry.hostname,
+        "process": entry.process,
+        "pid": entry.pid,
+        "severity": classify_severity(entry.message),
+        "ts_epoch": entry.timestamp_utc,
+        "fingerprint": fingerprint,
+        "mitre_tactic": entry.mitre[0]["tactic"] if entry.mitre else None,
+    }
+
+
+def load_timezones(path=TIMEZONES_FILE):
+    """
+    Per-file timezone rules as [(pattern, tzinfo)]. Patterns are matched
+    against a log's file name and its stem (the hostname used elsewhere).
+    """
     try:
-        # ISO 8601 format check (Fedora secure.log)
-        if line[:4].isdigit() and "T" in line:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    if isinstance(data, dict):
+        data = data.get("rules", []) if data.get("enabled", True) else []
+    rules = []
+    for rule in data:
+        try:
+            rules.append((rule["pattern"], ZoneInfo(rule["timezone"])))
+        except (KeyError, ZoneInfoNotFoundError) as e:
+            raise ValueError(f"invalid timezone rule {rule}: {e}")
+    return rules
+
+
+def timezone_for(name, rules):
+    """Timezone for a log file name or hostname; DEFAULT_TIMEZONE when no rule matches."""
+    name = os.path.basename(name)
+    stem = name.split(".", 1)[0]
+    for pattern, tz in rules:
+        if fnmatch(name, pattern) or fnmatch(stem, pattern):
+            return tz
+    return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+class TimestampResolver:
+    """
+    Resolves the leading timestamps of one file's lines to aware datetimes.
+
+    ISO 8601 timestamps keep their own offset; naive ones are read in the
+    file's timezone. RFC 3164 timestamps have no year: the first line gets
+    the year of `reference` (the file's mtime), or the year before if that
+    would put it in the future, and each later line carries the year
+    forward, adding one when the time jumps back by more than
+    YEAR_ROLLBACK (December followed by January). Keep one resolver per
+    file and feed it lines in file order.
+    """
+
+    def __init__(self, tz=timezone.utc, reference=None):
+        self.tz = tz
+        self.reference = (reference or datetime.now(timezone.utc)).astimezone(tz)
+        self._year = None
+        self._last = None
+
+    @classmethod
+    def for_file(cls, path, rules=()):
+        try:
+            reference = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+        except OSError:
+            reference = None
+        return cls(timezone_for(path, rules), reference)
+
+    def copy(self):
+        """An independent resolver at the same position, for another pass over the same lines."""
+        clone = TimestampResolver(self.tz, self.reference)
+        clone._year = self._year
+        clone._last = self._last
+        return clone
+
+    def position(self):
+        """The inferred year and last timestamp as JSON-able data for resume(); None before any line."""
+        if self._year is None:
+            return None
+        return {"year": self._year, "last": self._last.isoformat()}
+
+    def resume(self, position):
+        """Continue from a position() saved at the end of an earlier stretch of the same file."""
+        if position:
+            self._year = position["year"]
+            self._last = datetime.fromisoformat(position["last"])
+
+    def parse(self, line):
+        """Split off the timestamp; returns (aware datetime, rest). Raises ValueError."""
+        if line[:4].isdigit() and "T" in line[:20]:
             ts_str, rest = line.split(" ", 1)
             timestamp = datetime.fromisoformat(ts_str)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=self.tz)
+            return timestamp, rest
+
+        # "Mmm dd hh:mm:ss " with the day space-padded
+        month = MONTHS.get(line[:3])
+        if month is None or line[15:16] != " " or line[9] != ":" or line[12] != ":":
+            raise ValueError(f"unrecognised timestamp: {line[:16]!r}")
+        timestamp = self._with_year(
+            month, int(line[4:6]), int(line[7:9]), int(line[10:12]), int(line[13:15])
+        )
+        return timestamp, line[16:]
+
+    def _with_year(self, month, day, hour, minute, second):
+        if self._year is None:
+            year = self.reference.year
+            timestamp = datetime(year, month, day, hour, minute, second, tzinfo=self.tz)
+            if timestamp > self.reference + FUTURE_TOLERANCE:
+                year -= 1
+                timestamp = timestamp.replace(year=year)
         else:
-            # Normalize syslog timestamp with single-digit day
-            ts_str = line[:15]
-            ts_str = " ".join(ts_str.split())  # Collapse multiple spaces
-            timestamp = datetime.strptime(ts_str, "%b %d %H:%M:%S")
-            timestamp = timestamp.replace(year=datetime.now().year)
-            rest = line[16:]
+            year = self._year
+            timestamp = datetime(year, month, day, hour, minute, second, tzinfo=self.tz)
+            if timestamp < self._last - YEAR_ROLLBACK:
+                year += 1
+                timestamp = timestamp.replace(year=year)
+        self._year = year
+        self._last = timestamp
+        return timestamp
+
+
+def parse_timestamp(line, resolver=None):
+    """
+    Split the leading timestamp off a log line. Returns (aware datetime,
+    rest); raises ValueError when the line does not start with a known
+    format. Without a resolver the line is read on its own, in UTC.
+    """
+    return (resolver or TimestampResolver()).parse(line)
+
+
+def parse_log_line(line, hostname, mitre_rules, resolver=None):
+    try:
+        timestamp, rest = parse_timestamp(line, resolver)
 
         parts = rest.split(": ", 1)
-        meta = parts[0]
+        # The syslog header is "<host> <tag>[pid]"; the host is not part of the process
+        meta = parts[0].split(" ", 1)[-1]
         message = parts[1] if len(parts) > 1 else ""
 
         if "[" in meta and "]" in meta:
@@ -68,40 +265,155 @@ def parse_log_line(line, hostname, mitre_rules):
 
         mitre_hits = match_mitre_rules(message, mitre_rules)
 
-        return {
-            "timestamp_utc": timestamp.isoformat(),
-            "hostname": hostname,
-            "process": process,
-            "pid": pid,
-            "message": message.strip(),
-            "mitre": mitre_hits,
-        }
+        return LogEntry(
+            int(timestamp.timestamp()),
+            hostname,
+            intern(process),
+            pid,
+            message.strip(),
+            mitre_hits,
+        )
     except Exception:
         return None
 
 
-def main():
+def _journal_field(value):
+    # journalctl emits non-UTF-8 values as byte arrays and repeated fields as lists
+    if isinstance(value, list):
+        if value and isinstance(value[0], int):
+            return bytes(value).decode("utf-8", "replace")
+        value = value[0] if value else ""
+    return value or ""
+
+
+def parse_journal_entry(line, hostname, mitre_rules, resolver=None):
+    """
+    Decode one line of `journalctl -o json` output into the same LogEntry
+    parse_log_line returns. Returns None for lines that are not
+    journal records. `resolver` is accepted for symmetry with
+    parse_log_line; journal timestamps are already UTC.
+    """
+    try:
+        record = json.loads(line)
+        usec = int(record["__REALTIME_TIMESTAMP"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    message = _journal_field(record.get("MESSAGE")).strip()
+    process = _journal_field(record.get("SYSLOG_IDENTIFIER") or record.get("_COMM"))
+    pid = _journal_field(record.get("SYSLOG_PID") or record.get("_PID"))
+
+    return LogEntry(
+        usec // 1000000,
+        intern(_journal_field(record.get("_HOSTNAME")) or hostname),
+        intern(process),
+        pid,
+        message,
+        match_mitre_rules(message, mitre_rules),
+    )
+
+
+def open_log(full_path, timezones=()):
+    """
+    (open file, parse function, hostname, resolver) for a syslog or journal
+    export, or None for any other file. The caller closes the file.
+    """
+    filename = os.path.basename(full_path)
+    if filename.endswith(JOURNAL_SUFFIXES):
+        hostname = intern(filename.split(".", 1)[0])
+        parse = parse_journal_entry
+    elif filename.endswith(".log"):
+        hostname = intern(Path(filename).stem)
+        parse = parse_log_line
+    else:
+        return None
+
+    resolver = TimestampResolver.for_file(full_path, timezones)
+    opener = gzip.open if filename.endswith(".gz") else open
+    return opener(full_path, "rt", errors="replace"), parse, hostname, resolver
+
+
+def iter_log_entries(full_path, mitre_rules, timezones=()):
+    """Yield (entry, raw_line) for every parseable line of a syslog or journal export."""
+    log = open_log(full_path, timezones)
+    if log is None:
+        return
+    f, parse, hostname, resolver = log
+    with f:
+        for line in f:
+            entry = parse(line, hostname, mitre_rules, resolver)
+            if entry:
+                yield entry, line
+
+
+def main(profile=None, profile_output=None):
+    """
+    Parse every log under LOG_DIR into the event store and OUTPUT_FILE.
+    `profile` (or SIEM_PROFILE) captures a profile of the run; MITRE
+    tagging is timed as part of the parse stage.
+    """
+    with get_profiler("parse_logs", profile, profile_output) as profiler:
+        _parse_all(profiler)
+
+
+def _parse_all(profiler):
     parsed_logs = []
     mitre_rules = load_mitre_rules()
+    timezones = load_timezones()
+
+    event_store = None
+    if ENABLE_EVENT_STORE:
+        event_store = EventStore()
+        event_store.connect()
+    pending_events = []
+    new_events = 0
 
     for filename in os.listdir(LOG_DIR):
-        if filename.endswith(".log"):
-            full_path = os.path.join(LOG_DIR, filename)
-            hostname = Path(filename).stem
-            with open(full_path, "r") as f:
-                for line in f:
-                    entry = parse_log_line(line, hostname, mitre_rules)
-                    if entry:
-                        parsed_logs.append(entry)
+        log = open_log(os.path.join(LOG_DIR, filename), timezones)
+        if log is None:
+            continue
+        f, parse, hostname, resolver = log
+        with f:
+            while True:
+                with profiler.stage("read"):
+                    lines = list(islice(f, PARSE_BUFFER_SIZE))
+                if not lines:
+                    break
+                with profiler.stage("parse"):
+                    parsed = []
+                    for line in lines:
+                        entry = parse(line, hostname, mitre_rules, resolver)
+                        if entry:
+                            parsed.append((entry, line))
+                parsed_logs.extend(entry for entry, _ in parsed)
+                if not event_store:
+                    continue
+                with profiler.stage("enrich"):
+                    pending_events.extend(to_event(entry, filename, line) for entry, line in parsed)
+                if len(pending_events) >= EVENT_INSERT_BATCH:
+                    with profiler.stage("write"):
+                        new_events += event_store.insert_events(pending_events)
+                    pending_events = []
+
+    if event_store:
+        with profiler.stage("write"):
+            if pending_events:
+                new_events += event_store.insert_events(pending_events)
+            event_store.close()
+        print(f"Stored {new_events} new events.")
 
-    parsed_logs.sort(key=lambda x: x["timestamp_utc"], reverse=True)
+    parsed_logs.sort(key=lambda x: x.timestamp_utc, reverse=True)
 
-    os.makedirs("data", exist_ok=True)
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(parsed_logs, f, indent=2)
+    with profiler.stage("write"):
+        os.makedirs("data", exist_ok=True)
+        with open(OUTPUT_FILE, "w") as f:
+            json.dump([entry.to_dict() for entry in parsed_logs], f, indent=2)
 
     print(f"Parsed {len(parsed_logs)} lines from logs.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Parse logs/ into the event store and parsed_logs.json")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    main(args.profile, args.profile_output)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling for detection, parsing and FIM runs.
+
+Set SIEM_PROFILE (or pass --profile) to capture a run:
+
+    SIEM_PROFILE=1 python3 utils/run_detection.py          # cProfile + tracemalloc
+    python3 utils/parse_logs.py --profile cpu               # cProfile only
+    ./astro-siem fim --profile memory                       # tracemalloc only
+
+The capture is one JSON file under data/profiles/ (SIEM_PROFILE_OUTPUT or
+--profile-output picks another path). It holds per-stage wall timings
+(read, parse, match, enrich, write; detection splits match per engine),
+the slowest functions, and the peak traced memory and the biggest
+allocation sites. The
+raw cProfile stats are saved next to it as .prof, for pstats or snakeviz.
+tracemalloc slows a run down several times, so compare CPU timings only
+between captures taken in the same mode.
+
+    python3 utils/profiling.py compare before.json after.json
+
+lists stages and functions that got slower (and allocation sites that
+grew) and exits non-zero when any regressed. Only changes above 1% of the
+run's wall time count, so two captures of the same code do not differ on
+noise. A function or allocation site missing from a capture's top list
+was not measured there and is left out of the comparison rather than
+counted as zero.
+"""
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+PROFILE_ENV = "SIEM_PROFILE"
+PROFILE_OUTPUT_ENV = "SIEM_PROFILE_OUTPUT"
+PROFILE_DIR = "data/profiles"
+PROFILE_MODES = ("cpu", "memory", "all")
+TOP_FUNCTIONS = 200
+TOP_ALLOCATIONS = 50
+TRACEMALLOC_FRAMES = 1
+REGRESSION_THRESHOLD = 1.15
+# Differences smaller than this are noise, however large the ratio: a
+# fixed minimum, or this share of the longer wall time if that is larger
+MIN_REGRESSION_SECONDS = 0.005
+MIN_REGRESSION_SHARE = 0.01
+MIN_REGRESSION_BYTES = 64 * 1024
+
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_ADDRESS = re.compile(r" at 0x[0-9a-f]+")
+
+
+def profile_mode(value) -> Optional[str]:
+    """Normalise a --profile / SIEM_PROFILE value to a mode, or None when off."""
+    if value is None or value is False:
+        return None
+    value = "all" if value is True else str(value).strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    if value in ("1", "true", "yes", "on"):
+        return "all"
+    if value not in PROFILE_MODES:
+        raise ValueError(f"unknown profile mode '{value}'; expected one of {', '.join(PROFILE_MODES)}")
+    return value
+
+
+class _NullProfiler:
+    """Stand-in when profiling is off: stages cost one no-op context manager."""
+
+    enabled = False
+    path = None
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        pass
+
+    def start(self):
+        return self
+
+    def stop(self) -> Optional[str]:
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Profiler:
+    """
+    One profiled run. Wrap the run in `with profiler:` and its phases in
+    `with profiler.stage("parse"):`; stages may repeat and their times add
+    up. Hot loops can time themselves and report through add().
+    """
+
+    enabled = True
+
+    def __init__(self, name: str, mode: str = "all", path: Optional[str] = None):
+        self.name = name
+        self.mode = mode
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.path = path or os.path.join(PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}.json")
+        self.stages = {}
+        self._profile = None
+        self._started = None
+        self._started_at = None
+
+    def start(self):
+        # The profiling modules load only for profiled runs, keeping start-up lean otherwise
+        import cProfile
+        import tracemalloc
+
+        self._started_at = datetime.now(timezone.utc).isoformat()
+        if self.mode in ("memory", "all"):
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.mode in ("cpu", "all"):
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        return self
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {"seconds": 0.0, "calls": 0}
+        stage["seconds"] += seconds
+        stage["calls"] += calls
+
+    def stop(self) -> str:
+        """Stop collecting and write the capture; returns its path."""
+        import platform
+        import pstats
+        import tracemalloc
+
+        wall = time.perf_counter() - self._started
+        capture = {
+            "meta": {
+                "name": self.name,
+                "mode": self.mode,
+                "started_at": self._started_at,
+                "argv": sys.argv,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pid": os.getpid(),
+            },
+            "wall_seconds": round(wall, 6),
+            "stages": {
+                name: {"seconds": round(s["seconds"], 6), "calls": s["calls"]}
+                for name, s in self.stages.items()
+            },
+        }
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self._profile is not None:
+            self._profile.disable()
+            stats = pstats.Stats(self._profile)
+            capture["functions"] = _function_rows(stats)
+            capture["function_count"] = len(stats.stats)
+            stats.dump_stats(os.path.splitext(self.path)[0] + ".prof")
+            self._profile = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            capture["memory"] = dict(
+                current_bytes=current, peak_bytes=peak, **_allocation_rows(snapshot)
+            )
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(capture, f, indent=2)
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        path = self.stop()
+        print(f"[*] Profile written to {path}", file=sys.stderr)
+        return False
+
+
+def get_profiler(name: str, profile=None, output: Optional[str] = None):
+    """
+    Profiler for a run named `name`. `profile` is a mode from --profile;
+    without one SIEM_PROFILE decides. Returns a no-op profiler when off.
+    """
+    mode = profile_mode(profile if profile is not None else os.environ.get(PROFILE_ENV))
+    if mode is None:
+        return _NullProfiler()
+    return Profiler(name, mode, output or os.environ.get(PROFILE_OUTPUT_ENV))
+
+
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile", nargs="?", const="all", default=None, metavar="MODE",
+        help=f"capture a profile ({'/'.join(PROFILE_MODES)}; default all, or ${PROFILE_ENV})",
+    )
+    parser.add_argument("--profile-output", default=None, help="capture file (default under data/profiles/)")
+
+
+def _source_name(filename: str) -> str:
+    # Relative to the tool for its own modules; short for the stdlib and site-packages
+    path = os.path.abspath(filename) if os.path.sep in filename else filename
+    if path.startswith(TOOL_DIR + os.sep):
+        return os.path.relpath(path, TOOL_DIR)
+    parts = path.split(os.sep)
+    return os.sep.join(parts[-2:]) if len(parts) > 1 else path
+
+
+def _function_rows(stats) -> List[Dict]:
+    rows = []
+    for (filename, line, func), (calls, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append(
+            {
+                # Built-ins carry the address of their type, which changes every run
+                "function": f"{_source_name(filename)}:{_ADDRESS.sub('', func)}",
+                "line": line,
+                "calls": ncalls,
+                "primitive_calls": calls,
+                "tottime": round(tottime, 6),
+                "cumtime": round(cumtime, 6),
+            }
+        )
+    # The slowest by either measure, so a leaf that got slower is kept even
+    # when its callers dominate the cumulative ranking
+    by_cumtime = sorted(rows, key=lambda row: row["cumtime"], reverse=True)[:TOP_FUNCTIONS]
+    by_tottime = sorted(rows, key=lambda row: row["tottime"], reverse=True)[:TOP_FUNCTIONS]
+    kept = {id(row): row for row in by_cumtime + by_tottime}
+    return sorted(kept.values(), key=lambda row: row["cumtime"], reverse=True)
+
+
+def _allocation_rows(snapshot) -> Dict:
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    statistics = snapshot.statistics("lineno")
+    return {
+        "allocations": [
+            {
+                "location": f"{_source_name(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in statistics[:TOP_ALLOCATIONS]
+        ],
+        "allocation_count": len(statistics),
+    }
+
+
+def _ratio(before: float, after: float) -> float:
+    return after / before if before else float("inf")
+
+
+def _own_time(rows: List[Dict]) -> Dict[str, float]:
+    # Functions are matched by file and name, so line shifts between commits
+    # do not break the diff; same-named lambdas and comprehensions add up
+    totals = {}
+    for row in rows:
+        totals[row["function"]] = totals.get(row["function"], 0.0) + row["tottime"]
+    return totals
+
+
+def _complete(rows: List[Dict], total: Optional[int], top: int) -> bool:
+    """Whether a top list holds every row; captures without a total are assumed cut at `top`."""
+    return len(rows) >= total if total is not None else len(rows) < top
+
+
+def _changes(old: Dict, new: Dict, floor: float, threshold: float, old_complete=True, new_complete=True):
+    """
+    (key, before, after, ratio, flag) for every key in either capture.
+    A key missing from a list that is not complete is unknown on that side
+    and is skipped; missing from a complete list, it is zero.
+    """
+    rows = []
+    for key in sorted(set(old) | set(new)):
+        if (key not in old and not old_complete) or (key not in new and not new_complete):
+            continue
+        before, after = old.get(key, 0), new.get(key, 0)
+        ratio = _ratio(before, after)
+        flag = ""
+        if after - before >= floor and ratio > threshold:
+            flag = "REGRESSION" if before else "NEW"
+        elif before - after >= floor and ratio < 1 / threshold:
+            flag = "faster"
+        rows.append((key, before, after, ratio, flag))
+    return rows
+
+
+def compare(previous: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD, top: int = 20) -> int:
+    """Print stage, function and memory differences; returns the number of regressions."""
+    regressions = 0
+    print(
+        f"{previous['meta'].get('name')} ({previous['meta'].get('mode')}, {previous['meta'].get('started_at')}) -> "
+        f"{current['meta'].get('name')} ({current['meta'].get('mode')}, {current['meta'].get('started_at')})"
+    )
+    if previous["meta"].get("mode") != current["meta"].get("mode"):
+        print("  note: captures used different modes; timings are not comparable")
+    print(
+        f"  wall {previous['wall_seconds']:.3f}s -> {current['wall_seconds']:.3f}s  "
+        f"x{_ratio(previous['wall_seconds'], current['wall_seconds']):.2f}"
+    )
+    floor = max(MIN_REGRESSION_SECONDS, MIN_REGRESSION_SHARE * max(previous["wall_seconds"], current["wall_seconds"]))
+
+    print("\nstages:")
+    rows = _changes(
+        {k: v["seconds"] for k, v in previous.get("stages", {}).items()},
+        {k: v["seconds"] for k, v in current.get("stages", {}).items()},
+        floor, threshold,
+    )
+    for name, before, after, ratio, flag in rows:
+        regressions += flag in ("REGRESSION", "NEW")
+        print(f"  {name:<24} {before:>10.4f}s -> {after:>10.4f}s  x{ratio:.2f}  {flag}".rstrip())
+
+    if "functions" in previous and "functions" in current:
+        rows = _changes(
+            _own_time(previous["functions"]), _own_time(current["functions"]), floor, threshold,
+            _complete(previous["functions"], previous.get("function_count"), TOP_FUNCTIONS),
+            _complete(current["functions"], current.get("function_count"), TOP_FUNCTIONS),
+        )
+        flagged = [row for row in rows if row[4] in ("REGRESSION", "NEW")]
+        regressions += len(flagged)
+        flagged.sort(key=lambda row: row[2] - row[1], reverse=True)
+        print(f"\nfunctions by own time ({len(flagged)} regressed by more than {floor:.4f}s):")
+        for name, before, after, ratio, flag in flagged[:top]:
+            print(f"  {before:>9.4f}s -> {after:>9.4f}s  x{ratio:.2f}  {flag:<10}  {name}")
+
+    if "memory" in previous and "memory" in current:
+        old_peak, new_peak = previous["memory"]["peak_bytes"], current["memory"]["peak_bytes"]
+        flag = ""
+        if new_peak - old_peak >= MIN_REGRESSION_BYTES and _ratio(old_peak, new_peak) > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"\nmemory peak {old_peak / 2**20:.1f} MiB -> {new_peak / 2**20:.1f} MiB{flag}")
+        rows = _changes(
+            {row["location"]: row["bytes"] for row in previous["memory"]["allocations"]},
+            {row["location"]: row["bytes"] for row in current["memory"]["allocations"]},
+            MIN_REGRESSION_BYTES, threshold,
+            _complete(previous["memory"]["allocations"], previous["memory"].get("allocation_count"), TOP_ALLOCATIONS),
+            _complete(current["memory"]["allocations"], current["memory"].get("allocation_count"), TOP_ALLOCATIONS),
+        )
+        grown = sorted(
+            (row for row in rows if row[4] in ("REGRESSION", "NEW")),
+            key=lambda row: row[2] - row[1], reverse=True,
+        )
+        for location, before, after, ratio, flag in grown[:top]:
+            print(f"  {before / 1024:>10.0f} KiB -> {after / 1024:>10.0f} KiB  {flag:<10}  {location}")
+
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Work with profile captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff = commands.add_parser("compare", help="diff two captures and list regressions")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    diff.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    diff.add_argument("--top", type=int, default=20, help="regressed functions and allocations to list")
+    args = parser.parse_args()
+
+    with open(args.before, "r") as f:
+        previous = json.load(f)
+    with open(args.after, "r") as f:
+        current = json.load(f)
+    return 1 if compare(previous, current, args.threshold, args.top) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Per-host event-rate anomaly detection over the event rollups.
+
+    python3 utils/rate_anomaly.py                  # alert on the last day
+    python3 utils/rate_anomaly.py --days 60 --alert-hours 6
+
+Each rule in data/anomaly_rules.json selects its series (per host, or per
+host and process) from the rollups into NumPy matrices, one row per
+series. Every minute of the alert window is scored against two
+baselines, computed for all series at once:
+
+  * a robust baseline from the hour rollups: the median and MAD of the
+    per-minute rate over the previous ROBUST_WINDOWS hours
+  * EWMA mean and variance of the counts before each minute, seeded from
+    the robust baseline at the start of the window
+
+Only the alert window is read at minute resolution; the robust baseline
+needs ROBUST_WINDOWS hour buckets before it, and the rest of the history
+only decides which series are established, from the day rollups. The cost
+of a run therefore grows with the number of series and the alert window,
+not with the length of history.
+
+A spike is a run of minutes whose counts reach the rule's min_count and
+are more than `threshold` deviations above the robust baseline, at least
+one of which is also that far above the EWMA baseline. Deviations have a
+Poisson floor (the square root of the baseline), so quiet series with a
+MAD of zero do not alert on every small burst. A series is not scored
+until it has a full robust baseline after its first event.
+
+Each spike is one alert. Alerts go through AlertSuppressor keyed on the
+spike start, so re-running over the same window does not raise the same
+spike again.
+
+NumPy is required for this job only; without it the job exits with a
+message.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+except ImportError:  # the anomaly stage is optional; everything else runs without NumPy
+    np = None
+
+from db.alert_store import AlertStore
+from db.event_store import ROLLUP_RESOLUTIONS, EventStore
+from utils.alert_suppressor import AlertSuppressor
+from utils.metrics import REGISTRY
+
+ANOMALY_RULES_FILE = "data/anomaly_rules.json"
+BUCKET_SECONDS = 60
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+HISTORY_DAYS = 14
+ALERT_LOOKBACK_MINUTES = 24 * 60
+EWMA_SPAN_MINUTES = 60
+# Hours of history behind the robust baseline for each hour
+ROBUST_WINDOWS = 24
+DEFAULT_MIN_COUNT = 20
+DEFAULT_THRESHOLD = 6.0
+# Rows of the series matrices scored at a time; bounds memory to a few
+# float64 arrays of SERIES_BLOCK x alert-window minutes
+SERIES_BLOCK = 64
+# Scale factor that makes the MAD estimate a normal standard deviation
+MAD_SCALE = 1.4826
+ALERT_WINDOW_SECONDS = 60
+
+ANOMALY_SECONDS = REGISTRY.histogram(
+    "siem_rate_anomaly_seconds", "Time to score one anomaly rule over all series", ("rule",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+ANOMALY_SPIKES = REGISTRY.counter(
+    "siem_rate_anomaly_spikes_total", "Event-rate spikes found", ("rule",)
+)
+
+
+class AnomalyRule:
+    """A set of per-minute series to watch and how far above baseline is a spike."""
+
+    def __init__(self, spec: Dict):
+        self.id = spec["id"]
+        self.name = spec.get("name", self.id)
+        self.severity = spec.get("severity", "MEDIUM")
+        self.description = spec.get("description", "")
+        self.mitre = list(spec.get("mitre", []))
+        self.mitre_json = json.dumps(self.mitre)
+        self.per_process = bool(spec.get("per_process", True))
+        self.processes = tuple(spec.get("processes", ()))
+        self.severities = tuple(spec.get("severities", ()))
+        self.min_count = float(spec.get("min_count", DEFAULT_MIN_COUNT))
+        self.threshold = float(spec.get("threshold", DEFAULT_THRESHOLD))
+        if self.threshold <= 0:
+            raise ValueError(f"{self.id}: threshold must be positive")
+
+
+def load_anomaly_rules(path: str = ANOMALY_RULES_FILE) -> List[AnomalyRule]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Same {"enabled": ..., "rules": [...]} wrapper as the other rule files
+    if isinstance(data, dict):
+        data = data.get("rules", []) if data.get("enabled", True) else []
+    return [AnomalyRule(spec) for spec in data if spec.get("enabled", True)]
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is not installed; rate anomaly detection needs it")
+
+
+class RollupCounts:
+    """
+    Every rollup row of one resolution in a range, as parallel arrays:
+    bucket offset, host, process and severity codes, and count. Loaded with
+    one scan and shared by all rules, which select and sum their series
+    from it with NumPy.
+    """
+
+    def __init__(self, start_epoch: int, bucket_seconds: int, buckets: int):
+        self.start_epoch = start_epoch
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.hosts = {}
+        self.processes = {}
+        self.severities = {}
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.host_codes = np.zeros(0, dtype=np.int64)
+        self.process_codes = np.zeros(0, dtype=np.int64)
+        self.severity_codes = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0)
+
+    @classmethod
+    def from_batches(
+        cls,
+        batches: Iterable[List[Tuple[int, str, str, str, int]]],
+        start_epoch: int,
+        bucket_seconds: int,
+        buckets: int,
+    ) -> "RollupCounts":
+        """Build from batches of (bucket, hostname, process, severity, count) rows."""
+        require_numpy()
+        frame = cls(start_epoch, bucket_seconds, buckets)
+        columns = ([], [], [], [], [])
+
+        def codes(rows, column, index):
+            return np.fromiter(
+                (index.setdefault(value, len(index)) for value in map(itemgetter(column), rows)),
+                dtype=np.int64, count=len(rows),
+            )
+
+        for rows in batches:
+            # Column at a time; zip(*rows) is far slower on batches this wide
+            starts = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=len(rows))
+            columns[0].append((starts - start_epoch) // bucket_seconds)
+            columns[1].append(codes(rows, 1, frame.hosts))
+            columns[2].append(codes(rows, 2, frame.processes))
+            columns[3].append(codes(rows, 3, frame.severities))
+            columns[4].append(np.fromiter(map(itemgetter(4), rows), dtype=np.float64, count=len(rows)))
+        if columns[0]:
+            (frame.offsets, frame.host_codes, frame.process_codes,
+             frame.severity_codes, frame.counts) = (np.concatenate(column) for column in columns)
+        return frame
+
+    def _match(self, codes: "np.ndarray", index: Dict[str, int], wanted: Tuple[str, ...]) -> "np.ndarray":
+        return np.isin(codes, [index[name] for name in wanted if name in index])
+
+    def select(self, rule: AnomalyRule) -> "SeriesMatrix":
+        """The rule's series: per host, or per host and process, over its processes and severities."""
+        keep = np.ones(len(self.counts), dtype=bool)
+        if rule.processes:
+            keep &= self._match(self.process_codes, self.processes, rule.processes)
+        if rule.severities:
+            keep &= self._match(self.severity_codes, self.severities, rule.severities)
+        hosts = self.host_codes[keep]
+        if rule.per_process:
+            series = hosts * max(len(self.processes), 1) + self.process_codes[keep]
+        else:
+            series = hosts
+        used, codes = np.unique(series, return_inverse=True)
+        host_names, process_names = list(self.hosts), list(self.processes)
+        if rule.per_process:
+            width = max(len(self.processes), 1)
+            keys = [(host_names[s // width], process_names[s % width]) for s in used.tolist()]
+        else:
+            keys = [(host_names[s], "") for s in used.tolist()]
+        return SeriesMatrix(
+            self.start_epoch, self.bucket_seconds, self.buckets, keys, codes, self.offsets[keep], self.counts[keep]
+        )
+
+
+class SeriesMatrix:
+    """
+    Sparse bucket counts for many series: parallel arrays of series code,
+    bucket offset and count, sorted by series. A (series, bucket) pair can
+    appear more than once (one row per severity and tactic); dense() sums
+    them while expanding a range of series into a (series, buckets)
+    float64 matrix.
+    """
+
+    def __init__(
+        self, start_epoch: int, bucket_seconds: int, buckets: int,
+        keys: List[Tuple[str, str]], codes, offsets, counts,
+    ):
+        self.start_epoch = start_epoch
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.keys = keys
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.offsets = offsets[order]
+        self.counts = counts[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def dense(self, first: int, last: int) -> "np.ndarray":
+        lo, hi = np.searchsorted(self.codes, (first, last))
+        cells = (self.codes[lo:hi] - first) * self.buckets + self.offsets[lo:hi]
+        out = np.bincount(cells, weights=self.counts[lo:hi], minlength=(last - first) * self.buckets)
+        return out.reshape(last - first, self.buckets)
+
+    def reindex(self, keys: List[Tuple[str, str]]) -> "SeriesMatrix":
+        """The same counts with series numbered as in `keys`; series not in `keys` are dropped."""
+        position = {key: i for i, key in enumerate(keys)}
+        mapping = np.array([position.get(key, -1) for key in self.keys], dtype=np.int64)
+        codes = mapping[self.codes]
+        keep = codes >= 0
+        return SeriesMatrix(
+            self.start_epoch, self.bucket_seconds, self.buckets, keys,
+            codes[keep], self.offsets[keep], self.counts[keep],
+        )
+
+
+def ewma(x: "np.ndarray", alpha: float, seed: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """
+    Exponentially weighted mean along axis 1, m[t] = (1 - alpha) m[t-1] +
+    alpha x[t], with m[-1] = seed (x[:, 0] by default). Computed in chunks
+    of minutes with cumulative sums, so the only Python loop is over
+    chunks, not minutes.
+    """
+    decay = 1.0 - alpha
+    # Longest chunk whose weights decay**-k stay well inside float64 range
+    chunk = max(1, min(x.shape[1], int(30 / -math.log(decay)) if decay > 0 else 1))
+    out = np.empty_like(x)
+    state = (x[:, 0] if seed is None else seed).astype(np.float64)
+    steps = np.arange(chunk, dtype=np.float64)
+    grow = decay ** -steps
+    shrink = decay ** steps
+    for start in range(0, x.shape[1], chunk):
+        block = x[:, start:start + chunk]
+        n = block.shape[1]
+        sums = np.cumsum(block * grow[:n], axis=1)
+        out[:, start:start + n] = (state[:, None] * decay) * shrink[:n] + alpha * sums * shrink[:n]
+        state = out[:, start + n - 1].copy()
+    return out
+
+
+def ewma_baseline(
+    x: "np.ndarray", seed_mean: "np.ndarray", seed_std: "np.ndarray", span: int = EWMA_SPAN_MINUTES
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    EWMA mean and standard deviation of each minute's predecessors,
+    starting from `seed_mean` / `seed_std` before the first minute.
+    """
+    alpha = 2.0 / (span + 1)
+    mean = ewma(x, alpha, seed_mean)
+    var = np.maximum(ewma(x * x, alpha, seed_std * seed_std + seed_mean * seed_mean) - mean * mean, 0.0)
+    # Baseline for minute t is what was known at t - 1
+    mean = np.concatenate((seed_mean[:, None], mean[:, :-1]), axis=1)
+    std = np.sqrt(np.concatenate((seed_std[:, None] ** 2, var[:, :-1]), axis=1))
+    return mean, std
+
+
+def hourly_baseline(
+    hourly: "np.ndarray", from_hour: int, windows: int = ROBUST_WINDOWS
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Median and scaled MAD of the per-minute rate over the `windows` hours
+    before each hour, for hours `from_hour` onwards. `from_hour` must be at
+    least `windows`.
+    """
+    rates = hourly * (BUCKET_SECONDS / HOUR_SECONDS)
+    view = np.lib.stride_tricks.sliding_window_view
+    # Row h of the view covers hours from_hour - windows + h .. from_hour + h - 1
+    history = view(rates[:, from_hour - windows:-1], windows, axis=1)
+    median = np.median(history, axis=2)
+    mad = np.median(np.abs(history - median[:, :, None]), axis=2)
+    return median, mad * MAD_SCALE
+
+
+def score(
+    x: "np.ndarray", hourly: "np.ndarray", from_hour: int, ready_hour: "np.ndarray", rule: AnomalyRule
+) -> Tuple["np.ndarray", "np.ndarray", Dict[str, "np.ndarray"]]:
+    """
+    Boolean (series, minutes) masks over the minute counts `x`, which
+    start at hour `from_hour` of the hour counts `hourly`: `outlier` where
+    the count is above the robust baseline, `confirmed` where it is above
+    the EWMA baseline as well. Series are not scored before their
+    `ready_hour`. Also returns the baselines both were derived from.
+    """
+    per_hour = HOUR_SECONDS // BUCKET_SECONDS
+    hour_median, hour_mad = hourly_baseline(hourly, from_hour)
+    expand = lambda values: np.repeat(values, per_hour, axis=1)[:, :x.shape[1]]
+    median, mad = expand(hour_median), expand(hour_mad)
+    mean, std = ewma_baseline(x, hour_median[:, 0], hour_mad[:, 0])
+    # Poisson floor: a count of c has noise of about sqrt(c) on its own
+    z_ewma = (x - mean) / np.maximum(std, np.sqrt(np.maximum(mean, 1.0)))
+    z_robust = (x - median) / np.maximum(mad, np.sqrt(np.maximum(median, 1.0)))
+    outlier = (x >= rule.min_count) & (z_robust >= rule.threshold)
+    hours = from_hour + np.arange(hour_median.shape[1])
+    outlier &= expand(hours >= ready_hour[:, None])
+    confirmed = outlier & (z_ewma >= rule.threshold)
+    return outlier, confirmed, {"ewma": mean, "median": median}
+
+
+def find_spikes(outlier: "np.ndarray", confirmed: "np.ndarray") -> List[Tuple[int, int, int]]:
+    """
+    (row, first minute, last minute) for each run of consecutive outlier
+    minutes that contains at least one confirmed minute. The EWMA catches
+    up with a spike within a few minutes, so only the onset is confirmed;
+    the robust baseline, which moves once per window, marks how long it
+    lasted.
+    """
+    minutes = outlier.shape[1]
+    edges = np.diff(np.pad(outlier.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    # Both come out in row-major order, so the n-th start pairs with the n-th end
+    ends -= 1
+    seen = np.concatenate(([0], np.cumsum(confirmed.ravel())))
+    keep = seen[rows * minutes + ends + 1] > seen[rows * minutes + starts]
+    return list(zip(rows[keep].tolist(), starts[keep].tolist(), ends[keep].tolist()))
+
+
+def spike_alerts(
+    rule: AnomalyRule, hours: SeriesMatrix, minutes: SeriesMatrix, established: "np.ndarray"
+) -> List[Dict]:
+    """
+    Alerts for spikes in `minutes`, the alert window, scored against
+    `hours`, which must start at least ROBUST_WINDOWS hours earlier and
+    number series the same way. `established` marks series with events
+    before `hours` starts; the others wait for a full robust baseline after
+    their first event.
+    """
+    from_hour = (minutes.start_epoch - hours.start_epoch) // HOUR_SECONDS
+    alerts = []
+    for first in range(0, len(hours), SERIES_BLOCK):
+        last = min(first + SERIES_BLOCK, len(hours))
+        x = minutes.dense(first, last)
+        hourly = hours.dense(first, last)
+        first_event = np.argmax(hourly > 0, axis=1)
+        ready_hour = np.where(established[first:last], 0, first_event + ROBUST_WINDOWS)
+        outlier, confirmed, detail = score(x, hourly, from_hour, ready_hour, rule)
+        for row, start, end in find_spikes(outlier, confirmed):
+            # Already running when the window opened: the run that saw its
+            # onset raised it, and its start here would not be the real one
+            if start == 0:
+                continue
+            peak = start + int(np.argmax(x[row, start:end + 1]))
+            # Baselines from the onset; by the peak the EWMA has absorbed part of the spike
+            alerts.append(_spike_alert(
+                rule, minutes, first + row, start, end,
+                int(x[row, peak]), detail["ewma"][row, start], detail["median"][row, start],
+            ))
+    return alerts
+
+
+def _spike_alert(rule, matrix, code, start, end, peak_count, ewma_base, median_base) -> Dict:
+    hostname, process = matrix.keys[code]
+    first_seen = datetime.fromtimestamp(matrix.start_epoch + start * matrix.bucket_seconds, timezone.utc)
+    subject = f"{process} events" if process else "events"
+    return {
+        "rule_id": rule.id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "severity": rule.severity,
+        "title": rule.name,
+        "description": (
+            f"{peak_count} {subject} per minute on {hostname} for {end - start + 1} min, "
+            f"baseline {ewma_base:.1f} (EWMA) / {median_base:.1f} (median)"
+        ),
+        # One dedup key per rule, host and process, whatever the numbers
+        "matched_text": f"rate spike: {process or '*'}",
+        "hostname": hostname,
+        "mitre_techniques": rule.mitre_json,
+        "first_seen": first_seen.isoformat(),
+    }
+
+
+class RateAnomalyDetector:
+    def __init__(
+        self,
+        event_store: EventStore,
+        alert_store: AlertStore,
+        rules: Optional[List[AnomalyRule]] = None,
+    ):
+        require_numpy()
+        self.event_store = event_store
+        self.alert_store = alert_store
+        self.rules = rules if rules is not None else load_anomaly_rules()
+        self.suppressor = AlertSuppressor(alert_store, ALERT_WINDOW_SECONDS)
+        self.series_scored = 0
+        self.spikes = 0
+
+    def load(self, start_epoch: int, end_epoch: int, resolution: str = "minute") -> RollupCounts:
+        seconds = dict(ROLLUP_RESOLUTIONS)[resolution]
+        return RollupCounts.from_batches(
+            self.event_store.rollup_series(start_epoch, end_epoch, resolution),
+            start_epoch, seconds, -(-(end_epoch - start_epoch) // seconds),
+        )
+
+    def run(
+        self,
+        end_epoch: Optional[int] = None,
+        history_days: float = HISTORY_DAYS,
+        alert_minutes: int = ALERT_LOOKBACK_MINUTES,
+    ) -> int:
+        """
+        Raise alerts for spikes in the last `alert_minutes` before
+        `end_epoch` (now), rounded out to a whole hour, with `history_days`
+        deciding which series are established. Returns the number of new
+        alert rows.
+        """
+        if end_epoch is None:
+            end_epoch = int(time.time())
+        end_epoch -= end_epoch % BUCKET_SECONDS
+        alert_start = end_epoch - alert_minutes * BUCKET_SECONDS
+        alert_start -= alert_start % HOUR_SECONDS
+        # Hour rows from the day boundary before the robust baseline of the
+        # first alert hour; day rows before that
+        hour_start = alert_start - ROBUST_WINDOWS * HOUR_SECONDS
+        hour_start -= hour_start % DAY_SECONDS
+        history_start = min(hour_start, end_epoch - int(history_days * DAY_SECONDS))
+        history_start -= history_start % DAY_SECONDS
+
+        inserted = 0
+        days = self.load(history_start, hour_start, "day")
+        hours = self.load(hour_start, end_epoch, "hour")
+        minutes = self.load(alert_start, end_epoch, "minute")
+        for rule in self.rules:
+            started = time.perf_counter()
+            hour_series = hours.select(rule)
+            known = set(days.select(rule).keys)
+            established = np.array([key in known for key in hour_series.keys], dtype=bool)
+            alerts = spike_alerts(rule, hour_series, minutes.select(rule).reindex(hour_series.keys), established)
+            self.series_scored += len(hour_series)
+            ANOMALY_SECONDS.labels(rule.id).observe(time.perf_counter() - started)
+            ANOMALY_SPIKES.labels(rule.id).inc(len(alerts))
+            self.spikes += len(alerts)
+            for alert in alerts:
+                if self.suppressor.submit(alert):
+                    inserted += 1
+        self.suppressor.flush()
+        return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raise alerts for per-host event-rate spikes")
+    parser.add_argument("--days", type=float, default=HISTORY_DAYS,
+                        help="history that makes a series established (scored from the start of the window)")
+    parser.add_argument("--alert-hours", type=float, default=ALERT_LOOKBACK_MINUTES / 60,
+                        help="only alert on spikes in this recent stretch")
+    parser.add_argument("--end", type=int, default=None, help="end of the range as a UTC epoch (default now)")
+    args = parser.parse_args()
+
+    if np is None:
+        print("[!] NumPy is not installed; rate anomaly detection skipped")
+        return 1
+    event_store = EventStore()
+    event_store.connect()
+    alert_store = AlertStore()
+    alert_store.connect()
+    detector = RateAnomalyDetector(event_store, alert_store)
+    started = time.perf_counter()
+    inserted = detector.run(args.end, args.days, int(args.alert_hours * 60))
+    print(
+        f"[+] Scored {detector.series_scored} series in {time.perf_counter() - started:.2f}s: "
+        f"{detector.spikes} spikes, {inserted} new alerts"
+    )
+    event_store.close()
+    alert_store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
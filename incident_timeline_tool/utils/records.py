@@ -0,0 +1,60 @@
+"""
+Compact records for the parse and detect hot path.
+
+Every parsed line and every rule match used to be a dict with its own
+copy of the key table. These are tuples instead: the field names live on
+the class, hostnames and process names are interned, and MITRE hits are
+shared per rule. Detection keeps a dict-style get() so AlertSuppressor
+and AlertStore take it alongside the dict alerts of the other engines.
+"""
+import sys
+from typing import Dict, NamedTuple, Optional, Tuple
+
+intern = sys.intern
+
+
+class MitreRule(NamedTuple):
+    keywords: Tuple[str, ...]
+    # Shared by every entry the rule matches; treat as read-only
+    hit: Dict
+
+
+class LogEntry(NamedTuple):
+    timestamp_utc: int
+    hostname: str
+    process: str
+    pid: str
+    message: str
+    mitre: Tuple[Dict, ...]
+
+    def to_dict(self) -> Dict:
+        entry = self._asdict()
+        entry["mitre"] = list(self.mitre)
+        return entry
+
+
+class Detection(NamedTuple):
+    rule_id: str
+    timestamp: str
+    severity: str
+    title: str
+    description: str
+    matched_text: str
+    hostname: str
+    mitre_techniques: str
+    first_seen: str
+    source_ip: Optional[str] = None
+    dedup_key: Optional[str] = None
+    count: int = 1
+    last_seen: Optional[str] = None
+
+    def get(self, key: str, default=None):
+        # Unset optional fields read as missing keys, as they would on a dict
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        return default
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in self._asdict().items() if v is not None}
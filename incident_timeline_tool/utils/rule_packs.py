@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+RULE_PACK_DIR = "data/rule_packs"
+RULE_PACK_SUFFIXES = (".json", ".yaml", ".yml")
+RELOAD_CHECK_INTERVAL = 2.0
+SEVERITIES = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+class RulePackError(ValueError):
+    pass
+
+
+def _yaml():
+    # Imported on first use: PyYAML is slow to import and only YAML packs need it
+    try:
+        import yaml
+    except ImportError:  # YAML packs are optional; JSON packs always work
+        return None
+    return yaml
+
+
+class CompiledRule(NamedTuple):
+    id: str
+    name: str
+    severity: str
+    description: str
+    pattern: "re.Pattern"
+    mitre: Tuple[str, ...]
+    mitre_json: str
+    threshold: Optional[int]
+    timewindow: Optional[int]
+    pack: str
+
+
+class RuleSet:
+    """
+    Immutable, compiled view of every enabled rule across the loaded packs.
+    Holders keep the set they were given; reloading builds a new set
+    rather than mutating this one.
+    """
+
+    __slots__ = ("rules", "by_id", "version", "loaded_at", "disabled")
+
+    def __init__(self, rules: List[CompiledRule], version: Tuple = (), disabled: Tuple[str, ...] = ()):
+        self.rules = tuple(rules)
+        self.by_id = MappingProxyType({rule.id: rule for rule in self.rules})
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.disabled = tuple(disabled)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def to_dict(self) -> Dict:
+        return {
+            "loaded_at": self.loaded_at,
+            "files": [path for path, _, _ in self.version],
+            "rules": [
+                {
+                    "id": rule.id,
+                    "name": rule.name,
+                    "severity": rule.severity,
+                    "pack": rule.pack,
+                    "mitre": list(rule.mitre),
+                    "threshold": rule.threshold,
+                    "timewindow": rule.timewindow,
+                }
+                for rule in self.rules
+            ],
+            "disabled": list(self.disabled),
+        }
+
+
+def read_pack(path: str) -> Dict:
+    with open(path, "r") as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+        else:
+            yaml = _yaml()
+            if yaml is None:
+                raise RulePackError(f"{path}: PyYAML is not installed, cannot load YAML packs")
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise RulePackError(f"{path}: {e}")
+    if isinstance(data, list):
+        data = {"rules": data}
+    if not isinstance(data, dict) or not isinstance(data.get("rules", []), list):
+        raise RulePackError(f"{path}: expected a list of rules or an object with 'rules'")
+    return data
+
+
+def compile_rule(spec: Dict, pack: str) -> CompiledRule:
+    rule_id = spec.get("id")
+    if not rule_id:
+        raise RulePackError(f"{pack}: rule without an id")
+    for field in ("name", "pattern"):
+        if not spec.get(field):
+            raise RulePackError(f"{pack}/{rule_id}: missing '{field}'")
+    severity = str(spec.get("severity", "MEDIUM")).upper()
+    if severity not in SEVERITIES:
+        raise RulePackError(f"{pack}/{rule_id}: unknown severity '{severity}'")
+    try:
+        pattern = re.compile(spec["pattern"], re.IGNORECASE)
+    except re.error as e:
+        raise RulePackError(f"{pack}/{rule_id}: invalid pattern: {e}")
+    mitre = tuple(str(t) for t in spec.get("mitre", []))
+    return CompiledRule(
+        id=rule_id,
+        name=spec["name"],
+        severity=severity,
+        description=spec.get("description", ""),
+        pattern=pattern,
+        mitre=mitre,
+        mitre_json=json.dumps(list(mitre)),
+        threshold=spec.get("threshold"),
+        timewindow=spec.get("timewindow"),
+        pack=pack,
+    )
+
+
+def pack_files(pack_dir: str) -> List[str]:
+    if not os.path.isdir(pack_dir):
+        return []
+    return sorted(
+        os.path.join(pack_dir, name)
+        for name in os.listdir(pack_dir)
+        if name.endswith(RULE_PACK_SUFFIXES) and not name.startswith(".")
+    )
+
+
+def _signature(paths: List[str]) -> Tuple:
+    signature = []
+    for path in paths:
+        st = os.stat(path)
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def load_rule_set(pack_dir: str = RULE_PACK_DIR) -> RuleSet:
+    """
+    Read, validate and compile every pack in `pack_dir` (sorted by file
+    name). Raises RulePackError on the first invalid rule or duplicate id.
+    """
+    paths = pack_files(pack_dir)
+    version = _signature(paths)
+    rules = []
+    disabled = []
+    seen = {}
+    for path in paths:
+        data = read_pack(path)
+        pack = data.get("name") or os.path.splitext(os.path.basename(path))[0]
+        pack_enabled = data.get("enabled", True)
+        for spec in data.get("rules", []):
+            rule = compile_rule(spec, pack)
+            if rule.id in seen:
+                raise RulePackError(f"{pack}/{rule.id}: duplicate of rule in {seen[rule.id]}")
+            seen[rule.id] = pack
+            if pack_enabled and spec.get("enabled", True):
+                rules.append(rule)
+            else:
+                disabled.append(rule.id)
+    return RuleSet(rules, version, disabled)
+
+
+class RuleRegistry:
+    """
+    Holds the current RuleSet for a pack directory and swaps in a freshly
+    compiled one when pack files change on disk (checked at most every
+    `check_interval` seconds). A pack that fails validation leaves the
+    previous set in place and is reported through `last_error`.
+    """
+
+    def __init__(self, pack_dir: str = RULE_PACK_DIR, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.pack_dir = pack_dir
+        self.check_interval = check_interval
+        self.last_error = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._rules = load_rule_set(pack_dir)
+
+    def current(self) -> RuleSet:
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._maybe_reload(now)
+        return self._rules
+
+    def _maybe_reload(self, now: float):
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            try:
+                if _signature(pack_files(self.pack_dir)) == self._rules.version:
+                    return
+                rules = load_rule_set(self.pack_dir)
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                return
+            # Single reference assignment: readers see the old or new set, never a mix
+            self._rules = rules
+            self.last_error = None
+            self.reloads += 1
+
+    def to_dict(self) -> Dict:
+        info = self.current().to_dict()
+        info["reloads"] = self.reloads
+        info["last_error"] = self.last_error
+        return info
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def default_registry(pack_dir: str = RULE_PACK_DIR) -> RuleRegistry:
+    """
+    Process-wide registry per pack directory, so every DetectionEngine in
+    a process (API jobs, CLI runs) shares one compiled rule set.
+    """
+    key = os.path.abspath(pack_dir)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = RuleRegistry(pack_dir)
+        return registry
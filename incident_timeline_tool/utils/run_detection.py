@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import sys
 import os
 
@@ -6,11 +7,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.alert_store import AlertStore
 from utils.detection_engine import DetectionEngine
-from utils.threat_intel import ThreatIntel
+from utils.metrics import REGISTRY
+from utils.profiling import add_profile_arguments, get_profiler
 import json
 from datetime import datetime, timezone
 
-def main():
+def main(profile=None, profile_output=None):
+    """
+    One detection run. `profile` (or SIEM_PROFILE) captures a profile;
+    each match stage includes reading its log files and storing its alerts.
+    """
+    with get_profiler("run_detection", profile, profile_output) as profiler:
+        return _run(profiler)
+
+def _run(profiler):
     print(f"[{datetime.now(timezone.utc).isoformat()}] Starting SIEM detection run...")
     
     alert_store = AlertStore()
@@ -19,32 +29,54 @@ def main():
     engine = DetectionEngine(alert_store=alert_store)
     
     print("Running rule-based detection...")
-    count = engine.run_detection()
+    with profiler.stage("match.rules"):
+        count = engine.run_detection()
     print(f"Generated {count} alerts from rule detection")
+    print(f"Folded {engine.suppressor.suppressed} duplicate detections into existing alerts")
     
     print("Running brute force detection...")
-    bf_count = engine.run_brute_force_detection()
+    with profiler.stage("match.brute_force"):
+        bf_count = engine.run_brute_force_detection()
     print(f"Generated {bf_count} alerts from brute force detection")
     
-    total = count + bf_count
+    print("Running correlation rules...")
+    with profiler.stage("match.correlation"):
+        corr_count = engine.run_correlation()
+    print(f"Generated {corr_count} alerts from correlation rules")
+    print(f"Correlation state: {json.dumps(engine.correlator.stats())}")
+    
+    total = count + bf_count + corr_count
     print(f"Total alerts generated: {total}")
     
-    stats = alert_store.get_alert_stats()
+    with profiler.stage("read"):
+        stats = alert_store.get_alert_stats()
+        open_alerts = alert_store.query_alerts(status='open')
     print(f"Alert statistics: {json.dumps(stats, indent=2)}")
     
-    open_alerts = alert_store.query_alerts(status='open')
     critical_high = [a for a in open_alerts if a['severity'] in ['CRITICAL', 'HIGH']]
     
     if critical_high:
         print(f"\nWARNING: {len(critical_high)} CRITICAL/HIGH alerts require attention!")
-        for alert in critical_high[:5]:
-            print(f"  - [{alert['severity']}] {alert['title']} from {alert.get('source_ip', 'unknown')}")
+        with profiler.stage("enrich"):
+            # Only needed when there is something to enrich
+            from utils.threat_intel import ThreatIntel
+            threat_intel = ThreatIntel()
+            enriched = list(threat_intel.enrich_alerts(critical_high[:5]))
+        for alert in enriched:
+            marker = " [THREAT INTEL MATCH]" if alert['threat_detected'] else ""
+            print(f"  - [{alert['severity']}] {alert['title']} from {alert.get('source_ip', 'unknown')}{marker}")
     
     engine.close()
     alert_store.close()
     
+    print("\nDetection metrics:")
+    print(REGISTRY.summary())
+    
     print(f"[{datetime.now(timezone.utc).isoformat()}] Detection run complete.")
     return 0
 
 if __name__ == "__main__":
-    exit(main())
+    parser = argparse.ArgumentParser(description="Run rule, brute-force and correlation detection")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    exit(main(args.profile, args.profile_output))
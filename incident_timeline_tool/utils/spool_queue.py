@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Spool-directory work queue for running detection on several processes or
+nodes that share a directory.
+
+    python3 utils/spool_queue.py enqueue --host fedora_secure logs/fedora_secure.log
+    python3 utils/spool_queue.py work --drain          # start as many as you like
+    python3 utils/spool_queue.py status
+
+Layout under the spool directory:
+
+  tmp/        segments being written; never read by workers
+  incoming/   complete segments waiting for a worker
+  claimed/    segments being processed, renamed to <segment>@<worker>
+  done/       committed segments, named without the attempt number
+  failed/     segments that failed MAX_ATTEMPTS times, with a .error note
+  state/      per-host correlation and timestamp state, <hostname>.json
+
+A segment is a gzip-compressed run of log lines from one host, named
+<stamp>_<id>.<attempt>.<hostname>.log.gz. Producers write it to tmp/ and
+rename it into incoming/, so workers only ever see whole files.
+
+Workers claim a segment by renaming it into claimed/; rename is atomic,
+so exactly one worker wins. Only the oldest waiting segment of a host can
+be claimed, and only while none of that host's segments is claimed, so a
+host's segments are processed one at a time and in order. Each commit
+saves the host's partial correlation sequences and the year inferred for
+its RFC 3164 timestamps to state/, and the next segment of the host
+starts from there: a brute-force, login, sudo chain split across two
+segments still correlates. The price is that one host's log is processed
+by one worker at a time; workers scale across hosts. The first segment
+of a host anchors the year of its syslog lines to the segment's stamp
+(when it was enqueued). The claimed file's ctime is its lease: the
+worker touches it every LEASE_SECONDS / 3 while processing, and any
+worker that finds a claim older than LEASE_SECONDS renames it back to
+incoming/ with the attempt number raised. A crashed worker's segments
+are therefore picked up again without coordination.
+
+Committing is idempotent, so a segment processed twice (a re-released
+lease whose first worker was only slow) does no harm: events are
+deduplicated by fingerprint and repeated alerts are folded by the
+suppressor. done/ entries drop the attempt number, so every attempt of
+a segment maps to the same entry. A worker whose lease was reaped still
+records the segment in done/ when it finishes (as an empty marker, since
+its claimed file is gone), and removes the segment from failed/ if the
+reaper had already given up on it. Workers then skip later copies of
+the segment, and the reaper retires them instead of counting another
+attempt towards failed/.
+"""
+import argparse
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.alert_store import AlertStore
+from db.connection_pool import DB_PATH, ConnectionPool
+from db.event_store import EventStore
+from utils.correlation_engine import CorrelationEngine, load_correlation_rules
+from utils.detection_engine import DetectionEngine, line_event
+from utils.parse_logs import (
+    TimestampResolver,
+    load_mitre_rules,
+    load_timezones,
+    parse_log_line,
+    timezone_for,
+    to_event,
+)
+from utils.records import intern
+
+SPOOL_DIR = "spool"
+SPOOL_SUBDIRS = ("tmp", "incoming", "claimed", "done", "failed", "state")
+SEGMENT_SUFFIX = ".log.gz"
+SEGMENT_LINES = 50000
+SEGMENT_STAMP_FORMAT = "%Y%m%dT%H%M%S%f"
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 1.0
+REAP_INTERVAL = 10.0
+
+
+class SpoolError(Exception):
+    pass
+
+
+def spool_paths(spool_dir: str = SPOOL_DIR) -> Dict[str, str]:
+    paths = {name: os.path.join(spool_dir, name) for name in SPOOL_SUBDIRS}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    return paths
+
+
+def segment_name(hostname: str, attempt: int = 0) -> str:
+    stamp = datetime.now(timezone.utc).strftime(SEGMENT_STAMP_FORMAT)
+    return f"{stamp}_{uuid.uuid4().hex[:12]}.{attempt}.{hostname}{SEGMENT_SUFFIX}"
+
+
+def parse_segment_name(name: str) -> Dict:
+    """Split a segment (or claimed segment) file name into its parts."""
+    name, _, worker = name.partition("@")
+    if not name.endswith(SEGMENT_SUFFIX):
+        raise SpoolError(f"not a spool segment: {name}")
+    try:
+        segment_id, attempt, hostname = name[: -len(SEGMENT_SUFFIX)].split(".", 2)
+        attempt = int(attempt)
+    except ValueError:
+        raise SpoolError(f"not a spool segment: {name}")
+    return {
+        "name": name,
+        "id": segment_id,
+        "attempt": attempt,
+        "hostname": hostname,
+        "worker": worker or None,
+    }
+
+
+def _with_attempt(name: str, attempt: int) -> str:
+    info = parse_segment_name(name)
+    return f"{info['id']}.{attempt}.{info['hostname']}{SEGMENT_SUFFIX}"
+
+
+def segment_time(info: Dict) -> datetime:
+    """When a segment was enqueued, from the stamp that starts its id."""
+    stamp = info["id"].split("_", 1)[0]
+    return datetime.strptime(stamp, SEGMENT_STAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def done_path(paths: Dict[str, str], info: Dict) -> str:
+    """The done/ entry for a segment, shared by all of its attempts."""
+    return os.path.join(paths["done"], f"{info['id']}.{info['hostname']}{SEGMENT_SUFFIX}")
+
+
+def enqueue_lines(spool_dir: str, hostname: str, lines: List[bytes]) -> str:
+    """Write one segment of raw lines and publish it to incoming/."""
+    paths = spool_paths(spool_dir)
+    name = segment_name(hostname)
+    tmp_path = os.path.join(paths["tmp"], name)
+    with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+        f.writelines(lines)
+    os.rename(tmp_path, os.path.join(paths["incoming"], name))
+    return name
+
+
+def enqueue_file(
+    spool_dir: str,
+    hostname: str,
+    path: str,
+    start: int = 0,
+    segment_lines: int = SEGMENT_LINES,
+) -> List[str]:
+    """
+    Split the lines of `path` from byte offset `start` into segments.
+    Returns the segment names in order.
+    """
+    names = []
+    lines = []
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            lines.append(line)
+            if len(lines) >= segment_lines:
+                names.append(enqueue_lines(spool_dir, hostname, lines))
+                lines = []
+    if lines:
+        names.append(enqueue_lines(spool_dir, hostname, lines))
+    return names
+
+
+def reap_expired(spool_dir: str, lease_seconds: float = LEASE_SECONDS) -> int:
+    """
+    Release claims whose lease ran out back to incoming/, or to failed/
+    once they have used up MAX_ATTEMPTS. Safe to run from any worker.
+    """
+    paths = spool_paths(spool_dir)
+    now = time.time()
+    released = 0
+    for claimed in os.listdir(paths["claimed"]):
+        path = os.path.join(paths["claimed"], claimed)
+        try:
+            info = parse_segment_name(claimed)
+            if now - os.stat(path).st_ctime < lease_seconds:
+                continue
+        except (SpoolError, FileNotFoundError):
+            continue
+        attempt = info["attempt"] + 1
+        try:
+            if os.path.exists(done_path(paths, info)):
+                # Its first owner finished after all; nothing left to retry
+                os.remove(path)
+            elif attempt >= MAX_ATTEMPTS:
+                os.rename(path, os.path.join(paths["failed"], info["name"]))
+                _write_error(paths, info["name"], f"lease expired on {info['worker']} after {attempt} attempts")
+            else:
+                os.rename(path, os.path.join(paths["incoming"], _with_attempt(info["name"], attempt)))
+            released += 1
+        except FileNotFoundError:
+            # Another worker reaped it, or its owner committed it just now
+            continue
+    return released
+
+
+def _write_error(paths: Dict[str, str], name: str, message: str):
+    with open(os.path.join(paths["failed"], name + ".error"), "w") as f:
+        f.write(message + "\n")
+
+
+def spool_status(spool_dir: str = SPOOL_DIR) -> Dict[str, int]:
+    paths = spool_paths(spool_dir)
+    return {
+        name: sum(1 for f in os.listdir(path) if f.endswith(SEGMENT_SUFFIX) or "@" in f)
+        for name, path in paths.items()
+        if name not in ("tmp", "state")
+    }
+
+
+class _Lease:
+    """Keeps a claimed segment's ctime fresh from a background thread."""
+
+    def __init__(self, path: str, lease_seconds: float):
+        self.path = path
+        self.interval = lease_seconds / 3
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def __enter__(self) -> "_Lease":
+        os.utime(self.path)
+        self._thread.start()
+        return self
+
+    def _renew(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                # Reaped from under us; finish anyway, the commit is idempotent
+                self.lost = True
+                return
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class SpoolWorker:
+    def __init__(
+        self,
+        spool_dir: str = SPOOL_DIR,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = LEASE_SECONDS,
+        db_path: str = DB_PATH,
+    ):
+        self.spool_dir = spool_dir
+        self.paths = spool_paths(spool_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        # WAL and a long busy timeout, since several processes write at once
+        self.pool = ConnectionPool(db_path)
+        self.event_store = EventStore(pool=self.pool)
+        self.event_store.connect()
+        alert_store = AlertStore(pool=self.pool)
+        alert_store.connect()
+        self.engine = DetectionEngine(alert_store=alert_store)
+        self.correlator = CorrelationEngine(load_correlation_rules())
+        self.mitre_rules = load_mitre_rules()
+        self.timezones = load_timezones()
+        self._last_reap = 0.0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.events_stored = 0
+        self.alerts_raised = 0
+
+    def claim(self) -> Optional[str]:
+        """
+        Claim the oldest waiting segment of a host that has none claimed;
+        returns its claimed path or None.
+        """
+        if time.monotonic() - self._last_reap >= REAP_INTERVAL:
+            reap_expired(self.spool_dir, self.lease_seconds)
+            self._last_reap = time.monotonic()
+
+        # incoming/ is listed before claimed/: a segment another worker
+        # claims in between is then either in this listing, and tried (and
+        # lost) before any later segment of its host, or seen as claimed
+        waiting = sorted(os.listdir(self.paths["incoming"]))
+        busy = set()
+        for name in os.listdir(self.paths["claimed"]):
+            try:
+                busy.add(parse_segment_name(name)["hostname"])
+            except SpoolError:
+                continue
+        for name in waiting:
+            try:
+                hostname = parse_segment_name(name)["hostname"]
+            except SpoolError:
+                continue
+            if hostname in busy:
+                continue
+            # Later segments of this host wait for this one, whoever gets it
+            busy.add(hostname)
+            claimed = os.path.join(self.paths["claimed"], f"{name}@{self.worker_id}")
+            try:
+                os.rename(os.path.join(self.paths["incoming"], name), claimed)
+            except FileNotFoundError:
+                # Another worker got there first
+                continue
+            return claimed
+        return None
+
+    def process(self, claimed: str) -> bool:
+        """Run detection over one claimed segment and commit it. Returns False on failure."""
+        info = parse_segment_name(os.path.basename(claimed))
+        done = done_path(self.paths, info)
+        if os.path.exists(done):
+            try:
+                os.remove(claimed)
+            except FileNotFoundError:
+                pass
+            self.skipped += 1
+            return True
+
+        try:
+            with _Lease(claimed, self.lease_seconds):
+                self._process_lines(info, claimed)
+        except (OSError, EOFError, ValueError, sqlite3.Error) as e:
+            self._fail(claimed, info, e)
+            return False
+
+        try:
+            os.rename(claimed, done)
+        except FileNotFoundError:
+            # Lease was reaped mid-run. Record the commit anyway, so the
+            # re-released copy is skipped rather than retried into failed/
+            open(done, "ab").close()
+            self._clear_failed(info)
+        self.processed += 1
+        return True
+
+    def _state_path(self, hostname: str) -> str:
+        return os.path.join(self.paths["state"], f"{hostname}.json")
+
+    def _load_state(self, hostname: str) -> Dict:
+        try:
+            with open(self._state_path(hostname), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, hostname: str, state: Dict):
+        path = self._state_path(hostname)
+        tmp_path = f"{path}.{self.worker_id}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _process_lines(self, info: Dict, claimed: str):
+        hostname = intern(info["hostname"])
+        with gzip.open(claimed, "rt", errors="replace") as f:
+            lines = f.read().splitlines()
+
+        # Continue the host's stream where its previous segment ended; the
+        # first segment anchors the year of syslog lines to its own stamp
+        carried = self._load_state(hostname)
+        resolver = TimestampResolver(timezone_for(hostname, self.timezones), segment_time(info))
+        resolver.resume(carried.get("resolver"))
+        events = []
+        parse_resolver = resolver.copy()
+        for line in lines:
+            entry = parse_log_line(line, hostname, self.mitre_rules, parse_resolver)
+            if entry:
+                events.append(to_event(entry, info["name"], line))
+        if events:
+            self.events_stored += self.event_store.insert_events(events)
+
+        suppressor = self.engine.suppressor
+        for detection in self.engine.scan_lines(lines, hostname, resolver.copy()):
+            if suppressor.submit(detection):
+                self.alerts_raised += 1
+        self.correlator.restore(carried.get("correlation", {}))
+        try:
+            for event in filter(None, (line_event(line, hostname, resolver) for line in lines)):
+                for alert in self.correlator.process(event):
+                    if suppressor.submit(alert, alert["last_seen"]):
+                        self.alerts_raised += 1
+            state = {"resolver": resolver.position(), "correlation": self.correlator.snapshot()}
+        finally:
+            self.correlator.finish()
+        suppressor.flush()
+        self._save_state(hostname, state)
+
+    def _clear_failed(self, info: Dict):
+        """Drop failed/ entries for a segment that has been committed after all."""
+        prefix = info["id"] + "."
+        for name in os.listdir(self.paths["failed"]):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.paths["failed"], name))
+                except FileNotFoundError:
+                    pass
+
+    def _fail(self, claimed: str, info: Dict, error: Exception):
+        self.failed += 1
+        attempt = info["attempt"] + 1
+        try:
+            if os.path.exists(done_path(self.paths, info)):
+                # Another attempt of this segment already committed
+                os.remove(claimed)
+            elif attempt >= MAX_ATTEMPTS:
+                os.rename(claimed, os.path.join(self.paths["failed"], info["name"]))
+                _write_error(self.paths, info["name"], f"{self.worker_id}: {error!r}")
+            else:
+                os.rename(claimed, os.path.join(self.paths["incoming"], _with_attempt(info["name"], attempt)))
+        except FileNotFoundError:
+            pass
+
+    def run(self, drain: bool = False, max_segments: Optional[int] = None):
+        """
+        Process segments until stopped. With `drain`, return once nothing
+        is waiting or claimed.
+        """
+        while max_segments is None or self.processed + self.failed < max_segments:
+            claimed = self.claim()
+            if claimed is not None:
+                self.process(claimed)
+                continue
+            if drain and not os.listdir(self.paths["claimed"]):
+                break
+            time.sleep(IDLE_POLL_SECONDS)
+
+    def stats(self) -> Dict:
+        return {
+            "worker": self.worker_id,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "events_stored": self.events_stored,
+            "alerts_raised": self.alerts_raised,
+            "duplicates_suppressed": self.engine.suppressor.suppressed,
+        }
+
+    def close(self):
+        self.pool.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool-directory work queue for detection workers")
+    parser.add_argument("--spool", default=SPOOL_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="split log files into segments")
+    enqueue.add_argument("files", nargs="+")
+    enqueue.add_argument("--host", help="hostname for the segments (default: file stem)")
+    enqueue.add_argument("--segment-lines", type=int, default=SEGMENT_LINES)
+
+    work = commands.add_parser("work", help="claim and process segments")
+    work.add_argument("--drain", action="store_true", help="exit once the spool is empty")
+    work.add_argument("--lease", type=float, default=LEASE_SECONDS)
+    work.add_argument("--max-segments", type=int)
+    work.add_argument("--worker-id")
+
+    commands.add_parser("reap", help="release expired leases")
+    commands.add_parser("status", help="count segments in each state")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        for path in args.files:
+            hostname = args.host or os.path.splitext(os.path.basename(path))[0]
+            names = enqueue_file(args.spool, hostname, path, segment_lines=args.segment_lines)
+            print(f"[+] {path}: {len(names)} segments for {hostname}")
+    elif args.command == "work":
+        worker = SpoolWorker(args.spool, args.worker_id, args.lease)
+        try:
+            worker.run(drain=args.drain, max_segments=args.max_segments)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
+        print(json.dumps(worker.stats()))
+    elif args.command == "reap":
+        print(f"[+] Released {reap_expired(args.spool)} expired leases")
+    else:
+        print(json.dumps(spool_status(args.spool), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
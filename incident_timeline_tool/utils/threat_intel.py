@@ -1,8 +1,15 @@
+import os
 import json
-import socket
-import requests
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime, timezone
+from db.indicator_store import IndicatorStore, FEED_DB_PATH, BLOCKLIST_DB_PATH
+from utils.dns_resolver import ReverseResolver
+
+try:
+    import fcntl
+except ImportError:  # no flock outside POSIX; rebuilds are then not coordinated across processes
+    fcntl = None
 
 THREAT_INTEL_FILE = "data/threat_intel.json"
 LOCAL_BLOCKLIST = "data/blocklist.json"
@@ -11,16 +18,48 @@ CACHE_TTL = 3600
 REQUEST_RETRY_COUNT = 2
 MAX_CACHE_SIZE = 1000
 ENABLE_DNS_LOOKUP = True
+# Seconds between the feed watcher's checks of the feed file's mtime
+FEED_CHECK_INTERVAL = 30.0
 
 
 class ThreatIntel:
-    def __init__(self):
-        self.threat_data = self._load_threat_data()
-        self.blocklist = self._load_blocklist()
-
-    def _load_threat_data(self) -> Dict:
+    """
+    Indicator lookups against the compiled feed and the local blocklist.
+    Lookups never rebuild the feed; they only reopen the store when its
+    file is swapped. Long-running processes call start_watcher(), whose
+    thread checks threat_intel.json every `check_interval` seconds and,
+    when it differs from the source the store was built from, recompiles
+    it under a file lock. One process wins the lock and rebuilds; the
+    others skip and pick up the swapped file. A feed that fails to load
+    leaves the previous one in place and is reported through `last_error`.
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[ReverseResolver] = None,
+        feed_store: Optional[IndicatorStore] = None,
+        blocklist_store: Optional[IndicatorStore] = None,
+        check_interval: float = FEED_CHECK_INTERVAL,
+        feed_path: Optional[str] = THREAT_INTEL_FILE,
+    ):
+        self.feed_store = feed_store or IndicatorStore(FEED_DB_PATH)
+        self.blocklist_store = blocklist_store or IndicatorStore(
+            BLOCKLIST_DB_PATH, journal_mode="WAL"
+        )
+        self.check_interval = check_interval
+        # JSON source of feed_store; None for a store built some other way
+        self.feed_path = feed_path
+        self.last_error = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self._sync_stores()
+        if resolver is None and ENABLE_DNS_LOOKUP:
+            resolver = ReverseResolver(ttl=CACHE_TTL, max_cache_size=MAX_CACHE_SIZE)
+        self.resolver = resolver
+
+    def _load_threat_data(self, path: str = THREAT_INTEL_FILE) -> Dict:
         try:
-            with open(THREAT_INTEL_FILE, "r") as f:
+            with open(path, "r") as f:
                 return json.load(f)
         except FileNotFoundError:
             return {"indicators": []}
@@ -32,47 +71,97 @@ class ThreatIntel:
         except FileNotFoundError:
             return {"blocked_ips": [], "blocked_domains": []}
 
+    def _feed_changed(self) -> bool:
+        # rebuild() stamps the store with its source's mtime, so any other
+        # value (an edited feed, or an empty store created by a lookup) means stale
+        if self.feed_path is None:
+            return False
+        try:
+            source = os.stat(self.feed_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        return source != self.feed_store.mtime_ns()
+
+    def _sync_stores(self):
+        # The JSON files are only import sources; lookups go to the stores.
+        # Waits for a rebuild another process is running rather than repeating it
+        self.refresh_feed(wait=True)
+
+        if not self.blocklist_store.exists() and os.path.exists(LOCAL_BLOCKLIST):
+            legacy = self._load_blocklist()
+            for ip in legacy.get("blocked_ips", []):
+                self.update_blocklist(ip=ip)
+            for domain in legacy.get("blocked_domains", []):
+                self.update_blocklist(domain=domain)
+
+    def reload_feed(self, path: Optional[str] = None):
+        """
+        Recompile a JSON feed into the indicator store. Running processes
+        pick up the swapped file on their next lookup.
+        """
+        path = path or self.feed_path or THREAT_INTEL_FILE
+        mtime_ns = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        indicators = self._load_threat_data(path).get("indicators", [])
+        self.feed_store.rebuild(indicators, mtime_ns)
+
+    def refresh_feed(self, wait: bool = False) -> bool:
+        """
+        Rebuild the feed if threat_intel.json changed and this process wins
+        the rebuild lock; with `wait`, block for the lock instead of leaving
+        the rebuild to its holder. Returns whether this call rebuilt it.
+        """
+        if not self._feed_changed():
+            return False
+        os.makedirs(os.path.dirname(self.feed_store.db_path) or ".", exist_ok=True)
+        fd = os.open(f"{self.feed_store.db_path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            # The previous holder may have rebuilt it already
+            if not self._feed_changed():
+                return False
+            try:
+                self.reload_feed()
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                return False
+            self.last_error = None
+            return True
+        finally:
+            os.close(fd)
+
+    def start_watcher(self):
+        """Check for a changed feed every `check_interval` seconds from a daemon thread."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="threat-intel-feed", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.refresh_feed()
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _check(self, indicator_type: str, value: str) -> Optional[Dict]:
+        match = self.blocklist_store.lookup(indicator_type, value)
+        if match is None:
+            match = self.feed_store.lookup(indicator_type, value)
+        if match is None:
+            return None
+        return {"indicator": value, "type": indicator_type, **match}
+
     def check_ip(self, ip: str) -> Optional[Dict]:
-        if ip in self.blocklist.get("blocked_ips", []):
-            return {
-                "indicator": ip,
-                "type": "ip",
-                "risk": "CRITICAL",
-                "source": "local_blocklist",
-                "description": "IP found in local blocklist",
-            }
-
-        for indicator in self.threat_data.get("indicators", []):
-            if indicator.get("type") == "ip" and indicator.get("value") == ip:
-                return {
-                    "indicator": ip,
-                    "type": "ip",
-                    "risk": indicator.get("risk", "HIGH"),
-                    "source": indicator.get("source", "local"),
-                    "description": indicator.get("description", ""),
-                }
-        return None
+        return self._check("ip", ip)
 
     def check_domain(self, domain: str) -> Optional[Dict]:
-        if domain in self.blocklist.get("blocked_domains", []):
-            return {
-                "indicator": domain,
-                "type": "domain",
-                "risk": "CRITICAL",
-                "source": "local_blocklist",
-                "description": "Domain found in local blocklist",
-            }
-
-        for indicator in self.threat_data.get("indicators", []):
-            if indicator.get("type") == "domain" and indicator.get("value") == domain:
-                return {
-                    "indicator": domain,
-                    "type": "domain",
-                    "risk": indicator.get("risk", "HIGH"),
-                    "source": indicator.get("source", "local"),
-                    "description": indicator.get("description", ""),
-                }
-        return None
+        return self._check("domain", domain)
 
     def enrich_alert(self, alert: Dict) -> Dict:
         enriched = alert.copy()
@@ -93,31 +182,57 @@ class ThreatIntel:
         enriched["enriched_at"] = datetime.now(timezone.utc).isoformat()
         return enriched
 
-    def update_blocklist(self, ip: str = None, domain: str = None):
-        if "blocked_ips" not in self.blocklist:
-            self.blocklist["blocked_ips"] = []
-        if "blocked_domains" not in self.blocklist:
-            self.blocklist["blocked_domains"] = []
-
-        if ip and ip not in self.blocklist["blocked_ips"]:
-            self.blocklist["blocked_ips"].append(ip)
-
-        if domain and domain not in self.blocklist["blocked_domains"]:
-            self.blocklist["blocked_domains"].append(domain)
-
-        import os
+    def enrich_alerts(self, alerts: Iterable[Dict]) -> List[Dict]:
+        """
+        Enrich a batch of alerts, looking up each distinct IP only once.
+        Alerts that share an indicator share the same threat result objects.
+        """
+        alerts = list(alerts)
+        ips = set()
+        for alert in alerts:
+            for field in ("source_ip", "destination_ip"):
+                if alert.get(field):
+                    ips.add(alert[field])
+
+        resolved = {ip: self.check_ip(ip) for ip in ips}
+        enriched_at = datetime.now(timezone.utc).isoformat()
+
+        enriched_alerts = []
+        for alert in alerts:
+            enriched = alert.copy()
+            threat_info = []
+            for field in ("source_ip", "destination_ip"):
+                threat = resolved.get(alert.get(field))
+                if threat:
+                    threat_info.append(threat)
+            enriched["threat_intel"] = threat_info
+            enriched["threat_detected"] = len(threat_info) > 0
+            enriched["enriched_at"] = enriched_at
+            enriched_alerts.append(enriched)
+        return enriched_alerts
 
-        os.makedirs("data", exist_ok=True)
-        with open(LOCAL_BLOCKLIST, "w") as f:
-            json.dump(self.blocklist, f, indent=2)
-
-    def get_reputation(self, ip: str) -> Dict:
+    def update_blocklist(self, ip: str = None, domain: str = None):
+        if ip:
+            self.blocklist_store.add_indicator(
+                "ip", ip, "CRITICAL", "local_blocklist", "IP found in local blocklist"
+            )
+        if domain:
+            self.blocklist_store.add_indicator(
+                "domain",
+                domain,
+                "CRITICAL",
+                "local_blocklist",
+                "Domain found in local blocklist",
+            )
+
+    def _build_reputation(self, ip: str, hostname: Optional[str]) -> Dict:
         result = {"ip": ip, "reputation": "unknown", "checks": []}
 
-        try:
-            hostname, _, _ = socket.gethostbyaddr(ip)
+        if self.resolver is None:
+            result["checks"].append({"source": "dns", "status": "disabled"})
+        elif hostname:
             result["hostname"] = hostname
-        except socket.herror:
+        else:
             result["checks"].append({"source": "dns", "status": "no_reverse_lookup"})
 
         threat = self.check_ip(ip)
@@ -127,6 +242,19 @@ class ThreatIntel:
 
         return result
 
+    def get_reputation(self, ip: str) -> Dict:
+        hostname = self.resolver.resolve(ip) if self.resolver else None
+        return self._build_reputation(ip, hostname)
+
+    def get_reputations(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Reputation for every distinct IP in a report, with reverse lookups
+        resolved concurrently.
+        """
+        ips = set(ip for ip in ips if ip)
+        hostnames = self.resolver.resolve_many(ips) if self.resolver else {}
+        return {ip: self._build_reputation(ip, hostnames.get(ip)) for ip in ips}
+
 
 def create_sample_threat_intel():
     sample_data = {
@@ -149,8 +277,6 @@ def create_sample_threat_intel():
         "last_updated": datetime.now(timezone.utc).isoformat(),
     }
 
-    import os
-
     os.makedirs("data", exist_ok=True)
     with open(THREAT_INTEL_FILE, "w") as f:
         json.dump(sample_data, f, indent=2)
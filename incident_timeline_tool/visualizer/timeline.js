@@ -41,18 +41,11 @@ function downloadCsvFromCurrentPage(dt, filename, headers) {
 }
 
 // ===================== MAIN ======================
-d3.json("../data/parsed_logs.json").then(data => {
-  const originalData = data.map(d => {
-    const date = new Date(d.timestamp_utc);
-    return {
-      ...d,
-      timestampDate: date,
-      timestamp_local: date.toLocaleString(),
-      severity: classifySeverity(d.message)
-    };
-  });
-
-  const hosts = Array.from(new Set(originalData.map(d => d.hostname)));
+// Hosts and log rows come from the event store a page at a time, so the
+// dashboard's size no longer grows with the log volume
+fetch('/api/hosts').then(r => r.json()).then(({ hosts }) => {
+  // Zoom range for the timeline, in epoch seconds; null means full extent
+  let timelineRange = null;
 
   const hostFilter = document.getElementById("hostFilter");
   hostFilter.innerHTML = '<option value="all">All Hosts</option>';
@@ -64,6 +57,7 @@ d3.json("../data/parsed_logs.json").then(data => {
   });
 
   hostFilter.addEventListener("change", () => {
+    timelineRange = null;
     renderTimeline(hostFilter.value);
     renderLogs(hostFilter.value);
   });
@@ -71,23 +65,25 @@ d3.json("../data/parsed_logs.json").then(data => {
   renderTimeline("all");
   renderLogs("all");
 
-  function classifySeverity(msg) {
-    msg = (msg || '').toLowerCase();
-    if (msg.includes("fail") || msg.includes("denied") || msg.includes("error")) return "error";
-    if (msg.includes("warning") || msg.includes("invalid")) return "warning";
-    if (msg.includes("session opened") || msg.includes("accepted")) return "info";
-    if (msg.includes("root") && msg.includes("opened")) return "critical";
-    return "info";
-  }
-
   function renderTimeline(filterHost) {
-    const filtered = filterHost === "all"
-      ? originalData
-      : originalData.filter(d => d.hostname === filterHost);
+    const params = new URLSearchParams({ host: filterHost });
+    if (timelineRange) {
+      params.set('start', timelineRange[0]);
+      params.set('end', timelineRange[1]);
+    }
+    fetch(`/api/timeline?${params}`)
+      .then(r => r.json())
+      .then(result => drawTimeline(result, filterHost))
+      .catch(err => {
+        console.error("Timeline error:", err);
+        d3.select("#timeline").html("").append("div").text("Timeline unavailable.");
+      });
+  }
 
+  function drawTimeline(result, filterHost) {
     d3.select("#timeline").html("");
 
-    if (filtered.length === 0) {
+    if (!result.buckets || result.buckets.length === 0) {
       d3.select("#timeline").append("div").text("No data for selected host.");
       return;
     }
@@ -95,24 +91,43 @@ d3.json("../data/parsed_logs.json").then(data => {
     const width = 1400;
     const height = 300;
     const margin = { top: 20, right: 20, bottom: 50, left: 120 };
+    const bucketMs = result.bucket_seconds * 1000;
 
-    const xExtent = d3.extent(filtered, d => d.timestampDate);
-    const durationMs = xExtent[1] - xExtent[0] || 1;
-    const approxBinCount = 100;
-    const binSizeMs = Math.max(60 * 1000, Math.floor(durationMs / approxBinCount));
+    const severityLevels = ["info", "warning", "error", "critical"];
+    const colorMap = {
+      info: "#4caf50",
+      warning: "#ff9800",
+      error: "#f44336",
+      critical: "#9c27b0"
+    };
 
-    const thresholds = [];
-    let current = +xExtent[0];
-    while (current < +xExtent[1]) {
-      thresholds.push(current);
-      current += binSizeMs;
-    }
-    thresholds.push(+xExtent[1]);
+    // Fold the per-host rows into one stacked column per bucket
+    const byBucket = new Map();
+    result.buckets.forEach(b => {
+      let d = byBucket.get(b.bucket);
+      if (!d) {
+        d = { bucket: b.bucket, total: 0 };
+        severityLevels.forEach(s => d[s] = 0);
+        byBucket.set(b.bucket, d);
+      }
+      const sev = severityLevels.includes(b.severity) ? b.severity : "info";
+      d[sev] += b.count;
+      d.total += b.count;
+    });
+    const stackedData = Array.from(byBucket.values()).map(d => ({
+      ...d,
+      x0: new Date(d.bucket * 1000),
+      x1: new Date(d.bucket * 1000 + bucketMs)
+    }));
 
     const x = d3.scaleTime()
-      .domain(xExtent)
+      .domain([new Date(result.start * 1000), new Date(result.end * 1000)])
       .range([margin.left, width - margin.right]);
 
+    const y = d3.scaleLinear()
+      .domain([0, d3.max(stackedData, d => d.total) || 1])
+      .range([height - margin.bottom, margin.top]);
+
     const svg = d3.select("#timeline")
       .append("svg")
       .attr("width", width)
@@ -123,35 +138,6 @@ d3.json("../data/parsed_logs.json").then(data => {
       .attr("class", "tooltip")
       .style("opacity", 0);
 
-    const severityLevels = ["info", "warning", "error", "critical"];
-    const colorMap = {
-      info: "#4caf50",
-      warning: "#ff9800",
-      error: "#f44336",
-      critical: "#9c27b0"
-    };
-
-    const bins = d3.bin()
-      .value(d => d.timestampDate.getTime())
-      .thresholds(thresholds)(filtered);
-
-    const stackedData = bins.map(bin => {
-      const counts = {};
-      severityLevels.forEach(s => counts[s] = 0);
-      bin.forEach(log => counts[log.severity]++);
-      return {
-        x0: new Date(bin.x0),
-        x1: new Date(bin.x1),
-        total: bin.length,
-        bin,
-        ...counts
-      };
-    });
-
-    const y = d3.scaleLinear()
-      .domain([0, d3.max(stackedData, d => d.total) || 1])
-      .range([height - margin.bottom, margin.top]);
-
     svg.append("g")
       .attr("transform", `translate(0, ${height - margin.bottom})`)
       .call(d3.axisBottom(x).ticks(10));
@@ -160,7 +146,66 @@ d3.json("../data/parsed_logs.json").then(data => {
       .attr("transform", `translate(${margin.left}, 0)`)
       .call(d3.axisLeft(y).ticks(6));
 
-    // Draw stacked bars with full hover detail (including MITRE)
+    // Drag to zoom into a range; double-click to reset to the full extent
+    const brush = d3.brushX()
+      .extent([[margin.left, margin.top], [width - margin.right, height - margin.bottom]])
+      .on("end", e => {
+        if (!e.selection) return;
+        const [t0, t1] = e.selection.map(x.invert);
+        timelineRange = [Math.floor(t0 / 1000), Math.ceil(t1 / 1000)];
+        renderTimeline(filterHost);
+      });
+    svg.append("g").attr("class", "brush").call(brush);
+    svg.on("dblclick", () => {
+      timelineRange = null;
+      renderTimeline(filterHost);
+    });
+
+    const drilldownCache = new Map();
+
+    function showSamples(e, d, sev, count) {
+      const key = `${d.bucket}:${sev}`;
+      const params = new URLSearchParams({
+        start: d.bucket,
+        end: d.bucket + result.bucket_seconds,
+        host: filterHost,
+        severity: sev,
+        limit: 5
+      });
+      const request = drilldownCache.get(key) ||
+        fetch(`/api/timeline/events?${params}`).then(r => r.json());
+      drilldownCache.set(key, request);
+
+      request.then(({ events }) => {
+        const sampleLogs = (events || []).map(log => {
+          const mitreHtml = log.mitre && log.mitre.length > 0
+            ? log.mitre.map(m =>
+                `<div style="margin-left:10px;">
+                  <strong>${m.technique_id} - ${m.technique_name}</strong><br/>
+                  <em>${m.tactic}</em>: ${m.description}
+                </div>`).join("")
+            : "<div style='margin-left:10px;'><i>No MITRE match</i></div>";
+
+          return `
+            <div style="margin-bottom:6px;">
+              <strong>${new Date(log.ts_epoch * 1000).toLocaleString()}</strong><br/>
+              ${log.hostname} \u2022 ${log.process}${log.pid ? ` [${log.pid}]` : ""}<br/>
+              ${log.details}<br/>
+              ${mitreHtml}
+            </div>
+          `;
+        }).join("");
+
+        tooltip.transition().duration(200).style("opacity", 0.95);
+        tooltip.html(`
+          <strong>${sev.toUpperCase()}</strong> logs: ${count}<br/>
+          ${sampleLogs}${count > 5 ? "<em>...more</em>" : ""}
+        `)
+          .style("left", (e.pageX + 10) + "px")
+          .style("top", (e.pageY - 28) + "px");
+      });
+    }
+
     stackedData.forEach(d => {
       let yOffset = 0;
       severityLevels.forEach(sev => {
@@ -177,37 +222,7 @@ d3.json("../data/parsed_logs.json").then(data => {
           .attr("width", barWidth)
           .attr("height", barHeight)
           .attr("fill", colorMap[sev])
-          .on("mouseover", (e) => {
-            const sampleLogs = d.bin
-              .filter(l => l.severity === sev)
-              .slice(0, 5)
-              .map(log => {
-                const mitreHtml = log.mitre && log.mitre.length > 0
-                  ? log.mitre.map(m =>
-                      `<div style="margin-left:10px;">
-                        <strong>${m.technique_id} - ${m.technique_name}</strong><br/>
-                        <em>${m.tactic}</em>: ${m.description}
-                      </div>`).join("")
-                  : "<div style='margin-left:10px;'><i>No MITRE match</i></div>";
-
-                return `
-                  <div style="margin-bottom:6px;">
-                    <strong>${log.timestamp_local}</strong><br/>
-                    ${log.hostname} \u2022 ${log.process}${log.pid ? ` [${log.pid}]` : ""}<br/>
-                    ${log.message}<br/>
-                    ${mitreHtml}
-                  </div>
-                `;
-              }).join("");
-
-            tooltip.transition().duration(200).style("opacity", 0.95);
-            tooltip.html(`
-              <strong>${sev.toUpperCase()}</strong> logs: ${count}<br/>
-              ${sampleLogs}${count > 5 ? "<em>...more</em>" : ""}
-            `)
-              .style("left", (e.pageX + 10) + "px")
-              .style("top", (e.pageY - 28) + "px");
-          })
+          .on("mouseover", (e) => showSamples(e, d, sev, count))
           .on("mouseout", () => tooltip.transition().duration(500).style("opacity", 0));
 
         yOffset += count;
@@ -216,40 +231,51 @@ d3.json("../data/parsed_logs.json").then(data => {
   }
 
   function renderLogs(filterHost) {
-    const filtered = filterHost === "all"
-      ? originalData
-      : originalData.filter(d => d.hostname === filterHost);
-
-    const sorted = filtered.sort((a, b) => b.timestampDate - a.timestampDate);
-
-    const rows = sorted.map(d => [
-      d.timestamp_local,
+    const toRow = d => [
+      new Date(d.ts_epoch * 1000).toLocaleString(),
       d.hostname,
       `${d.process}${d.pid ? ` [${d.pid}]` : ""}`,
-      d.message,
+      d.details,
       d.mitre && d.mitre.length > 0
         ? d.mitre.map(m => `${m.technique_id}: ${m.technique_name}`).join("<br/>")
         : ""
-    ]);
+    ];
 
-    // expose DataTable instance globally so the Download button can access it
+    // Server-side mode: each page is fetched from /api/events, newest first.
+    // Exposed globally so the Download button can access it
     window.logsDT = $('#logs-table').DataTable({
       destroy: true,
+      serverSide: true,
+      processing: true,
+      searching: false,
+      ordering: false,
       pageLength: 10,
-      order: [[0, 'desc']]
+      ajax: (request, callback) => {
+        const params = new URLSearchParams({
+          draw: request.draw,
+          start: request.start,
+          length: request.length,
+          host: filterHost
+        });
+        fetch(`/api/events?${params}`)
+          .then(r => r.json())
+          .then(page => callback({
+            draw: page.draw,
+            recordsTotal: page.recordsTotal,
+            recordsFiltered: page.recordsFiltered,
+            data: (page.data || []).map(toRow)
+          }))
+          .catch(err => {
+            console.error("Logs error:", err);
+            callback({ draw: request.draw, recordsTotal: 0, recordsFiltered: 0, data: [] });
+          });
+      }
     });
-
-    window.logsDT.clear();
-    window.logsDT.rows.add(rows);
-    window.logsDT.draw();
   }
 
-  // Wire up CSV download for Timeline logs (current page only)
+  // Timeline logs are exported in full by the server's streaming export
   document.getElementById('download-logs-csv').addEventListener('click', () => {
-    if (!window.logsDT) return;
-    downloadCsvFromCurrentPage(window.logsDT, 'timeline_logs_page.csv', [
-      'Time', 'Host', 'Process [PID]', 'Message', 'MITRE Techniques'
-    ]);
+    window.location.href = '/api/events/export?format=csv';
   });
 
 }).catch(console.error);
@@ -258,7 +284,7 @@ d3.json("../data/parsed_logs.json").then(data => {
 d3.json("../data/parsed_fim_logs.json").then(fimData => {
   // Build rows
   const rows = fimData.map(d => [
-    new Date(d.timestamp_utc).toLocaleString(),
+    new Date(d.timestamp_utc * 1000).toLocaleString(),
     d.hostname,
     d.path,
     d.change,
@@ -304,21 +330,24 @@ async function loadAlerts() {
   }
 }
 
+function alertRow(a) {
+  const severityClass = `alert-${a.severity?.toLowerCase() || 'low'}`;
+  const status = a.status || 'open';
+  return [
+    new Date(a.timestamp).toLocaleString(),
+    `<span class="alert-badge ${severityClass}">${a.severity || 'LOW'}</span>`,
+    a.title || '',
+    a.source_ip || '-',
+    a.hostname || '-',
+    status,
+    `<button onclick="acknowledgeAlert(${a.id})">ACK</button> 
+     <button onclick="closeAlert(${a.id})">Close</button>`
+  ];
+}
+
 function renderAlertsTable(alerts) {
-  const rows = alerts.map(a => {
-    const severityClass = `alert-${a.severity?.toLowerCase() || 'low'}`;
-    const status = a.status || 'open';
-    return [
-      new Date(a.timestamp).toLocaleString(),
-      `<span class="alert-badge ${severityClass}">${a.severity || 'LOW'}</span>`,
-      a.title || '',
-      a.source_ip || '-',
-      a.hostname || '-',
-      status,
-      `<button onclick="acknowledgeAlert(${a.id})">ACK</button> 
-       <button onclick="closeAlert(${a.id})">Close</button>`
-    ];
-  });
+  window.loadedAlerts = alerts.slice();
+  const rows = alerts.map(alertRow);
 
   if (window.alertsDT) {
     window.alertsDT.destroy();
@@ -373,26 +402,60 @@ window.closeAlert = async function(alertId) {
   }
 };
 
+async function waitForDetectionJob(jobId) {
+  while (true) {
+    const response = await fetch(`/api/detect/${jobId}`);
+    // A 404 means the job was pruned or accepted by another worker; it will never finish here
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.error || `Job status request failed (${response.status})`);
+    }
+    const job = await response.json();
+    if (job.status === 'succeeded' || job.status === 'failed') return job;
+    await new Promise(resolve => setTimeout(resolve, 2000));
+  }
+}
+
 document.getElementById('runDetection')?.addEventListener('click', async () => {
   try {
     const response = await fetch('/api/detect', {method: 'POST'});
-    const result = await response.json();
-    alert(`Detection complete. Generated ${result.alerts_generated} alerts.`);
+    const submitted = await response.json();
+    if (!submitted.job_id) throw new Error(submitted.error || 'Detection not started');
+    const job = await waitForDetectionJob(submitted.job_id);
+    if (job.status === 'failed') throw new Error(job.error);
+    alert(`Detection complete. Generated ${job.result.alerts_generated} alerts in ${job.duration_seconds}s.`);
     loadAlerts();
   } catch (err) {
-    alert('Detection failed');
+    alert(`Detection failed: ${err.message}`);
   }
 });
 
+// Full alert export is streamed by the server rather than built from the table page
 document.getElementById('download-alerts-csv')?.addEventListener('click', () => {
-  if (!window.alertsDT) return;
-  downloadCsvFromCurrentPage(window.alertsDT, 'alerts_page.csv', [
-    'Time', 'Severity', 'Title', 'Source IP', 'Hostname', 'Status'
-  ]);
+  window.location.href = '/api/alerts/export?format=csv';
 });
 
+// Follow new alerts over Server-Sent Events instead of re-polling the list
+function followAlertStream() {
+  if (!window.EventSource) return;
+  const source = new EventSource('/api/alerts/stream');
+  source.addEventListener('alert', e => {
+    const alert = JSON.parse(e.data);
+    window.loadedAlerts = window.loadedAlerts || [];
+    window.loadedAlerts.push(alert);
+    if (window.alertsDT) {
+      window.alertsDT.row.add(alertRow(alert)).draw(false);
+    }
+    updateAlertStats(window.loadedAlerts);
+  });
+  // 'overflow' means we fell behind; EventSource reconnects with
+  // Last-Event-ID and the server replays what we missed.
+}
+
 // Initialize alerts tab when DOM ready
 document.addEventListener('DOMContentLoaded', () => {
   // Slight delay to ensure API is ready
-  setTimeout(loadAlerts, 500);
+  setTimeout(() => {
+    loadAlerts().then(followAlertStream);
+  }, 500);
 });